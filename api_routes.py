@@ -44,6 +44,7 @@ class CommandExecute(BaseModel):
     command: str
     project_id: Optional[int] = None
     working_directory: Optional[str] = None
+    job_id: Optional[str] = None
 
 # Initialize managers
 terminal_manager = TerminalManager()
@@ -349,21 +350,10 @@ async def execute_command(
         
         result = await terminal_manager.execute_command(
             command_data.command,
-            working_dir
-        )
-        
-        # Log execution
-        log_entry = models.ExecutionLog(
+            working_dir,
             user_id=current_user.id,
-            project_id=command_data.project_id,
-            command=command_data.command,
-            output=result.get("output", ""),
-            error_output=result.get("error", ""),
-            exit_code=result.get("exit_code", 0),
-            execution_time=result.get("execution_time", 0)
+            job_id=command_data.job_id
         )
-        db.add(log_entry)
-        db.commit()
         
         return result
         
@@ -499,15 +489,14 @@ async def get_conversations(
 @api_router.get("/system/info")
 async def get_system_info(current_user: models.User = Depends(get_current_user)):
     """Get system information"""
-    import platform
-    import psutil
+    info = await terminal_manager.get_system_info()
     
     return {
-        "os": platform.system(),
-        "os_version": platform.version(),
-        "architecture": platform.machine(),
-        "python_version": platform.python_version(),
-        "cpu_count": psutil.cpu_count(),
-        "memory_total": psutil.virtual_memory().total,
-        "disk_usage": psutil.disk_usage('/').percent
+        "os": info["system"],
+        "os_version": info["os_version"],
+        "architecture": info["machine"],
+        "python_version": info["python_version"],
+        "cpu_count": info["cpu"]["count"],
+        "memory_total": info["memory"]["total"] if info["memory"] else None,
+        "disk_usage": info["disk"]["percent"] if info["disk"] else None
     }
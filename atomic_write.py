@@ -0,0 +1,161 @@
+import os
+import ctypes
+import ctypes.util
+import tempfile
+from typing import List, Optional, Tuple, Union
+from config import settings
+
+def _current_umask() -> int:
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+# mkstemp creates files 0600; new files get the mode open() would have given them
+NEW_FILE_MODE = 0o666 & ~_current_umask()
+
+SYNC_FILE_RANGE_WRITE = 2
+
+def _load_sync_file_range():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        sync_file_range = libc.sync_file_range
+    except (OSError, AttributeError):
+        return None
+    sync_file_range.argtypes = [ctypes.c_int, ctypes.c_longlong, ctypes.c_longlong, ctypes.c_uint]
+    return sync_file_range
+
+# Linux only; elsewhere each fdatasync starts its own writeback
+_sync_file_range = _load_sync_file_range()
+
+def _durable_default() -> bool:
+    return settings.FILE_WRITE_DURABILITY != "none"
+
+def _fsync_directory(path: str):
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+    except OSError:
+        return  # e.g. Windows, where directories cannot be opened
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _write_temp(path: str, content: Union[str, bytes], encoding: str) -> str:
+    """Write content to a new temporary file beside path and return its name"""
+    data = content.encode(encoding) if isinstance(content, str) else content
+    directory, name = os.path.split(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory or ".", prefix=f".{name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        try:
+            os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+        except FileNotFoundError:
+            os.chmod(temp_path, NEW_FILE_MODE)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return temp_path
+
+def atomic_write(path: Union[str, os.PathLike], content: Union[str, bytes], encoding: str = 'utf-8',
+                 durable: Optional[bool] = None):
+    """Replace a file so readers see either the old or the new content, never a partial write.
+
+    With durable (the default unless FILE_WRITE_DURABILITY is "none") the data
+    is fsynced before the rename and the directory after it, so the new
+    content also survives a crash.
+    """
+    path = os.path.realpath(path)  # write through symlinks instead of replacing them
+    durable = _durable_default() if durable is None else durable
+
+    temp_path = _write_temp(path, content, encoding)
+    try:
+        if durable:
+            fd = os.open(temp_path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    if durable:
+        _fsync_directory(os.path.dirname(path))
+
+class AtomicWriteBatch:
+    """Atomic writes of many files with one flush for the whole batch.
+
+    Files are staged as temporary files and only renamed into place on
+    commit. Writeback of every staged file is started first and only then
+    waited for, so the device sees the batch as one flush rather than one
+    per file, and unlike syncfs(2) nothing else on the filesystem is
+    flushed with it. Each directory is then fsynced once, instead of once
+    per file as separate atomic_write calls would.
+    """
+
+    def __init__(self, durable: Optional[bool] = None):
+        self.durable = _durable_default() if durable is None else durable
+        self._staged: List[Tuple[str, str]] = []  # (temporary, final)
+
+    def write(self, path: Union[str, os.PathLike], content: Union[str, bytes], encoding: str = 'utf-8'):
+        path = os.path.realpath(path)
+        self._staged.append((_write_temp(path, content, encoding), path))
+
+    def _sync_staged(self):
+        fds = []
+        try:
+            for temp_path, _ in self._staged:
+                fds.append(os.open(temp_path, os.O_RDONLY))
+            if _sync_file_range is not None:
+                # Queue all the data before waiting on any of it
+                for fd in fds:
+                    _sync_file_range(fd, 0, 0, SYNC_FILE_RANGE_WRITE)
+            datasync = getattr(os, "fdatasync", os.fsync)
+            for fd in fds:
+                # Mostly waits for writeback already in flight
+                datasync(fd)
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+    def commit(self):
+        if not self._staged:
+            return
+        renamed = 0
+        directories = set()
+        try:
+            if self.durable:
+                self._sync_staged()
+            for temp_path, path in self._staged:
+                os.replace(temp_path, path)
+                renamed += 1
+                directories.add(os.path.dirname(path))
+        except BaseException:
+            self._staged = self._staged[renamed:]
+            self.abort()
+            raise
+        self._staged = []
+        if self.durable:
+            for directory in directories:
+                _fsync_directory(directory)
+
+    def abort(self):
+        """Drop staged files; the targets are left as they were"""
+        for temp_path, _ in self._staged:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+        self._staged = []
+
+    def __enter__(self) -> "AtomicWriteBatch":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
@@ -0,0 +1,271 @@
+import os
+import time
+import uuid
+import signal
+import asyncio
+from typing import Dict, Any, List, Optional
+from fastapi import HTTPException
+
+from config import settings
+from process_limits import ResourceLimits, spawn_process
+
+class RollingLog:
+    """Bounded log buffer addressed by absolute byte offsets"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.data = bytearray()
+        # Absolute offset of data[0]; grows as old output is dropped
+        self.start_offset = 0
+
+    @property
+    def end_offset(self) -> int:
+        return self.start_offset + len(self.data)
+
+    def append(self, chunk: bytes):
+        self.data += chunk
+        overflow = len(self.data) - self.max_size
+        if overflow > 0:
+            del self.data[:overflow]
+            self.start_offset += overflow
+
+    def read(self, offset: int = 0, limit: int = 64 * 1024) -> Dict[str, Any]:
+        """Read from an absolute offset; output older than the buffer is reported as skipped"""
+        skipped = max(self.start_offset - offset, 0)
+        start = max(offset, self.start_offset) - self.start_offset
+        chunk = bytes(self.data[start:start + limit])
+        return {
+            "data": chunk.decode('utf-8', errors='replace'),
+            "offset": max(offset, self.start_offset),
+            "next_offset": max(offset, self.start_offset) + len(chunk),
+            "end_offset": self.end_offset,
+            "skipped": skipped
+        }
+
+class BackgroundProcess:
+    def __init__(self, process_id: str, user_id: Optional[int], command: str, cwd: str,
+                 port: Optional[int], name: Optional[str], log_size: int):
+        self.process_id = process_id
+        self.user_id = user_id
+        self.command = command
+        self.cwd = cwd
+        self.port = port
+        self.name = name or command
+        self.log = RollingLog(log_size)
+
+        self.process = None
+        self.started_at: Optional[float] = None
+        self.ended_at: Optional[float] = None
+        self.last_accessed = time.time()
+        self._pumps: List[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self, shell: str, env: Dict[str, str], limits: ResourceLimits, cgroup_root: Optional[str]):
+        self.process = await spawn_process(
+            [shell, "-c", self.command],
+            cwd=self.cwd,
+            env=dict(env, **({"PORT": str(self.port)} if self.port else {})),
+            limits=limits,
+            cgroup_root=cgroup_root,
+            new_session=True
+        )
+        self.started_at = time.time()
+        self.ended_at = None
+        self.log.append(f"$ {self.command}\n".encode('utf-8'))
+        self._pumps = [
+            asyncio.create_task(self._pump(self.process.stdout)),
+            asyncio.create_task(self._pump(self.process.stderr))
+        ]
+        asyncio.create_task(self._watch())
+
+    async def _pump(self, stream: asyncio.StreamReader):
+        while True:
+            chunk = await stream.read(4096)
+            if not chunk:
+                break
+            self.log.append(chunk)
+
+    async def _watch(self):
+        process = self.process
+        exit_code = await process.wait()
+        if process is self.process:
+            self.ended_at = time.time()
+            self.log.append(f"\n[process exited with code {exit_code}]\n".encode('utf-8'))
+
+    def _signal_group(self, sig: int):
+        try:
+            os.killpg(self.process.pid, sig)
+        except ProcessLookupError:
+            pass
+
+    async def stop(self, grace_period: float = 5.0):
+        """SIGTERM the process group, then SIGKILL it after the grace period"""
+        if not self.running:
+            return
+
+        self._signal_group(signal.SIGTERM)
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout=grace_period)
+        except asyncio.TimeoutError:
+            self._signal_group(signal.SIGKILL)
+            await self.process.wait()
+
+        # Children that ignored SIGTERM may still hold the pipes open
+        self._signal_group(signal.SIGKILL)
+        for pump in self._pumps:
+            pump.cancel()
+
+    async def probe(self, timeout: float = 1.0) -> Optional[bool]:
+        """Check whether something accepts connections on the process's port"""
+        if not self.port:
+            return None
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", self.port), timeout=timeout)
+            writer.close()
+            return True
+        except (OSError, asyncio.TimeoutError):
+            return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "process_id": self.process_id,
+            "name": self.name,
+            "command": self.command,
+            "working_directory": self.cwd,
+            "port": self.port,
+            "pid": self.process.pid if self.process else None,
+            "running": self.running,
+            "exit_code": self.process.returncode if self.process else None,
+            "started_at": self.started_at,
+            "ended_at": self.ended_at,
+            "log_offset": self.log.end_offset
+        }
+
+class BackgroundProcessManager:
+    """Registry of long-running processes such as dev servers"""
+
+    def __init__(self, terminal_manager):
+        self.terminal_manager = terminal_manager
+        self.max_per_user = settings.MAX_BACKGROUND_PROCESSES_PER_USER
+        self.idle_timeout = settings.BACKGROUND_PROCESS_IDLE_TIMEOUT
+        self.log_size = settings.BACKGROUND_PROCESS_LOG_SIZE
+        self.reap_interval = 60
+
+        self.processes: Dict[str, BackgroundProcess] = {}
+        self._reaper_task: Optional[asyncio.Task] = None
+
+    def _limits(self) -> ResourceLimits:
+        # Same limits as one-off commands, minus the CPU budget: servers run for hours
+        limits = self.terminal_manager.resource_limits
+        return ResourceLimits(memory=limits.memory, file_size=limits.file_size, processes=limits.processes)
+
+    def _get(self, process_id: str, user_id: Optional[int]) -> BackgroundProcess:
+        entry = self.processes.get(process_id)
+        if not entry or entry.user_id != user_id:
+            raise HTTPException(status_code=404, detail="Process not found")
+        entry.last_accessed = time.time()
+        return entry
+
+    async def start(self, user_id: Optional[int], command: str, port: int = None,
+                    working_directory: str = None, name: str = None) -> Dict[str, Any]:
+        """Start a command in the background"""
+        if self.terminal_manager.system == "Windows":
+            raise HTTPException(status_code=501, detail="Background processes are not supported on Windows")
+
+        if not self.terminal_manager._is_safe_command(command):
+            raise HTTPException(status_code=400, detail="Command not allowed for security reasons")
+
+        running = [p for p in self.processes.values() if p.user_id == user_id and p.running]
+        if len(running) >= self.max_per_user:
+            raise HTTPException(status_code=429, detail="Too many background processes")
+
+        if port and any(p.port == port and p.running for p in self.processes.values()):
+            raise HTTPException(status_code=409, detail=f"Port {port} is already in use by another process")
+
+        entry = BackgroundProcess(
+            process_id=uuid.uuid4().hex,
+            user_id=user_id,
+            command=command,
+            cwd=self.terminal_manager._sanitize_path(working_directory),
+            port=port,
+            name=name,
+            log_size=self.log_size
+        )
+        await entry.start(
+            self.terminal_manager.shell, self.terminal_manager.process_env(entry.cwd), self._limits(),
+            self.terminal_manager.cgroup_root
+        )
+        self.processes[entry.process_id] = entry
+        self._start_reaper()
+        return entry.to_dict()
+
+    async def stop(self, process_id: str, user_id: Optional[int]) -> Dict[str, Any]:
+        """Stop a background process and forget it"""
+        entry = self._get(process_id, user_id)
+        await entry.stop()
+        self.processes.pop(process_id, None)
+        return entry.to_dict()
+
+    async def restart(self, process_id: str, user_id: Optional[int]) -> Dict[str, Any]:
+        """Stop and start a process again with the same command; its log carries on"""
+        entry = self._get(process_id, user_id)
+        await entry.stop()
+        await entry.start(
+            self.terminal_manager.shell, self.terminal_manager.process_env(entry.cwd), self._limits(),
+            self.terminal_manager.cgroup_root
+        )
+        return entry.to_dict()
+
+    async def status(self, process_id: str, user_id: Optional[int]) -> Dict[str, Any]:
+        """Get process state plus a health probe of its port"""
+        entry = self._get(process_id, user_id)
+        return {**entry.to_dict(), "healthy": await entry.probe() if entry.running else False}
+
+    def list_processes(self, user_id: Optional[int]) -> List[Dict[str, Any]]:
+        return [p.to_dict() for p in self.processes.values() if p.user_id == user_id]
+
+    def read_log(self, process_id: str, user_id: Optional[int], offset: int = 0, limit: int = 64 * 1024) -> Dict[str, Any]:
+        """Tail a process's output from an offset returned by a previous read"""
+        entry = self._get(process_id, user_id)
+        return {"process_id": process_id, "running": entry.running, **entry.log.read(offset, limit)}
+
+    async def stop_user_processes(self, user_id: Optional[int]):
+        """Stop everything a user started, e.g. when their last connection goes away"""
+        for entry in [p for p in self.processes.values() if p.user_id == user_id]:
+            await entry.stop()
+            self.processes.pop(entry.process_id, None)
+
+    async def reap_idle_processes(self) -> int:
+        """Stop processes nobody has looked at within the idle timeout"""
+        now = time.time()
+        reaped = 0
+        for entry in list(self.processes.values()):
+            if now - entry.last_accessed > self.idle_timeout:
+                await entry.stop()
+                self.processes.pop(entry.process_id, None)
+                reaped += 1
+        return reaped
+
+    async def _reaper(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                await self.reap_idle_processes()
+            except Exception as e:
+                print(f"Warning: background process reaper failed: {e}")
+
+    def _start_reaper(self):
+        if self._reaper_task is None or self._reaper_task.done():
+            self._reaper_task = asyncio.get_event_loop().create_task(self._reaper())
+
+    async def shutdown(self):
+        """Stop the reaper and every process"""
+        if self._reaper_task:
+            self._reaper_task.cancel()
+            self._reaper_task = None
+        for entry in list(self.processes.values()):
+            await entry.stop()
+        self.processes.clear()
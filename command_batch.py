@@ -0,0 +1,160 @@
+import re
+import uuid
+import asyncio
+from typing import Dict, Any, List, Optional, AsyncIterator
+from fastapi import HTTPException
+
+from config import settings
+
+ENV_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+# Variables that make the loader, a shell or an interpreter run extra code, which
+# would let a step run anything behind an allowed command
+BLOCKED_ENV = {
+    'PATH', 'ENV', 'BASH_ENV', 'SHELLOPTS', 'BASHOPTS', 'PROMPT_COMMAND', 'PS4', 'IFS', 'CDPATH',
+    'PYTHONSTARTUP', 'PYTHONPATH', 'PYTHONHOME', 'PYTHONINSPECT', 'PYTHONUSERBASE',
+    'NODE_OPTIONS', 'NODE_PATH', 'PERL5OPT', 'PERL5LIB', 'PERLLIB', 'RUBYOPT', 'RUBYLIB',
+    'JAVA_TOOL_OPTIONS', '_JAVA_OPTIONS', 'JDK_JAVA_OPTIONS', 'GCONV_PATH', 'GIT_SSH_COMMAND',
+    'GIT_EXEC_PATH', 'GIT_CONFIG_GLOBAL', 'EDITOR', 'VISUAL', 'PAGER'
+}
+BLOCKED_ENV_PREFIXES = ('LD_', 'DYLD_', 'BASH_FUNC_')
+
+class CommandBatchRunner:
+    """Runs a DAG of commands, starting each step once everything it depends on has succeeded"""
+
+    def __init__(self, terminal_manager):
+        self.terminal_manager = terminal_manager
+        self.max_steps = settings.MAX_BATCH_STEPS
+
+    def validate(self, steps: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Check a batch before anything runs; returns the steps by id"""
+        if not steps:
+            raise HTTPException(status_code=400, detail="Batch has no steps")
+        if len(steps) > self.max_steps:
+            raise HTTPException(status_code=400, detail=f"Batch has more than {self.max_steps} steps")
+
+        by_id: Dict[str, Dict[str, Any]] = {}
+        for step in steps:
+            step_id = str(step.get("id") or "")
+            if not step_id:
+                raise HTTPException(status_code=400, detail="Every step needs an id")
+            if step_id in by_id:
+                raise HTTPException(status_code=400, detail=f"Duplicate step id '{step_id}'")
+            if not self.terminal_manager._is_safe_command(step.get("command") or ""):
+                raise HTTPException(status_code=400, detail=f"Step '{step_id}': command not allowed for security reasons")
+            for name, value in (step.get("env") or {}).items():
+                if not ENV_NAME.match(name) or not isinstance(value, str):
+                    raise HTTPException(status_code=400, detail=f"Step '{step_id}': invalid environment variable '{name}'")
+                if name.upper() in BLOCKED_ENV or name.upper().startswith(BLOCKED_ENV_PREFIXES):
+                    raise HTTPException(status_code=400, detail=f"Step '{step_id}': environment variable '{name}' may not be set")
+            by_id[step_id] = step
+
+        for step_id, step in by_id.items():
+            for dependency in step.get("depends_on") or []:
+                if dependency not in by_id:
+                    raise HTTPException(status_code=400, detail=f"Step '{step_id}' depends on unknown step '{dependency}'")
+
+        # Kahn's algorithm: anything left over sits on a cycle
+        remaining = {step_id: set(step.get("depends_on") or []) for step_id, step in by_id.items()}
+        ready = [step_id for step_id, deps in remaining.items() if not deps]
+        while ready:
+            done = ready.pop()
+            del remaining[done]
+            for step_id, deps in remaining.items():
+                if done in deps:
+                    deps.discard(done)
+                    if not deps:
+                        ready.append(step_id)
+        if remaining:
+            raise HTTPException(status_code=400, detail=f"Dependency cycle between steps: {', '.join(sorted(remaining))}")
+
+        return by_id
+
+    async def _run_step(self, step: Dict[str, Any], user_id: Optional[int], working_directory: Optional[str],
+                        job_id: str) -> Dict[str, Any]:
+        try:
+            return await self.terminal_manager.execute_command(
+                step["command"],
+                step.get("working_directory") or working_directory,
+                user_id=user_id,
+                job_id=job_id,
+                env=step.get("env")
+            )
+        except HTTPException as e:
+            return {"command": step["command"], "error": e.detail, "status_code": e.status_code, "job_id": job_id}
+
+    async def run(self, steps: List[Dict[str, Any]], user_id: Optional[int] = None,
+                  working_directory: str = None) -> AsyncIterator[Dict[str, Any]]:
+        """Run the batch, yielding a frame per step as it completes and a final summary.
+
+        A failed step skips everything that depends on it. If the step has
+        stop_on_failure set (the default) the rest of the batch is abandoned too:
+        running steps are cancelled and nothing new is started.
+        """
+        by_id = self.validate(steps)
+        batch_id = uuid.uuid4().hex
+        loop = asyncio.get_event_loop()
+        start_time = loop.time()
+
+        pending = {step_id: set(step.get("depends_on") or []) for step_id, step in by_id.items()}
+        status: Dict[str, str] = {}
+        running: Dict[asyncio.Task, str] = {}
+        stopped = False
+
+        try:
+            while pending or running:
+                # Skips cascade, so rescan until nothing changes
+                changed = True
+                while changed:
+                    changed = False
+                    for step_id, deps in list(pending.items()):
+                        if stopped or any(status.get(d) in ("failed", "skipped", "cancelled") for d in deps):
+                            del pending[step_id]
+                            status[step_id] = "skipped"
+                            changed = True
+                            yield {"type": "step", "batch_id": batch_id, "id": step_id, "status": "skipped"}
+                        elif all(status.get(d) == "succeeded" for d in deps):
+                            del pending[step_id]
+                            task = asyncio.create_task(self._run_step(
+                                by_id[step_id], user_id, working_directory, f"{batch_id}.{step_id}"
+                            ))
+                            running[task] = step_id
+
+                if not running:
+                    break
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    step_id = running.pop(task)
+                    if task.cancelled():
+                        result = {"command": by_id[step_id]["command"], "cancelled": True}
+                    else:
+                        result = task.result()
+                    if result.get("cancelled"):
+                        status[step_id] = "cancelled"
+                    elif "error" not in result and result.get("exit_code") == 0:
+                        status[step_id] = "succeeded"
+                    else:
+                        status[step_id] = "failed"
+
+                    yield {"type": "step", "batch_id": batch_id, "id": step_id, "status": status[step_id], "result": result}
+
+                    if status[step_id] != "succeeded" and by_id[step_id].get("stop_on_failure", True) and not stopped:
+                        stopped = True
+                        for other_task, other in running.items():
+                            try:
+                                self.terminal_manager.jobs.cancel(f"{batch_id}.{other}", user_id)
+                            except HTTPException:
+                                # Not registered yet, or finished and pruned: stop the task itself
+                                other_task.cancel()
+
+            yield {
+                "type": "done",
+                "batch_id": batch_id,
+                "success": all(s == "succeeded" for s in status.values()),
+                "steps": status,
+                "execution_time": int((loop.time() - start_time) * 1000)
+            }
+        finally:
+            # Consumer went away: cancelling the tasks kills their processes
+            for task in running:
+                task.cancel()
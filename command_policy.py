@@ -0,0 +1,201 @@
+import os
+import re
+import shlex
+from collections import OrderedDict
+from typing import Dict, List, Optional, Iterable
+
+# Tokens that end one command and start the next
+COMMAND_SEPARATORS = {'|', '||', '&', '&&', ';', ';;', '(', ')'}
+# Tokens whose next token is a file, not a command
+REDIRECTIONS = {'<', '>', '>>', '<<', '<<<', '<>', '>|', '<&', '>&'}
+ASSIGNMENT = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*=')
+# Reserved words that may come before a command (if, do, ...) or end a compound one (fi, done, ...)
+LEADING_KEYWORDS = {'if', 'then', 'else', 'elif', 'do', 'while', 'until', '!', '{', 'time'}
+CLOSING_KEYWORDS = {'fi', 'done', 'esac', '}'}
+# Shells whose -c argument is itself a command line
+SHELLS = {'sh', 'bash', 'dash', 'zsh'}
+SHELL_SCRIPT_FLAG = re.compile(r'^-[a-zA-Z]*c[a-zA-Z]*$')
+PUNCTUATION = set('();<>|&')
+OPERATORS = sorted(COMMAND_SEPARATORS | REDIRECTIONS, key=len, reverse=True)
+
+def _split_operators(token: str) -> List[str]:
+    """shlex groups any run of punctuation ("|(", ");"); split it back into shell operators"""
+    if token in COMMAND_SEPARATORS or token in REDIRECTIONS or not set(token) <= PUNCTUATION:
+        return [token]
+    parts = []
+    while token:
+        operator = next((op for op in OPERATORS if token.startswith(op)), token[0])
+        parts.append(operator)
+        token = token[len(operator):]
+    return parts
+
+def _substitutions(command: str) -> List[str]:
+    """Command lines inside $(...) and backticks; the shell runs these even within double quotes"""
+    found = []
+    in_single = in_double = False
+    i, n = 0, len(command)
+    while i < n:
+        c = command[i]
+        if in_single:
+            if c == "'":
+                in_single = False
+        elif c == '\\':
+            i += 1
+        elif c == "'" and not in_double:
+            in_single = True
+        elif c == '"':
+            in_double = not in_double
+        elif c == '`':
+            end = i + 1
+            while end < n and command[end] != '`':
+                end += 2 if command[end] == '\\' else 1
+            found.append(command[i + 1:end])
+            i = end
+        elif command.startswith('$(', i) and not command.startswith('$((', i):
+            depth, end = 1, i + 2
+            while end < n and depth:
+                if command[end] == '\\':
+                    end += 1
+                elif command[end] == '(':
+                    depth += 1
+                elif command[end] == ')':
+                    depth -= 1
+                end += 1
+            found.append(command[i + 2:end - 1 if depth == 0 else end])
+            i = end - 1
+        i += 1
+    return found
+
+class CommandPolicy:
+    """Compiled allow/block policy for shell commands with an LRU of decisions"""
+
+    def __init__(self, allowed: Iterable[str], blocked: Iterable[str], dangerous_patterns: Iterable[str],
+                 windows: bool = False, cache_size: int = 1024):
+        self.allowed = frozenset(allowed)
+        self.blocked = frozenset(blocked)
+        self.windows = windows
+        self.cache_size = cache_size
+        # One alternation instead of a substring scan per pattern
+        self.dangerous = re.compile("|".join(re.escape(p) for p in dangerous_patterns), re.IGNORECASE)
+
+        self._decisions: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _command_names(self, command: str) -> List[str]:
+        """Programs the command line would run: the first word of every pipeline stage, command
+        substitution and shell -c script"""
+        if self.windows:
+            parts = command.split()
+            return parts[:1]
+
+        # The shell treats newlines as separators; shlex treats them as spaces
+        lexer = shlex.shlex(command.replace('\n', ' ; '), posix=True, punctuation_chars=True)
+        lexer.whitespace_split = True
+
+        names = []
+        expect_command = True
+        skip_next = False
+        skip_until = None  # words of a for/select/case header or [[ ]] test are not commands
+        in_shell = False
+        script_next = False
+        for token in (part for word in lexer for part in _split_operators(word)):
+            if skip_until is not None:
+                if token in skip_until:
+                    # After "case x in" come patterns, each closed by ")"
+                    skip_until = {')', 'esac'} if token == 'in' and skip_until == {'in'} else None
+                    expect_command = token != 'esac'
+                continue
+            if skip_next:
+                skip_next = False
+            elif script_next:
+                names.extend(self._command_names(token))
+                script_next = False
+            elif token in COMMAND_SEPARATORS:
+                expect_command = True
+                in_shell = False
+                if token == ';;':
+                    skip_until = {')', 'esac'}
+            elif token in REDIRECTIONS:
+                skip_next = True
+            elif expect_command and token in LEADING_KEYWORDS:
+                continue
+            elif expect_command and token in CLOSING_KEYWORDS:
+                expect_command = False
+            elif expect_command and token in ('for', 'select'):
+                skip_until = {';', 'do'}
+            elif expect_command and token == 'case':
+                skip_until = {'in'}
+            elif expect_command and token == '[[':
+                skip_until = {']]'}
+            elif expect_command and token == 'function':
+                skip_next = True  # the function's name
+            elif expect_command and not ASSIGNMENT.match(token):
+                names.append(token)
+                expect_command = False
+                in_shell = self.normalize_name(token) in SHELLS
+            elif in_shell and SHELL_SCRIPT_FLAG.match(token):
+                script_next = True
+
+        for substitution in _substitutions(command):
+            names.extend(self._command_names(substitution))
+        return names
+
+    def normalize_name(self, name: str) -> str:
+        """Reduce a program path to the name the lists use"""
+        name = name.lower()
+        # Remove path if present
+        if '/' in name or '\\' in name:
+            name = os.path.basename(name.replace('\\', '/'))
+        # Remove extension (python3.11, node.exe)
+        if '.' in name:
+            name = name.split('.')[0]
+        return name
+
+    def _evaluate(self, command: str, enforce_allow_list: bool) -> Optional[str]:
+        if not command.strip():
+            return "empty command"
+
+        if self.dangerous.search(command):
+            return "command contains a blocked pattern"
+
+        try:
+            names = self._command_names(command)
+        except ValueError:
+            return "command could not be parsed"
+        if not names:
+            return "empty command"
+
+        for name in names:
+            base = self.normalize_name(name)
+            if base in self.blocked:
+                return f"'{base}' is blocked"
+            # Scripts in the working directory are the user's own programs
+            if enforce_allow_list and base not in self.allowed and not name.startswith(('./', '../')):
+                return f"'{base}' is not an allowed command"
+        return None
+
+    def check(self, command: str, trusted: bool = False) -> Optional[str]:
+        """Get the reason a command is refused, or None if it may run.
+
+        Trusted commands are ones the server built itself (compilers, interpreters,
+        compiled programs) and skip the allow-list; they are not cached since
+        they carry per-run paths.
+        """
+        if trusted:
+            return self._evaluate(command, enforce_allow_list=False)
+
+        if command in self._decisions:
+            self.hits += 1
+            self._decisions.move_to_end(command)
+            return self._decisions[command]
+
+        self.misses += 1
+        decision = self._evaluate(command, enforce_allow_list=True)
+        self._decisions[command] = decision
+        if len(self._decisions) > self.cache_size:
+            self._decisions.popitem(last=False)
+        return decision
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"cached": len(self._decisions), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,108 @@
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+class CompileCache:
+    """Per-user, size-capped LRU store of compiled artifacts keyed by content hash"""
+
+    def __init__(self, cache_dir: str, max_size_per_user: int):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size_per_user = max_size_per_user
+
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, language: str, source: str, compiler_version: str, flags: List[str]) -> str:
+        """Hash everything that affects the compiled output"""
+        digest = hashlib.sha256()
+        for part in (language, compiler_version, "\0".join(flags), source):
+            digest.update(part.encode('utf-8'))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _user_dir(self, user_id: Optional[int]) -> Path:
+        user_dir = self.cache_dir / (str(user_id) if user_id is not None else "anonymous")
+        user_dir.mkdir(exist_ok=True)
+        return user_dir
+
+    def get(self, user_id: Optional[int], key: str) -> Optional[str]:
+        """Get the artifact directory for a key, marking it recently used"""
+        entry = self._user_dir(user_id) / key
+        if not entry.is_dir():
+            self.misses += 1
+            return None
+
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        self.hits += 1
+        return str(entry)
+
+    def create_build_dir(self, user_id: Optional[int]) -> str:
+        """Create a private scratch directory to compile into"""
+        return tempfile.mkdtemp(prefix=".build-", dir=self._user_dir(user_id))
+
+    def store(self, user_id: Optional[int], key: str, build_dir: str) -> str:
+        """Publish a finished build directory under its key and evict old entries"""
+        entry = self._user_dir(user_id) / key
+        try:
+            os.rename(build_dir, entry)
+        except OSError:
+            # A concurrent build of the same source won the race; keep theirs
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+        self.evict(user_id)
+        return str(entry)
+
+    def discard(self, build_dir: str):
+        """Remove a scratch directory after a failed build"""
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+    def _entry_size(self, entry: Path) -> int:
+        size = 0
+        for root, dirs, files in os.walk(entry):
+            for file in files:
+                try:
+                    size += os.path.getsize(os.path.join(root, file))
+                except OSError:
+                    continue
+        return size
+
+    def evict(self, user_id: Optional[int]):
+        """Drop least recently used entries until the user's cache fits its cap"""
+        user_dir = self._user_dir(user_id)
+        entries = []
+        total_size = 0
+
+        for entry in user_dir.iterdir():
+            if not entry.is_dir():
+                continue
+            if entry.name.startswith(".build-"):
+                # Leftover from an interrupted build
+                if time.time() - entry.stat().st_mtime > 3600:
+                    shutil.rmtree(entry, ignore_errors=True)
+                continue
+            size = self._entry_size(entry)
+            entries.append((entry.stat().st_mtime, size, entry))
+            total_size += size
+
+        entries.sort()
+        while entries and total_size > self.max_size_per_user:
+            _, size, entry = entries.pop(0)
+            shutil.rmtree(entry, ignore_errors=True)
+            total_size -= size
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "cache_dir": str(self.cache_dir),
+            "max_size_per_user": self.max_size_per_user
+        }
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from typing import Optional
 
 class Settings:
@@ -32,15 +33,51 @@ class Settings:
     # Security Configuration
     ALLOWED_HOSTS: list = ["localhost", "127.0.0.1", "0.0.0.0"]
     CORS_ORIGINS: list = ["http://localhost:3000", "http://localhost:5000"]
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")  # bearer token for /metrics; unset means loopback only
     
     # File System Configuration
     MAX_FILE_SIZE: int = 50 * 1024 * 1024  # 50MB
+    FILE_WRITE_DURABILITY: str = os.getenv("FILE_WRITE_DURABILITY", "fsync")  # fsync, or none to skip syncing
+    FILE_HISTORY_MAX_DELTA_CHAIN: int = 50  # revisions stored as deltas before the next full snapshot
     MAX_PROJECT_SIZE: int = 500 * 1024 * 1024  # 500MB
     PROJECTS_DIR: str = os.path.join(os.getcwd(), "user_projects")
     
     # Terminal Configuration
     MAX_EXECUTION_TIME: int = 300  # 5 minutes
-    MAX_OUTPUT_SIZE: int = 1024 * 1024  # 1MB
+    MAX_EXECUTION_CPU_TIME: int = 300  # CPU seconds per execution
+    MAX_EXECUTION_MEMORY: int = 2 * 1024 * 1024 * 1024  # 2GB
+    MAX_EXECUTION_FILE_SIZE: int = 512 * 1024 * 1024  # 512MB per written file
+    MAX_EXECUTION_PROCESSES: int = 512  # per execution; needs EXECUTION_CGROUP_ROOT (pids.max)
+    EXECUTION_CGROUP_ROOT: str = os.getenv("EXECUTION_CGROUP_ROOT", "")  # delegated cgroup v2 dir, optional
+    MAX_CONCURRENT_EXECUTIONS: int = int(os.getenv("MAX_CONCURRENT_EXECUTIONS", str((os.cpu_count() or 2) * 2)))
+    MAX_CONCURRENT_EXECUTIONS_PER_USER: int = 4
+    MAX_EXECUTION_QUEUE_DEPTH: int = 200  # reject new work beyond this many waiting
+    MAX_OUTPUT_SIZE: int = 1024 * 1024  # 1MB per stream
+    COMPILE_CACHE_DIR: str = os.getenv("COMPILE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "shellide-compile-cache"))
+    COMPILE_CACHE_MAX_SIZE: int = 256 * 1024 * 1024  # 256MB per user
+    PYTHON_WORKER_POOL_SIZE: int = int(os.getenv("PYTHON_WORKER_POOL_SIZE", "2"))
+    PYTHON_WORKER_MAX_RUNS: int = 200  # recycle a worker after this many snippets
+    PYTHON_WORKER_MAX_RSS: int = 256 * 1024 * 1024  # or once one of its snippets peaks past 256MB
+    PACKAGE_CACHE_DIR: str = os.getenv("PACKAGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "shellide-package-cache"))
+    PACKAGE_CACHE_MAX_SIZE: int = 5 * 1024 * 1024 * 1024  # 5GB shared by all users
+    OUTPUT_SPILL_DIR: str = os.getenv("OUTPUT_SPILL_DIR", "")  # keep full output of truncated commands here
+    OUTPUT_SPILL_MAX_AGE: int = 60 * 60  # seconds a spill file is kept after its command
+    MAX_BATCH_STEPS: int = 50  # commands per batch request
+    EXECUTION_LOG_BATCH_SIZE: int = 100  # rows per bulk insert
+    EXECUTION_LOG_FLUSH_INTERVAL: float = 1.0  # seconds between flushes of a partial batch
+    EXECUTION_LOG_MAX_QUEUE: int = 10000  # shed log rows beyond this many pending
+    EXECUTION_LOG_OUTPUT_LIMIT: int = 16 * 1024  # characters of stdout/stderr kept per row
+    EXECUTION_LOG_STORE_BLOB: bool = os.getenv("EXECUTION_LOG_STORE_BLOB", "False").lower() == "true"
+    EXECUTION_LOG_RETENTION_DAYS: int = int(os.getenv("EXECUTION_LOG_RETENTION_DAYS", "90"))  # raw rows; rollups are kept
+    EXECUTION_LOG_OUTPUT_RETENTION_DAYS: int = int(os.getenv("EXECUTION_LOG_OUTPUT_RETENTION_DAYS", "14"))  # then output is dropped
+    EXECUTION_LOG_DELETE_CHUNK: int = 5000  # rows per delete/compaction transaction
+    EXECUTION_LOG_MAINTENANCE_INTERVAL: int = 60 * 60  # seconds between retention runs
+    MAX_TERMINAL_SESSIONS_PER_USER: int = 5
+    MAX_TERMINAL_SESSIONS: int = int(os.getenv("MAX_TERMINAL_SESSIONS", "200"))  # PTY shells across all users
+    MAX_BACKGROUND_PROCESSES_PER_USER: int = 3
+    BACKGROUND_PROCESS_IDLE_TIMEOUT: int = 60 * 60  # stop servers nobody has checked on for an hour
+    BACKGROUND_PROCESS_LOG_SIZE: int = 256 * 1024  # rolling log per process
+    TERMINAL_SESSION_IDLE_TIMEOUT: int = 30 * 60  # 30 minutes
     
     # Rate Limiting
     RATE_LIMIT_PER_MINUTE: int = 60
@@ -3,6 +3,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.ext.declarative import declarative_base
 from models import Base
+from migrations import migrate
 
 # Database configuration
 DATABASE_URL = os.getenv("DATABASE_URL") or f"postgresql://{os.getenv('PGUSER', 'shellide')}:{os.getenv('PGPASSWORD', 'shelluserpasswd')}@{os.getenv('PGHOST', 'localhost')}:{os.getenv('PGPORT', '5432')}/{os.getenv('PGDATABASE', 'shellide_db')}"
@@ -27,9 +28,11 @@ def get_db() -> Session:
         db.close()
 
 def create_tables():
-    """Create all tables in the database"""
+    """Create all tables in the database and upgrade existing ones"""
     try:
         Base.metadata.create_all(bind=engine)
+        # create_all leaves existing tables alone; add new columns and backfill them
+        migrate(engine)
         print("Database tables created successfully")
     except Exception as e:
         print(f"Error creating database tables: {e}")
@@ -0,0 +1,228 @@
+import math
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Callable, Tuple
+from sqlalchemy import func
+import models
+
+ROLLUP_PERIODS = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1)
+}
+# Leave room for rows still sitting in the log writer's queue
+ROLLUP_GRACE = timedelta(minutes=5)
+# Buckets rolled per period per run, so catching up on old data stays incremental
+MAX_BUCKETS_PER_RUN = 500
+
+def _floor(moment: datetime, period: str) -> datetime:
+    if period == "day":
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+def _percentile(values: List[int], q: float) -> Optional[int]:
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, math.ceil(q * len(values)) - 1))
+    return values[index]
+
+class ExecutionLogRetention:
+    """Rolls execution logs up into hourly/daily aggregates, then compacts and purges raw rows in chunks"""
+
+    def __init__(self, session_factory: Callable, retention_days: int, output_retention_days: int,
+                 chunk_size: int = 5000, interval: float = 3600):
+        self.session_factory = session_factory
+        self.retention = timedelta(days=retention_days)
+        self.output_retention = timedelta(days=output_retention_days)
+        self.chunk_size = chunk_size
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.runs = 0
+        self.buckets_rolled = 0
+        self.rows_compacted = 0
+        self.rows_purged = 0
+        self.last_run: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+
+    def _next_bucket(self, db, period: str) -> Optional[datetime]:
+        """Start of the first bucket not rolled up yet"""
+        rolled = db.query(func.max(models.ExecutionLogRollup.period_start)).filter(
+            models.ExecutionLogRollup.period == period
+        ).scalar()
+        if rolled is not None:
+            return rolled + ROLLUP_PERIODS[period]
+
+        oldest = db.query(func.min(models.ExecutionLog.created_at)).scalar()
+        return _floor(oldest, period) if oldest is not None else None
+
+    def _rollup_bucket(self, db, period: str, start: datetime) -> List[models.ExecutionLogRollup]:
+        end = start + ROLLUP_PERIODS[period]
+        rows = db.query(
+            models.ExecutionLog.user_id,
+            models.ExecutionLog.project_id,
+            models.ExecutionLog.exit_code,
+            models.ExecutionLog.execution_time,
+            models.ExecutionLog.cpu_time
+        ).filter(
+            models.ExecutionLog.created_at >= start,
+            models.ExecutionLog.created_at < end
+        ).all()
+
+        groups: Dict[Tuple[int, Optional[int]], List] = {}
+        for row in rows:
+            groups.setdefault((row.user_id, row.project_id), []).append(row)
+
+        rollups = []
+        for (user_id, project_id), group in groups.items():
+            times = sorted(row.execution_time for row in group if row.execution_time is not None)
+            cpu_times = [row.cpu_time for row in group if row.cpu_time is not None]
+            rollups.append(models.ExecutionLogRollup(
+                period=period,
+                period_start=start,
+                user_id=user_id,
+                project_id=project_id,
+                count=len(group),
+                error_count=sum(1 for row in group if row.exit_code not in (0, None)),
+                avg_execution_time=sum(times) / len(times) if times else None,
+                p50_execution_time=_percentile(times, 0.5),
+                p95_execution_time=_percentile(times, 0.95),
+                total_cpu_time=sum(cpu_times) if cpu_times else None
+            ))
+        return rollups
+
+    def rollup(self, now: datetime) -> int:
+        """Aggregate every closed bucket since the last run; returns the number of buckets rolled"""
+        rolled = 0
+        db = self.session_factory()
+        try:
+            for period, width in ROLLUP_PERIODS.items():
+                start = self._next_bucket(db, period)
+                if start is None:
+                    continue
+                closed_before = _floor(now - ROLLUP_GRACE, period)
+                buckets = 0
+                while start + width <= closed_before and buckets < MAX_BUCKETS_PER_RUN:
+                    rollups = self._rollup_bucket(db, period, start)
+                    if not rollups:
+                        # Jump over idle stretches instead of visiting every empty bucket
+                        later = db.query(func.min(models.ExecutionLog.created_at)).filter(
+                            models.ExecutionLog.created_at >= start
+                        ).scalar()
+                        if later is None:
+                            break
+                        start = _floor(later, period)
+                        continue
+                    db.add_all(rollups)
+                    db.commit()
+                    start += width
+                    buckets += 1
+                rolled += buckets
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return rolled
+
+    def _in_chunks(self, build_query: Callable, apply: Callable) -> int:
+        """Apply a change to matching rows chunk_size ids at a time, committing per chunk"""
+        total = 0
+        db = self.session_factory()
+        try:
+            while True:
+                ids = [row.id for row in build_query(db).order_by(models.ExecutionLog.id).limit(self.chunk_size)]
+                if not ids:
+                    break
+                apply(db.query(models.ExecutionLog).filter(models.ExecutionLog.id.in_(ids)))
+                db.commit()
+                total += len(ids)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return total
+
+    def compact(self, now: datetime) -> int:
+        """Drop stored output of rows older than the output retention, keeping their metadata"""
+        cutoff = now - self.output_retention
+        return self._in_chunks(
+            lambda db: db.query(models.ExecutionLog.id).filter(
+                models.ExecutionLog.created_at < cutoff,
+                (models.ExecutionLog.output.isnot(None)) |
+                (models.ExecutionLog.error.isnot(None)) |
+                (models.ExecutionLog.output_blob.isnot(None))
+            ),
+            lambda query: query.update(
+                {"output": None, "error": None, "output_blob": None},
+                synchronize_session=False
+            )
+        )
+
+    def purge(self, now: datetime) -> int:
+        """Delete raw rows older than the retention; their rollups stay"""
+        cutoff = now - self.retention
+        # Never delete rows a capped rollup run has not reached yet
+        db = self.session_factory()
+        try:
+            pending = [self._next_bucket(db, period) for period in ROLLUP_PERIODS]
+        finally:
+            db.close()
+        pending = [start for start in pending if start is not None]
+        if pending:
+            cutoff = min([cutoff] + pending)
+        return self._in_chunks(
+            lambda db: db.query(models.ExecutionLog.id).filter(models.ExecutionLog.created_at < cutoff),
+            lambda query: query.delete(synchronize_session=False)
+        )
+
+    def run_once(self) -> Dict[str, int]:
+        """One maintenance pass; rollups run first so purged rows are already aggregated"""
+        now = datetime.utcnow()
+        result = {
+            "buckets_rolled": self.rollup(now),
+            "rows_compacted": self.compact(now),
+            "rows_purged": self.purge(now)
+        }
+        self.runs += 1
+        self.buckets_rolled += result["buckets_rolled"]
+        self.rows_compacted += result["rows_compacted"]
+        self.rows_purged += result["rows_purged"]
+        self.last_run = now
+        return result
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.run_once)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Execution log maintenance failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "buckets_rolled": self.buckets_rolled,
+            "rows_compacted": self.rows_compacted,
+            "rows_purged": self.rows_purged,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            "last_error": self.last_error
+        }
@@ -0,0 +1,159 @@
+import json
+import zlib
+import asyncio
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable, Tuple
+import models
+
+class ExecutionLogWriter:
+    """Buffers execution log rows and bulk-inserts them off the request path"""
+
+    def __init__(self, session_factory: Callable, batch_size: int = 100, flush_interval: float = 1.0,
+                 max_queue: int = 10000, output_limit: int = 16 * 1024, store_blob: bool = False):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.output_limit = output_limit
+        self.store_blob = store_blob
+
+        self._queue: deque = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+        # Metrics
+        self.enqueued = 0
+        self.written = 0
+        self.shed_output = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+
+    def _truncate(self, text: Optional[str]) -> Tuple[str, bool]:
+        text = text or ""
+        if len(text) <= self.output_limit:
+            return text, False
+        return text[:self.output_limit], True
+
+    def _build_row(self, user_id: int, project_id: Optional[int], command: str,
+                   result: Dict[str, Any], keep_output: bool) -> Dict[str, Any]:
+        usage = result.get("resource_usage") or {}
+        row = {
+            "user_id": user_id,
+            "project_id": project_id,
+            "command": command,
+            "exit_code": result.get("exit_code", 0),
+            "execution_time": result.get("execution_time", 0),
+            "cpu_time": usage.get("cpu_time_ms"),
+            "max_rss": usage.get("max_rss_kb"),
+            "io_read_bytes": usage.get("io_read_bytes"),
+            "io_write_bytes": usage.get("io_write_bytes"),
+            "created_at": datetime.utcnow(),
+            "output": None,
+            "error": None,
+            "output_truncated": False,
+            "output_blob": None
+        }
+        if not keep_output:
+            return row
+
+        stdout, stdout_truncated = self._truncate(result.get("stdout"))
+        stderr, stderr_truncated = self._truncate(result.get("stderr"))
+        row["output"] = stdout
+        row["error"] = stderr
+        row["output_truncated"] = stdout_truncated or stderr_truncated
+        if row["output_truncated"] and self.store_blob:
+            full = json.dumps({"stdout": result.get("stdout", ""), "stderr": result.get("stderr", "")})
+            row["output_blob"] = zlib.compress(full.encode("utf-8"), 6)
+        return row
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.ensure_future(self._run())
+
+    def enqueue(self, user_id: int, project_id: Optional[int], command: str, result: Dict[str, Any]) -> bool:
+        """Queue a log row; returns False if it was shed because the queue is full.
+
+        Past half the queue, rows keep their metadata but not their output, so
+        a slow database costs history detail before it costs rows.
+        """
+        if len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            return False
+
+        keep_output = len(self._queue) < self.max_queue // 2
+        if not keep_output:
+            self.shed_output += 1
+        self._queue.append(self._build_row(user_id, project_id, command, result, keep_output))
+        self.enqueued += 1
+
+        self._ensure_started()
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Execution log flush failed: {e}")
+
+    def _insert(self, batch: List[Dict[str, Any]]):
+        db = self.session_factory()
+        try:
+            db.bulk_insert_mappings(models.ExecutionLog, batch)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def flush(self):
+        """Write everything queued so far, one bulk insert per batch"""
+        if self._flush_lock is None:
+            return
+        async with self._flush_lock:
+            loop = asyncio.get_event_loop()
+            while self._queue:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                try:
+                    await loop.run_in_executor(None, self._insert, batch)
+                except Exception as e:
+                    self.failed += len(batch)
+                    print(f"Dropped {len(batch)} execution log rows: {e}")
+                    continue
+                self.written += len(batch)
+                self.batches += 1
+
+    async def close(self):
+        """Stop the background flusher and write what is left"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "queued": len(self._queue),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "batches": self.batches,
+            "shed_output": self.shed_output,
+            "dropped": self.dropped,
+            "failed": self.failed
+        }
@@ -0,0 +1,138 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, Hashable
+from fastapi import HTTPException
+
+class ExecutionScheduler:
+    """Admission control for spawned commands: global and per-user caps with fair queuing"""
+
+    def __init__(self, max_concurrent: int, max_per_user: int, max_queue_depth: int):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.max_queue_depth = max_queue_depth
+
+        self.running = 0
+        self.running_by_user: Dict[Hashable, int] = {}
+        self.waiters: Dict[Hashable, deque] = {}
+        # Users with queued work, in round-robin order
+        self._turns: deque = deque()
+
+        # Metrics
+        self.admitted = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for q in self.waiters.values())
+
+    def _user_key(self, user_id: Optional[int]) -> Hashable:
+        return user_id if user_id is not None else "anonymous"
+
+    def _can_start(self, user: Hashable) -> bool:
+        return self.running < self.max_concurrent and self.running_by_user.get(user, 0) < self.max_per_user
+
+    def _start(self, user: Hashable):
+        self.running += 1
+        self.running_by_user[user] = self.running_by_user.get(user, 0) + 1
+        self.admitted += 1
+
+    async def acquire(self, user_id: Optional[int] = None):
+        """Wait for an execution slot, or fail fast when the queue is full"""
+        user = self._user_key(user_id)
+
+        # Anyone queued while there is global capacity is blocked by their own
+        # per-user cap, so starting right away does not jump the line
+        if not self.waiters.get(user) and self._can_start(user):
+            self._start(user)
+            return
+
+        if self.queued >= self.max_queue_depth:
+            self.rejected += 1
+            raise HTTPException(status_code=429, detail="Execution queue is full, try again later")
+
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        enqueued_at = loop.time()
+        if user not in self.waiters:
+            self.waiters[user] = deque()
+            self._turns.append(user)
+        self.waiters[user].append(future)
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was granted just as we were cancelled; hand it on
+                self.release(user_id)
+            else:
+                self._remove_waiter(user, future)
+            raise
+
+        waited = loop.time() - enqueued_at
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    def _remove_waiter(self, user: Hashable, future: asyncio.Future):
+        queue = self.waiters.get(user)
+        if queue and future in queue:
+            queue.remove(future)
+            if not queue:
+                del self.waiters[user]
+                self._turns.remove(user)
+
+    def release(self, user_id: Optional[int] = None):
+        """Give back a slot and admit the next waiter"""
+        user = self._user_key(user_id)
+        self.running -= 1
+        self.running_by_user[user] -= 1
+        if not self.running_by_user[user]:
+            del self.running_by_user[user]
+        self._dispatch()
+
+    def _dispatch(self):
+        """Admit waiters round-robin across users while capacity remains"""
+        while self.running < self.max_concurrent and self._turns:
+            for _ in range(len(self._turns)):
+                user = self._turns[0]
+                self._turns.rotate(-1)
+                if self.running_by_user.get(user, 0) < self.max_per_user:
+                    break
+            else:
+                # Every waiting user is at their own limit
+                return
+
+            future = self.waiters[user].popleft()
+            if not self.waiters[user]:
+                del self.waiters[user]
+                self._turns.remove(user)
+
+            self._start(user)
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, user_id: Optional[int] = None):
+        """Hold an execution slot for the duration of the block"""
+        await self.acquire(user_id)
+        try:
+            yield
+        finally:
+            self.release(user_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth and admission metrics"""
+        return {
+            "running": self.running,
+            "queued": self.queued,
+            "max_concurrent": self.max_concurrent,
+            "max_per_user": self.max_per_user,
+            "max_queue_depth": self.max_queue_depth,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_wait_ms": int(self.total_wait / self.admitted * 1000) if self.admitted else 0,
+            "max_wait_ms": int(self.max_wait * 1000),
+            "queued_by_user": {str(user): len(q) for user, q in self.waiters.items()},
+            "running_by_user": {str(user): count for user, count in self.running_by_user.items()}
+        }
@@ -0,0 +1,487 @@
+import os
+import stat
+import struct
+import asyncio
+import ctypes
+import ctypes.util
+import threading
+import posixpath
+import mimetypes
+from typing import Dict, Any, List, Optional, Iterator, Tuple, Set, Callable
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0o2000000)
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+# Dependency and build output directories left out of project listings and search
+IGNORED_DIRS = {"node_modules", "__pycache__", "build", "dist"}
+
+def is_ignored_dir(name: str) -> bool:
+    return name.startswith(".") or name in IGNORED_DIRS
+
+def _load_inotify():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1, libc.inotify_add_watch, libc.inotify_rm_watch
+    except (OSError, AttributeError):
+        return None
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+class FileNode:
+    __slots__ = ("name", "is_dir", "size", "mtime", "parent", "children", "encoding")
+
+    def __init__(self, name: str, is_dir: bool, size: int, mtime: float, parent: "FileNode" = None):
+        self.name = name
+        self.is_dir = is_dir
+        # For directories, the total size of every file below them
+        self.size = size
+        self.mtime = mtime
+        self.parent = parent
+        self.children: Optional[Dict[str, "FileNode"]] = {} if is_dir else None
+        # Detected text encoding, filled in by the first read ("" for binary)
+        self.encoding: Optional[str] = None
+
+class FileIndex:
+    """In-memory tree of a directory, kept current with inotify (or polling where that is unavailable)"""
+
+    def __init__(self, root: str, poll_interval: float = 5.0, debounce: float = 0.05):
+        self.root = os.path.abspath(root)
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+
+        self.tree: Optional[FileNode] = None
+        self._build_lock = threading.Lock()
+        self._mime_types: Dict[str, Optional[str]] = {}
+        self._subscribers: Set[asyncio.Queue] = set()
+        # Called synchronously with every event, e.g. by the search index
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+        self._libc = None
+        self._inotify_fd: Optional[int] = None
+        self._watches: Dict[int, str] = {}  # watch descriptor -> directory
+        self._watch_failed = False
+        self._pending: Set[str] = set()
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._poll_task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.mode = "idle"  # inotify, polling
+
+    # Building
+
+    def normalize(self, path: str) -> str:
+        """Path relative to the root, as used for keys and events"""
+        path = posixpath.normpath(str(path).replace("\\", "/")).lstrip("/")
+        return "" if path == "." else path
+
+    def _scan(self, full_path: str, name: str, parent: Optional[FileNode], st: os.stat_result,
+              watch: bool = False) -> FileNode:
+        """Index a path and, for directories, everything below it; watch=True adds inotify watches as it goes"""
+        node = FileNode(name, stat.S_ISDIR(st.st_mode), 0 if stat.S_ISDIR(st.st_mode) else st.st_size, st.st_mtime, parent)
+        stack = [(node, full_path, self.normalize(os.path.relpath(full_path, self.root)))] if node.is_dir else []
+        while stack:
+            directory, directory_path, directory_rel = stack.pop()
+            # Watch before listing, so anything created after the listing is reported
+            if watch and not self._add_watch(directory_rel):
+                self._watch_failed = True
+                watch = False
+            try:
+                entries = list(os.scandir(directory_path))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    entry_stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                is_dir = stat.S_ISDIR(entry_stat.st_mode)
+                child = FileNode(entry.name, is_dir, 0 if is_dir else entry_stat.st_size, entry_stat.st_mtime, directory)
+                directory.children[entry.name] = child
+                if is_dir:
+                    stack.append((child, entry.path, posixpath.join(directory_rel, entry.name) if directory_rel else entry.name))
+        if node.is_dir:
+            self._sum_sizes(node)
+        return node
+
+    def _sum_sizes(self, node: FileNode) -> int:
+        # Iterative post-order so deep trees do not hit the recursion limit
+        order, stack = [], [node]
+        while stack:
+            current = stack.pop()
+            order.append(current)
+            stack.extend(child for child in current.children.values() if child.is_dir)
+        for current in reversed(order):
+            current.size = sum(child.size for child in current.children.values())
+        return node.size
+
+    def _build(self, watch: bool = False) -> FileNode:
+        return self._scan(self.root, "", None, os.stat(self.root), watch)
+
+    def ensure_built(self):
+        if self.tree is None:
+            with self._build_lock:
+                if self.tree is None:
+                    self.tree = self._build()
+
+    # Queries
+
+    def get(self, path: str) -> Optional[FileNode]:
+        self.ensure_built()
+        node = self.tree
+        rel = self.normalize(path)
+        if not rel:
+            return node
+        for part in rel.split("/"):
+            if node.children is None:
+                return None
+            node = node.children.get(part)
+            if node is None:
+                return None
+        return node
+
+    def list_dir(self, path: str) -> Optional[List[Tuple[str, FileNode]]]:
+        """(relative path, node) of a directory's entries, or None if it is not an indexed directory"""
+        node = self.get(path)
+        if node is None or not node.is_dir:
+            return None
+        rel = self.normalize(path)
+        return [(posixpath.join(rel, name) if rel else name, child) for name, child in node.children.items()]
+
+    def walk(self, path: str = "", skip_dir: Callable[[str], bool] = None,
+             relative: bool = False) -> Iterator[Tuple[str, FileNode]]:
+        """(path, node) of every file below a directory; skip_dir(name) prunes directories.
+
+        Paths are relative to the root, or to the walked directory with relative=True.
+        """
+        node = self.get(path)
+        if node is None or not node.is_dir:
+            return
+        stack = [("" if relative else self.normalize(path), node)]
+        while stack:
+            rel, directory = stack.pop()
+            for name, child in list(directory.children.items()):
+                child_rel = posixpath.join(rel, name) if rel else name
+                if child.is_dir:
+                    if not (skip_dir and skip_dir(name)):
+                        stack.append((child_rel, child))
+                else:
+                    yield child_rel, child
+
+    def mime_type(self, name: str) -> Optional[str]:
+        """mimetypes only looks at the extension, so guess once per extension"""
+        suffix = os.path.splitext(name)[1].lower()
+        if suffix not in self._mime_types:
+            self._mime_types[suffix] = mimetypes.guess_type("file" + suffix)[0] if suffix else None
+        return self._mime_types[suffix]
+
+    # Updates
+
+    def _add_size(self, node: Optional[FileNode], delta: int):
+        while node is not None and delta:
+            node.size += delta
+            node = node.parent
+
+    def _emit(self, event_type: str, rel: str, is_dir: bool):
+        event = {"type": event_type, "path": rel, "is_dir": is_dir}
+        for listener in self._listeners:
+            listener(event)
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A slow client gets told to reload instead of a stale partial stream
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync", "path": "", "is_dir": True})
+
+    def refresh(self, path: str, scanned: Optional[FileNode] = None):
+        """Bring one path (and, if it is a new directory, its contents) up to date with the disk.
+
+        scanned is the path's directory, already indexed off the event loop.
+        """
+        if self.tree is None:
+            return
+        rel = self.normalize(path)
+        if not rel:
+            self._resync()
+            return
+
+        parent_rel, name = posixpath.split(rel)
+        parent = self.get(parent_rel)
+        if parent is None or not parent.is_dir:
+            # The parent is new as well; indexing it picks this path up
+            self.refresh(parent_rel)
+            return
+
+        full_path = os.path.join(self.root, rel)
+        old = parent.children.get(name)
+        try:
+            st = os.lstat(full_path)
+        except OSError:
+            st = None
+
+        if st is None:
+            if old is not None:
+                del parent.children[name]
+                self._add_size(parent, -old.size)
+                self._emit("deleted", rel, old.is_dir)
+            return
+
+        is_dir = stat.S_ISDIR(st.st_mode)
+        if old is not None and old.is_dir == is_dir:
+            if is_dir:
+                old.mtime = st.st_mtime
+                return
+            if old.size != st.st_size or old.mtime != st.st_mtime:
+                self._add_size(parent, st.st_size - old.size)
+                old.size, old.mtime = st.st_size, st.st_mtime
+                old.encoding = None
+                self._emit("modified", rel, False)
+            return
+
+        if old is not None:
+            del parent.children[name]
+            self._add_size(parent, -old.size)
+            self._emit("deleted", rel, old.is_dir)
+        if scanned is not None and is_dir:
+            node = scanned
+            node.parent = parent
+        else:
+            node = self._scan(full_path, name, parent, st, watch=self._inotify_fd is not None)
+            self._check_watches()
+        parent.children[name] = node
+        self._add_size(parent, node.size)
+        self._emit("created", rel, is_dir)
+
+    def _diff(self, rel: str, old: FileNode, new: FileNode):
+        """Emit events for what changed between two scans of the same directory"""
+        for name, child in new.children.items():
+            child_rel = posixpath.join(rel, name) if rel else name
+            previous = old.children.get(name)
+            if previous is None or previous.is_dir != child.is_dir:
+                if previous is not None:
+                    self._emit("deleted", child_rel, previous.is_dir)
+                self._emit("created", child_rel, child.is_dir)
+            elif child.is_dir:
+                self._diff(child_rel, previous, child)
+            elif previous.size != child.size or previous.mtime != child.mtime:
+                self._emit("modified", child_rel, False)
+        for name, child in old.children.items():
+            if name not in new.children:
+                self._emit("deleted", posixpath.join(rel, name) if rel else name, child.is_dir)
+
+    def _swap(self, tree: FileNode):
+        old, self.tree = self.tree, tree
+        if old is not None:
+            self._diff("", old, tree)
+
+    def _resync(self):
+        if self._loop is None:
+            self._swap(self._build())
+            return
+        # A full scan is too slow for the event loop; queue it for the background flush
+        self._pending.add("")
+        self._schedule_flush()
+
+    async def _refresh_in_background(self, rel: str):
+        """refresh(), with any new directory scanned in the executor"""
+        # Start from the outermost directory the index does not know about yet
+        while rel:
+            parent = self.get(posixpath.dirname(rel))
+            if parent is not None and parent.is_dir:
+                break
+            rel = posixpath.dirname(rel)
+        if not rel:
+            tree = await self._loop.run_in_executor(None, self._build, self._inotify_fd is not None)
+            self._swap(tree)
+            self._check_watches()
+            return
+
+        full_path = os.path.join(self.root, rel)
+        try:
+            st = os.lstat(full_path)
+        except OSError:
+            st = None
+        scanned = None
+        existing = self.get(rel)
+        if st is not None and stat.S_ISDIR(st.st_mode) and (existing is None or not existing.is_dir):
+            scanned = await self._loop.run_in_executor(
+                None, self._scan, full_path, posixpath.basename(rel), None, st, self._inotify_fd is not None
+            )
+            self._check_watches()
+        self.refresh(rel, scanned)
+
+    # Watching
+
+    def _add_watch(self, rel: str) -> bool:
+        fd = self._inotify_fd
+        if fd is None:
+            # Stopped while a scan was running
+            return True
+        wd = self._libc.inotify_add_watch(fd, os.path.join(self.root, rel).encode(), WATCH_MASK)
+        if wd < 0:
+            return ctypes.get_errno() != 28  # ENOSPC: out of watches; other errors mean the directory went away
+        self._watches[wd] = rel
+        return True
+
+    def _check_watches(self):
+        """Fall back to polling if a scan ran out of inotify watches"""
+        if self._watch_failed:
+            self._watch_failed = False
+            if self._inotify_fd is not None:
+                print(f"inotify watch limit reached for {self.root}, falling back to polling")
+                self._stop_inotify()
+                self._start_polling()
+
+    def _read_events(self):
+        try:
+            data = os.read(self._inotify_fd, 64 * 1024)
+        except (BlockingIOError, InterruptedError):
+            return
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+            offset += EVENT_HEADER.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                self._pending.add("")
+            elif mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+            elif wd in self._watches:
+                directory = self._watches[wd]
+                if name:
+                    name = os.fsdecode(name)
+                    self._pending.add(posixpath.join(directory, name) if directory else name)
+                else:
+                    self._pending.add(directory)
+
+        if self._pending:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_handle is None:
+            # Coalesce bursts (a save is several events, npm install thousands)
+            self._flush_handle = self._loop.call_later(self.debounce, self._flush_pending)
+
+    def _flush_pending(self):
+        self._flush_handle = None
+        # One flush at a time; a running one picks up whatever arrived meanwhile
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._apply_pending())
+
+    async def _apply_pending(self):
+        while self._pending:
+            pending, self._pending = self._pending, set()
+            if "" in pending:
+                await self._refresh_in_background("")
+                continue
+            # Parents first so new directories are indexed before their contents
+            for rel in sorted(pending, key=lambda p: p.count("/")):
+                try:
+                    await self._refresh_in_background(rel)
+                except OSError as e:
+                    print(f"Warning: could not index {rel}: {e}")
+
+    def _start_inotify(self) -> bool:
+        self._libc = self._libc or _load_inotify()
+        if self._libc is None:
+            return False
+        fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return False
+        self._inotify_fd = fd
+        self.mode = "inotify"
+        self._loop.add_reader(fd, self._read_events)
+        return True
+
+    def _stop_inotify(self):
+        if self._inotify_fd is not None:
+            self._loop.remove_reader(self._inotify_fd)
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
+            self._watches.clear()
+
+    async def _poll(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                tree = await loop.run_in_executor(None, self._build)
+            except OSError:
+                continue
+            self._swap(tree)
+
+    def _start_polling(self):
+        self.mode = "polling"
+        if self._poll_task is None or self._poll_task.done():
+            self._poll_task = asyncio.ensure_future(self._poll())
+
+    async def start(self):
+        """Build the index off the event loop and start following changes"""
+        self._loop = asyncio.get_event_loop()
+        # Follow changes first so nothing created during the build is missed
+        watching = self._start_inotify()
+        if self.tree is None or watching:
+            tree = await self._loop.run_in_executor(None, self._build, watching)
+            with self._build_lock:
+                if self.tree is None:
+                    self.tree = tree
+                    tree = None
+            if tree is not None:
+                # Built on demand in the meantime; this build also set the watches
+                self._swap(tree)
+        self._check_watches()
+        if not watching:
+            self._start_polling()
+
+    def stop(self):
+        self._stop_inotify()
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            self._poll_task = None
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        self._pending.clear()
+        self.mode = "idle"
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        self._listeners.append(listener)
+
+    def subscribe(self, max_events: int = 1000) -> asyncio.Queue:
+        """Queue of created/modified/deleted events for paths under the root"""
+        queue = asyncio.Queue(maxsize=max_events)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "root": self.root,
+            "mode": self.mode,
+            "built": self.tree is not None,
+            "size": self.tree.size if self.tree is not None else 0,
+            "watches": len(self._watches),
+            "subscribers": len(self._subscribers)
+        }
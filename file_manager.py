@@ -1,10 +1,16 @@
 import os
 import json
 import shutil
+from itertools import islice
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, Tuple
 from fastapi import HTTPException
 import mimetypes
+from file_index import FileIndex, FileNode, is_ignored_dir
+from search_index import TrigramIndex
+from text_encoding import detect_encoding, SNIFF_SIZE
+from text_patch import PatchError, content_version, apply_edits, apply_unified_diff
+from atomic_write import atomic_write
 
 class FileManager:
     def __init__(self, base_path: str = "./workspace"):
@@ -28,6 +34,10 @@ class FileManager:
             '.mp3', '.wav', '.ogg', '.mp4', '.avi', '.mkv', '.mov',
             '.zip', '.tar', '.gz', '.rar', '.7z', '.pdf', '.doc', '.docx'
         }
+        
+        # Listings and searches are served from memory; start() the index to follow changes
+        self.index = FileIndex(str(self.base_path))
+        self.search_index = TrigramIndex(self.index, self.allowed_extensions)
     
     def _is_safe_path(self, path: str) -> bool:
         """Check if path is safe (within workspace)"""
@@ -62,11 +72,36 @@ class FileManager:
                 "error": str(e)
             }
     
+    def _node_info(self, rel_path: str, node: FileNode) -> Dict[str, Any]:
+        """File information from the index, without touching the disk"""
+        extension = os.path.splitext(node.name)[1]
+        return {
+            "name": node.name,
+            "path": rel_path,
+            "type": "directory" if node.is_dir else "file",
+            "size": 0 if node.is_dir else node.size,
+            "modified": node.mtime,
+            "mime_type": self.index.mime_type(node.name),
+            "extension": extension,
+            "is_binary": extension.lower() in self.binary_extensions,
+            "is_allowed": extension.lower() in self.allowed_extensions or node.is_dir
+        }
+    
     def list_files(self, path: str = ".") -> List[Dict[str, Any]]:
         """List files in directory"""
         if not self._is_safe_path(path):
             raise HTTPException(status_code=400, detail="Invalid path")
         
+        entries = self.index.list_dir(path)
+        if entries is not None:
+            files = [
+                self._node_info(rel_path, node) for rel_path, node in entries
+                if not node.name.startswith('.') or node.name in ['.env', '.gitignore']
+            ]
+            files.sort(key=lambda x: (x["type"] != "directory", x["name"].lower()))
+            return files
+        
+        # Not indexed (yet): a symlinked directory, or created since the last event
         try:
             target_path = self.base_path / path
             if not target_path.exists():
@@ -96,6 +131,149 @@ class FileManager:
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error listing files: {str(e)}")
     
+    def _readable_file(self, path: str) -> Tuple[Path, os.stat_result]:
+        """Validate a path for reading and stat it once"""
+        if not self._is_safe_path(path):
+            raise HTTPException(status_code=400, detail="Invalid path")
+        
+        file_path = self.base_path / path
+        try:
+            stat = file_path.stat()
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="File not found")
+        
+        if not file_path.is_file():
+            raise HTTPException(status_code=400, detail="Path is not a file")
+        if file_path.suffix.lower() not in self.allowed_extensions:
+            raise HTTPException(status_code=400, detail="File type not supported")
+        if file_path.suffix.lower() in self.binary_extensions:
+            raise HTTPException(status_code=400, detail="Cannot read binary file")
+        return file_path, stat
+    
+    def file_etag(self, stat: os.stat_result) -> str:
+        """Validator that changes whenever the file is written"""
+        return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    
+    def stat_file(self, path: str) -> Dict[str, Any]:
+        """What a raw read needs up front: location, size, ETag and type, without opening the file"""
+        file_path, stat = self._readable_file(path)
+        return {
+            "full_path": str(file_path),
+            "size": stat.st_size,
+            "modified": stat.st_mtime,
+            "etag": self.file_etag(stat),
+            "mime_type": self.index.mime_type(file_path.name)
+        }
+    
+    def iter_bytes(self, full_path: str, start: int, end: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """Bytes start..end (inclusive) of a file, chunk_size at a time"""
+        with open(full_path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+    
+    def _cache_encoding(self, path: str, stat: os.stat_result, encoding: Optional[str]):
+        node = self.index.get(path)
+        if node is not None and not node.is_dir and node.mtime == stat.st_mtime and node.size == stat.st_size:
+            node.encoding = encoding or ""  # "" marks binary
+    
+    def _detect_encoding(self, path: str, file_path: Path, stat: os.stat_result) -> Optional[str]:
+        """Encoding of a file (None if binary), cached on its index node until it changes"""
+        node = self.index.get(path)
+        if (node is not None and node.encoding is not None
+                and node.mtime == stat.st_mtime and node.size == stat.st_size):
+            return node.encoding or None
+        
+        with open(file_path, 'rb') as f:
+            prefix = f.read(SNIFF_SIZE)
+        encoding = detect_encoding(prefix, complete=len(prefix) == stat.st_size)
+        self._cache_encoding(path, stat, encoding)
+        return encoding
+    
+    def _read_text(self, path: str, file_path: Path, stat: os.stat_result) -> Tuple[str, str]:
+        """Decode a whole file once with its detected encoding"""
+        encoding = self._detect_encoding(path, file_path, stat)
+        if encoding is None:
+            raise HTTPException(status_code=400, detail="Cannot decode file content")
+        
+        try:
+            with open(file_path, 'r', encoding=encoding) as f:
+                return f.read(), encoding
+        except UnicodeDecodeError:
+            # Valid UTF-8 for the sniffed prefix only; latin-1 decodes anything
+            self._cache_encoding(path, stat, 'latin-1')
+            with open(file_path, 'r', encoding='latin-1') as f:
+                return f.read(), 'latin-1'
+    
+    def patch_file(self, path: str, base_version: str, edits: List[Dict[str, Any]] = None,
+                   diff: str = None, include_content: bool = False) -> Dict[str, Any]:
+        """Apply range edits or a unified diff to a file that is still at base_version"""
+        if (edits is None) == (diff is None):
+            raise HTTPException(status_code=400, detail="Provide either edits or diff")
+        
+        file_path, stat = self._readable_file(path)
+        content, encoding = self._read_text(path, file_path, stat)
+        current_version = content_version(content)
+        if current_version != base_version:
+            raise HTTPException(
+                status_code=409,
+                detail=f"File has changed since the base version; current version is {current_version}"
+            )
+        
+        try:
+            new_content = apply_edits(content, edits) if edits is not None else apply_unified_diff(content, diff)
+        except PatchError as e:
+            raise HTTPException(status_code=422, detail=f"Patch does not apply: {e}")
+        
+        try:
+            try:
+                atomic_write(file_path, new_content, encoding)
+            except UnicodeEncodeError:
+                atomic_write(file_path, new_content)  # The edit added characters the old encoding lacks
+        except OSError as e:
+            raise HTTPException(status_code=500, detail=f"Error patching file: {str(e)}")
+        self.index.refresh(path)
+        
+        result = {
+            "message": "File patched successfully",
+            "path": path,
+            "version": content_version(new_content),
+            "previous_version": current_version,
+            **self._get_file_info(file_path)
+        }
+        if include_content:
+            result["content"] = new_content
+        return result
+    
+    def read_lines(self, path: str, start_line: int = 1, line_count: int = 200) -> Dict[str, Any]:
+        """A window of lines, reading only as far into the file as the window ends"""
+        file_path, stat = self._readable_file(path)
+        start_line = max(1, start_line)
+        line_count = max(1, min(line_count, 5000))
+        
+        encoding = self._detect_encoding(path, file_path, stat)
+        if encoding is None:
+            raise HTTPException(status_code=400, detail="Cannot decode file content")
+        
+        with open(file_path, 'r', encoding=encoding, errors='replace', newline='') as f:
+            window = list(islice(f, start_line - 1, start_line - 1 + line_count + 1))
+        
+        has_more = len(window) > line_count
+        return {
+            "path": path,
+            "start_line": start_line,
+            "lines": [line.rstrip('\r\n') for line in window[:line_count]],
+            "has_more": has_more,
+            "encoding": encoding,
+            "size": stat.st_size,
+            "etag": self.file_etag(stat)
+        }
+    
     def read_file(self, path: str) -> Dict[str, Any]:
         """Read file content"""
         if not self._is_safe_path(path):
@@ -117,29 +295,15 @@ class FileManager:
             if file_path.suffix.lower() in self.binary_extensions:
                 raise HTTPException(status_code=400, detail="Cannot read binary file")
             
-            # Try to read as text
-            encodings = ['utf-8', 'utf-16', 'latin-1', 'cp1252']
-            content = None
-            encoding_used = None
-            
-            for encoding in encodings:
-                try:
-                    with open(file_path, 'r', encoding=encoding) as f:
-                        content = f.read()
-                        encoding_used = encoding
-                        break
-                except UnicodeDecodeError:
-                    continue
-            
-            if content is None:
-                raise HTTPException(status_code=400, detail="Cannot decode file content")
+            content, encoding_used = self._read_text(path, file_path, file_path.stat())
             
             file_info = self._get_file_info(file_path)
             return {
                 **file_info,
                 "content": content,
                 "encoding": encoding_used,
-                "lines": len(content.splitlines())
+                "version": content_version(content),
+                "lines": content.count('\n') + (1 if content and not content.endswith('\n') else 0)
             }
             
         except HTTPException:
@@ -166,8 +330,8 @@ class FileManager:
                 raise HTTPException(status_code=400, detail="File type not supported")
             
             # Write file content
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            atomic_write(file_path, content)
+            self.index.refresh(path)
             
             return {
                 "message": "File created successfully",
@@ -194,22 +358,14 @@ class FileManager:
             if not file_path.is_file():
                 raise HTTPException(status_code=400, detail="Path is not a file")
             
-            # Backup original file
-            backup_content = None
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    backup_content = f.read()
-            except:
-                pass
-            
             # Write new content
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            atomic_write(file_path, content)
+            self.index.refresh(path)
             
             return {
                 "message": "File updated successfully",
                 "path": path,
-                "backup_available": backup_content is not None,
+                "version": content_version(content),
                 **self._get_file_info(file_path)
             }
             
@@ -231,9 +387,11 @@ class FileManager:
             
             if file_path.is_file():
                 file_path.unlink()
+                self.index.refresh(path)
                 return {"message": "File deleted successfully", "path": path}
             elif file_path.is_dir():
                 shutil.rmtree(file_path)
+                self.index.refresh(path)
                 return {"message": "Directory deleted successfully", "path": path}
             else:
                 raise HTTPException(status_code=400, detail="Unknown file type")
@@ -255,6 +413,7 @@ class FileManager:
                 raise HTTPException(status_code=400, detail="Directory already exists")
             
             dir_path.mkdir(parents=True, exist_ok=False)
+            self.index.refresh(path)
             
             return {
                 "message": "Directory created successfully",
@@ -287,6 +446,7 @@ class FileManager:
                 shutil.copy2(source, dest)
             else:
                 shutil.copytree(source, dest)
+            self.index.refresh(dest_path)
             
             return {
                 "message": "File copied successfully",
@@ -317,6 +477,8 @@ class FileManager:
             
             dest.parent.mkdir(parents=True, exist_ok=True)
             shutil.move(str(source), str(dest))
+            self.index.refresh(source_path)
+            self.index.refresh(dest_path)
             
             return {
                 "message": "File moved successfully",
@@ -330,8 +492,9 @@ class FileManager:
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error moving file: {str(e)}")
 
-    def search_files(self, query: str, path: str = ".", extensions: List[str] = None) -> List[Dict[str, Any]]:
-        """Search for files by name or content"""
+    def search_files(self, query: str, path: str = ".", extensions: List[str] = None,
+                     regex: bool = False, case_sensitive: bool = False) -> List[Dict[str, Any]]:
+        """Search for files by name or content; content hits carry line/column matches"""
         if not self._is_safe_path(path):
             raise HTTPException(status_code=400, detail="Invalid path")
         
@@ -341,41 +504,36 @@ class FileManager:
                 raise HTTPException(status_code=400, detail="Invalid search path")
             
             results = []
+            pattern = self.search_index.compile(query, regex, case_sensitive)
+            content_hits = self.search_index.search(query, path, regex, case_sensitive) if query else {}
             
-            for root, dirs, files in os.walk(search_path):
-                # Skip hidden directories
-                dirs[:] = [d for d in dirs if not d.startswith('.')]
+            # Skip hidden, dependency and build directories, as the content index does
+            for rel_path, node in self.index.walk(path, skip_dir=is_ignored_dir):
+                file = node.name
+                if file.startswith('.'):
+                    continue
                 
-                for file in files:
-                    if file.startswith('.'):
-                        continue
-                    
-                    file_path = Path(root) / file
-                    
-                    # Filter by extensions if specified
-                    if extensions and file_path.suffix.lower() not in extensions:
-                        continue
-                    
-                    # Check filename
-                    if query.lower() in file.lower():
-                        results.append({
-                            **self._get_file_info(file_path),
-                            "match_type": "filename"
-                        })
-                        continue
-                    
-                    # Search in content for text files
-                    if file_path.suffix.lower() in self.allowed_extensions:
-                        try:
-                            with open(file_path, 'r', encoding='utf-8') as f:
-                                content = f.read()
-                                if query.lower() in content.lower():
-                                    results.append({
-                                        **self._get_file_info(file_path),
-                                        "match_type": "content"
-                                    })
-                        except:
-                            continue
+                suffix = os.path.splitext(file)[1].lower()
+                
+                # Filter by extensions if specified
+                if extensions and suffix not in extensions:
+                    continue
+                
+                # Check filename
+                if pattern.search(file):
+                    results.append({
+                        **self._node_info(rel_path, node),
+                        "match_type": "filename"
+                    })
+                    continue
+                
+                # Content matches come from the trigram index
+                if rel_path in content_hits:
+                    results.append({
+                        **self._node_info(rel_path, node),
+                        "match_type": "content",
+                        "matches": content_hits[rel_path]
+                    })
             
             return results
             
@@ -0,0 +1,147 @@
+import time
+import uuid
+import signal
+import asyncio
+from typing import Dict, Any, List, Optional, Callable
+from fastapi import HTTPException
+
+from output_collector import OutputCollector
+
+# Windows has no SIGKILL; terminate() is already a hard kill there
+SIGKILL = getattr(signal, "SIGKILL", signal.SIGTERM)
+
+class Job:
+    def __init__(self, job_id: str, user_id: Optional[int], command: str):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.command = command
+        # Set for execute_code runs; plain commands are "shell"
+        self.language: Optional[str] = None
+        self.status = "queued"  # queued, running, finished, cancelled, timeout, failed
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.exit_code: Optional[int] = None
+
+        self.cancel_requested = False
+        # Future for the scheduler slot while queued; cancelling it gives up the place
+        self.waiter: Optional[asyncio.Future] = None
+        self.stdout: Optional[OutputCollector] = None
+        self.stderr: Optional[OutputCollector] = None
+
+        self._send_signal: Optional[Callable[[int], None]] = None
+        self._grace_periods: List[float] = []
+        self._escalation: Optional[asyncio.Task] = None
+        self._done = asyncio.Event()
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    def start(self, send_signal: Callable[[int], None], stdout: OutputCollector = None,
+              stderr: OutputCollector = None):
+        """Mark the job running; send_signal delivers a signal to everything it spawned"""
+        self.status = "running"
+        self.started_at = time.time()
+        self._send_signal = send_signal
+        self.stdout = stdout
+        self.stderr = stderr
+        if self.cancel_requested and self._escalation is None:
+            # Cancelled after leaving the queue but before it could be signalled
+            self._escalation = asyncio.create_task(self._escalate(self._grace_periods))
+
+    def finish(self, status: str = "finished"):
+        self.status = status
+        self.finished_at = time.time()
+        self._done.set()
+
+    def request_cancel(self, grace_periods: List[float]):
+        """Cancel the job: drop it from the queue, or escalate SIGINT, SIGTERM, SIGKILL"""
+        if not self.active:
+            return
+        self.cancel_requested = True
+        self._grace_periods = grace_periods
+
+        if self.status == "queued":
+            if self.waiter:
+                self.waiter.cancel()
+            return
+
+        if self._escalation is None:
+            self._escalation = asyncio.create_task(self._escalate(grace_periods))
+
+    async def _escalate(self, grace_periods: List[float]):
+        for sig, grace in zip((signal.SIGINT, signal.SIGTERM), grace_periods):
+            self._send_signal(sig)
+            try:
+                await asyncio.wait_for(self._done.wait(), timeout=grace)
+                return
+            except asyncio.TimeoutError:
+                continue
+        self._send_signal(SIGKILL)
+
+    def to_dict(self, include_output: bool = False) -> Dict[str, Any]:
+        info = {
+            "job_id": self.job_id,
+            "command": self.command,
+            "status": self.status,
+            "cancel_requested": self.cancel_requested,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "exit_code": self.exit_code
+        }
+        if include_output:
+            info["stdout"] = self.stdout.get_text() if self.stdout else ""
+            info["stderr"] = self.stderr.get_text() if self.stderr else ""
+        return info
+
+class JobRegistry:
+    """Tracks every execution by job ID so it can be listed, inspected and cancelled"""
+
+    def __init__(self, grace_periods: List[float], retention: int = 300, max_finished: int = 500):
+        self.grace_periods = grace_periods
+        self.retention = retention
+        self.max_finished = max_finished
+        self.jobs: Dict[str, Job] = {}
+
+    def _prune(self):
+        """Forget finished jobs past the retention window"""
+        now = time.time()
+        finished = sorted(
+            (job for job in self.jobs.values() if not job.active),
+            key=lambda job: job.finished_at
+        )
+        excess = len(finished) - self.max_finished
+        for index, job in enumerate(finished):
+            if index < excess or now - job.finished_at > self.retention:
+                self.jobs.pop(job.job_id, None)
+
+    def create(self, user_id: Optional[int], command: str, job_id: str = None) -> Job:
+        """Register a new job; clients may pick the ID so they can cancel before the reply arrives"""
+        self._prune()
+        job_id = job_id or uuid.uuid4().hex
+        if job_id in self.jobs:
+            raise HTTPException(status_code=409, detail="Job ID already in use")
+
+        job = Job(job_id, user_id, command)
+        self.jobs[job_id] = job
+        return job
+
+    def get(self, job_id: str, user_id: Optional[int]) -> Job:
+        job = self.jobs.get(job_id)
+        if not job or job.user_id != user_id:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+
+    def list_jobs(self, user_id: Optional[int], include_finished: bool = False) -> List[Dict[str, Any]]:
+        return [
+            job.to_dict()
+            for job in self.jobs.values()
+            if job.user_id == user_id and (include_finished or job.active)
+        ]
+
+    def cancel(self, job_id: str, user_id: Optional[int]) -> Dict[str, Any]:
+        job = self.get(job_id, user_id)
+        job.request_cancel(self.grace_periods)
+        return job.to_dict()
@@ -1,15 +1,17 @@
 import os
+import hmac
 import json
+import uuid
 import asyncio
 import subprocess
-import platform
-from typing import Optional, List, Dict, Any
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Tuple
 from pathlib import Path
 
 from fastapi import FastAPI, HTTPException, Depends, Request, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse, PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
@@ -17,13 +19,18 @@ from pydantic import BaseModel
 import jwt
 import httpx
 
-from database import get_db, create_tables
-from models import User, Project, ApiKey
+from database import get_db, create_tables, SessionLocal
+from models import User, Project, ApiKey, ExecutionLog, ExecutionLogRollup
 from auth import GoogleAuth
 from openrouter_client import OpenRouterClient
 from file_manager import FileManager
 from terminal_manager import TerminalManager
+from terminal_sessions import TerminalSessionManager
 from project_manager import ProjectManager
+from revision_store import RevisionStore
+from execution_log_writer import ExecutionLogWriter
+from execution_log_retention import ExecutionLogRetention
+from config import settings
 
 # Initialize FastAPI app
 app = FastAPI(title="ShellIDE", description="AI-Powered Development Platform")
@@ -47,8 +54,25 @@ security = HTTPBearer(auto_error=False)
 # Initialize services
 google_auth = GoogleAuth()
 terminal_manager = TerminalManager()
+terminal_sessions = TerminalSessionManager(terminal_manager)
 file_manager = FileManager()
-project_manager = ProjectManager()
+project_manager = ProjectManager(terminal_manager=terminal_manager, file_index=file_manager.index)
+revision_store = RevisionStore(max_chain_length=settings.FILE_HISTORY_MAX_DELTA_CHAIN)
+execution_log = ExecutionLogWriter(
+    SessionLocal,
+    batch_size=settings.EXECUTION_LOG_BATCH_SIZE,
+    flush_interval=settings.EXECUTION_LOG_FLUSH_INTERVAL,
+    max_queue=settings.EXECUTION_LOG_MAX_QUEUE,
+    output_limit=settings.EXECUTION_LOG_OUTPUT_LIMIT,
+    store_blob=settings.EXECUTION_LOG_STORE_BLOB
+)
+execution_log_retention = ExecutionLogRetention(
+    SessionLocal,
+    retention_days=settings.EXECUTION_LOG_RETENTION_DAYS,
+    output_retention_days=settings.EXECUTION_LOG_OUTPUT_RETENTION_DAYS,
+    chunk_size=settings.EXECUTION_LOG_DELETE_CHUNK,
+    interval=settings.EXECUTION_LOG_MAINTENANCE_INTERVAL
+)
 
 # JWT Secret
 JWT_SECRET = os.getenv("JWT_SECRET", "your-secret-key-change-in-production")
@@ -56,13 +80,25 @@ JWT_SECRET = os.getenv("JWT_SECRET", "your-secret-key-change-in-production")
 class ConnectionManager:
     def __init__(self):
         self.active_connections: List[WebSocket] = []
+        self.user_connections: Dict[int, int] = {}
 
-    async def connect(self, websocket: WebSocket):
+    async def connect(self, websocket: WebSocket, user_id: int = None):
         await websocket.accept()
         self.active_connections.append(websocket)
+        if user_id is not None:
+            self.user_connections[user_id] = self.user_connections.get(user_id, 0) + 1
 
-    def disconnect(self, websocket: WebSocket):
+    def disconnect(self, websocket: WebSocket, user_id: int = None) -> int:
+        """Remove a connection and return how many the user still has open"""
         self.active_connections.remove(websocket)
+        if user_id is None:
+            return 0
+        remaining = self.user_connections.get(user_id, 1) - 1
+        if remaining:
+            self.user_connections[user_id] = remaining
+        else:
+            self.user_connections.pop(user_id, None)
+        return remaining
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
         await websocket.send_text(message)
@@ -79,21 +115,51 @@ class ApiKeyRequest(BaseModel):
 class CodeRequest(BaseModel):
     code: str
     language: str
+    job_id: Optional[str] = None
     
 class TerminalCommand(BaseModel):
     command: str
     working_directory: Optional[str] = None
+    job_id: Optional[str] = None
+
+class BatchStep(BaseModel):
+    id: str
+    command: str
+    working_directory: Optional[str] = None
+    env: Optional[Dict[str, str]] = None
+    depends_on: List[str] = []
+    stop_on_failure: bool = True
+
+class BatchRequest(BaseModel):
+    steps: List[BatchStep]
+    working_directory: Optional[str] = None
 
 class FileOperation(BaseModel):
     path: str
     content: Optional[str] = None
     operation: str  # create, read, update, delete
 
+class TextEdit(BaseModel):
+    offset: int  # in characters of the base content
+    length: int = 0
+    text: str = ""
+
+class FilePatch(BaseModel):
+    path: str
+    base_version: str  # "version" from the last read or save
+    edits: Optional[List[TextEdit]] = None
+    diff: Optional[str] = None  # unified diff, instead of edits
+
 class ProjectCreate(BaseModel):
     name: str
     template: str
     description: Optional[str] = None
 
+class ServerStart(BaseModel):
+    command: str
+    port: Optional[int] = None
+    working_directory: Optional[str] = None
+
 class ChatRequest(BaseModel):
     message: str
     model: Optional[str] = None
@@ -129,6 +195,20 @@ async def startup_event():
     print("ShellIDE is starting up...")
     print("Setting up database...")
     print("Initializing services...")
+    await terminal_manager.toolchains.refresh()
+    await file_manager.index.start()
+    # Build the content search index in the background so the first search is fast
+    asyncio.get_event_loop().run_in_executor(None, file_manager.search_index.catch_up)
+    execution_log_retention.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    file_manager.index.stop()
+    await terminal_sessions.shutdown()
+    await terminal_manager.shutdown()
+    await execution_log_retention.close()
+    # Last, so executions cut short by the shutdown above are still written
+    await execution_log.close()
 
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
@@ -266,19 +346,198 @@ async def chat(request: ChatRequest, current_user: User = Depends(get_current_us
 @app.post("/execute/code")
 async def execute_code(request: CodeRequest, current_user: User = Depends(get_current_user)):
     try:
-        result = await terminal_manager.execute_code(request.code, request.language)
+        result = await terminal_manager.execute_code(request.code, request.language, user_id=current_user.id, job_id=request.job_id)
         return {"result": result}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.get("/languages")
+async def get_languages(current_user: User = Depends(get_current_user)):
+    if not terminal_manager.toolchains.probed:
+        await terminal_manager.toolchains.refresh()
+    return {"languages": terminal_manager.get_languages()}
+
+@app.post("/languages/refresh")
+async def refresh_languages(current_user: User = Depends(get_current_user)):
+    """Probe toolchains again, e.g. after installing a compiler"""
+    await terminal_manager.toolchains.refresh()
+    return {"languages": terminal_manager.get_languages()}
+
 @app.post("/terminal/command")
 async def execute_terminal_command(request: TerminalCommand, current_user: User = Depends(get_current_user)):
     try:
-        result = await terminal_manager.execute_command(request.command, request.working_directory)
+        result = await terminal_manager.execute_command(
+            request.command,
+            request.working_directory,
+            user_id=current_user.id,
+            job_id=request.job_id
+        )
+        # Written in batches by the background flusher
+        execution_log.enqueue(current_user.id, None, request.command, result)
         return {"result": result}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+def log_batch_step(user_id: int, steps: List[Dict[str, Any]], frame: Dict[str, Any]):
+    """Queue an execution log row for a batch step that ran"""
+    # Refused and cancelled steps never ran and have no exit code
+    if frame["type"] == "step" and "exit_code" in frame.get("result", {}):
+        command = next(step["command"] for step in steps if step["id"] == frame["id"])
+        execution_log.enqueue(user_id, None, command, frame["result"])
+
+@app.post("/terminal/batch")
+async def execute_batch(request: BatchRequest, current_user: User = Depends(get_current_user)):
+    """Run a dependency-ordered batch, streaming one JSON line per finished step"""
+    steps = [step.dict() for step in request.steps]
+    # Reject bad batches with a proper status before the stream starts
+    terminal_manager.batches.validate(steps)
+    
+    async def frames():
+        async for frame in terminal_manager.batches.run(steps, current_user.id, request.working_directory):
+            log_batch_step(current_user.id, steps, frame)
+            yield json.dumps(frame) + "\n"
+    
+    return StreamingResponse(frames(), media_type="application/x-ndjson")
+
+@app.get("/terminal/history")
+async def get_execution_history(
+    before: Optional[datetime] = None,
+    limit: int = 50,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the user's recent executions, newest first; pass the last created_at as before for the next page"""
+    query = db.query(ExecutionLog).filter(ExecutionLog.user_id == current_user.id)
+    if before:
+        query = query.filter(ExecutionLog.created_at < before)
+    logs = query.order_by(ExecutionLog.created_at.desc()).limit(max(1, min(limit, 200))).all()
+    
+    return {
+        "executions": [
+            {
+                "id": log.id,
+                "project_id": log.project_id,
+                "command": log.command,
+                "output": log.output,
+                "error": log.error,
+                "output_truncated": log.output_truncated,
+                "exit_code": log.exit_code,
+                "execution_time": log.execution_time,
+                "created_at": log.created_at.isoformat() if log.created_at else None
+            }
+            for log in logs
+        ]
+    }
+
+@app.get("/terminal/history/stats")
+async def get_execution_stats(
+    period: str = "day",
+    since: Optional[datetime] = None,
+    project_id: Optional[int] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get hourly or daily execution rollups for the user"""
+    if period not in ("hour", "day"):
+        raise HTTPException(status_code=400, detail="period must be 'hour' or 'day'")
+    
+    query = db.query(ExecutionLogRollup).filter(
+        ExecutionLogRollup.user_id == current_user.id,
+        ExecutionLogRollup.period == period
+    )
+    if since:
+        query = query.filter(ExecutionLogRollup.period_start >= since)
+    if project_id is not None:
+        query = query.filter(ExecutionLogRollup.project_id == project_id)
+    rollups = query.order_by(ExecutionLogRollup.period_start).all()
+    
+    return {
+        "period": period,
+        "rollups": [
+            {
+                "period_start": rollup.period_start.isoformat(),
+                "project_id": rollup.project_id,
+                "count": rollup.count,
+                "error_count": rollup.error_count,
+                "error_rate": rollup.error_count / rollup.count if rollup.count else 0.0,
+                "avg_execution_time": rollup.avg_execution_time,
+                "p50_execution_time": rollup.p50_execution_time,
+                "p95_execution_time": rollup.p95_execution_time,
+                "total_cpu_time": rollup.total_cpu_time
+            }
+            for rollup in rollups
+        ],
+        "maintenance": execution_log_retention.get_stats()
+    }
+
+@app.get("/terminal/scheduler")
+async def get_scheduler_stats(current_user: User = Depends(get_current_user)):
+    return {"scheduler": terminal_manager.scheduler.get_stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Execution metrics in the Prometheus text format, summed over users.
+    
+    Scrapers authenticate with METRICS_TOKEN; without one configured only
+    loopback clients are served.
+    """
+    if settings.METRICS_TOKEN:
+        if not credentials or not hmac.compare_digest(credentials.credentials, settings.METRICS_TOKEN):
+            raise HTTPException(status_code=401, detail="Invalid metrics token")
+    elif not request.client or request.client.host not in ("127.0.0.1", "::1"):
+        raise HTTPException(status_code=403, detail="Metrics are only served to local scrapers")
+    return PlainTextResponse(
+        terminal_manager.metrics.render_prometheus(drop_labels=("user",)),
+        media_type="text/plain; version=0.0.4"
+    )
+
+@app.get("/metrics/summary")
+async def get_metrics_summary(current_user: User = Depends(get_current_user)):
+    """The current user's execution metrics with p50/p95/p99 per label combination"""
+    return {"metrics": terminal_manager.metrics.summary(user=current_user.id)}
+
+@app.get("/terminal/package-cache")
+async def get_package_cache_stats(current_user: User = Depends(get_current_user)):
+    return {"package_cache": terminal_manager.package_cache.get_stats()}
+
+@app.get("/jobs")
+async def list_jobs(include_finished: bool = False, current_user: User = Depends(get_current_user)):
+    return {"jobs": terminal_manager.jobs.list_jobs(current_user.id, include_finished)}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, current_user: User = Depends(get_current_user)):
+    """Get a job's status and the output it has produced so far"""
+    return {"job": terminal_manager.jobs.get(job_id, current_user.id).to_dict(include_output=True)}
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, current_user: User = Depends(get_current_user)):
+    return {"job": terminal_manager.jobs.cancel(job_id, current_user.id)}
+
+@app.post("/processes")
+async def start_process(request: ServerStart, current_user: User = Depends(get_current_user)):
+    result = await terminal_manager.run_server(request.command, request.port, current_user.id, request.working_directory)
+    return {"result": result}
+
+@app.get("/processes")
+async def list_processes(current_user: User = Depends(get_current_user)):
+    return {"processes": terminal_manager.background_processes.list_processes(current_user.id)}
+
+@app.get("/processes/{process_id}")
+async def get_process_status(process_id: str, current_user: User = Depends(get_current_user)):
+    return {"process": await terminal_manager.background_processes.status(process_id, current_user.id)}
+
+@app.get("/processes/{process_id}/logs")
+async def get_process_logs(process_id: str, offset: int = 0, limit: int = 64 * 1024, current_user: User = Depends(get_current_user)):
+    return terminal_manager.background_processes.read_log(process_id, current_user.id, offset, limit)
+
+@app.post("/processes/{process_id}/restart")
+async def restart_process(process_id: str, current_user: User = Depends(get_current_user)):
+    return {"process": await terminal_manager.background_processes.restart(process_id, current_user.id)}
+
+@app.delete("/processes/{process_id}")
+async def stop_process(process_id: str, current_user: User = Depends(get_current_user)):
+    return {"process": await terminal_manager.background_processes.stop(process_id, current_user.id)}
+
 @app.get("/files")
 async def list_files(path: str = ".", current_user: User = Depends(get_current_user)):
     try:
@@ -287,17 +546,115 @@ async def list_files(path: str = ".", current_user: User = Depends(get_current_u
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """If-None-Match / If-Range comparison; weak validators match too"""
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or etag in [value[2:] if value.startswith("W/") else value for value in candidates]
+
+def parse_byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) of a single bytes range, or None to send the whole file"""
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None  # Other units and multipart ranges are not supported
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            start = max(0, size - int(last))
+            end = size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+@app.get("/files/raw")
+async def read_raw_file(request: Request, path: str, start_line: Optional[int] = None, lines: int = 200,
+                        current_user: User = Depends(get_current_user)):
+    """File content streamed as-is with ETag and Range support, or a window of lines when start_line is given"""
+    info = file_manager.stat_file(path)
+    headers = {"ETag": info["etag"], "Accept-Ranges": "bytes", "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), info["etag"]):
+        return Response(status_code=304, headers=headers)
+    
+    if start_line is not None:
+        return JSONResponse(file_manager.read_lines(path, start_line, lines), headers=headers)
+    
+    start, end, status_code = 0, info["size"] - 1, 200
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or etag_matches(if_range, info["etag"])):
+        byte_range = parse_byte_range(range_header, info["size"])
+        if byte_range:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{info['size']}"
+    headers["Content-Length"] = str(end - start + 1)
+    
+    return StreamingResponse(
+        file_manager.iter_bytes(info["full_path"], start, end),
+        status_code=status_code,
+        media_type=info["mime_type"] or "text/plain; charset=utf-8",
+        headers=headers
+    )
+
+def snapshot_before_change(db: Session, user_id: int, path: str):
+    """Record a file's current content before its first tracked change, so that change can be undone"""
+    if revision_store.has_history(db, user_id, file_manager.index.normalize(path)):
+        return
+    try:
+        current = file_manager.read_file(path)
+    except HTTPException:
+        return  # Missing, binary or a directory: nothing to keep
+    revision_store.record(db, user_id, file_manager.index.normalize(path), "snapshot", current["content"])
+
+@app.patch("/files")
+async def patch_file(request: FilePatch, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Apply edits to a file; rejected with 409 if it changed since base_version"""
+    snapshot_before_change(db, current_user.id, request.path)
+    result = file_manager.patch_file(
+        request.path,
+        request.base_version,
+        edits=[edit.dict() for edit in request.edits] if request.edits is not None else None,
+        diff=request.diff,
+        include_content=True
+    )
+    revision_store.record(db, current_user.id, file_manager.index.normalize(request.path), "patch", result.pop("content"))
+    return {"result": result}
+
+@app.get("/files/search")
+async def search_files(query: str, path: str = ".", extensions: Optional[str] = None, regex: bool = False,
+                       case_sensitive: bool = False, current_user: User = Depends(get_current_user)):
+    """Search file names and contents; extensions is a comma-separated list such as .py,.js"""
+    extension_list = [e.strip().lower() for e in extensions.split(",") if e.strip()] if extensions else None
+    # Catching the content index up reads files; keep that off the event loop
+    results = await asyncio.get_event_loop().run_in_executor(
+        None, file_manager.search_files, query, path, extension_list, regex, case_sensitive
+    )
+    return {"results": results}
+
 @app.post("/files")
-async def file_operation(request: FileOperation, current_user: User = Depends(get_current_user)):
+async def file_operation(request: FileOperation, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     try:
+        history_path = file_manager.index.normalize(request.path)
         if request.operation == "create":
             result = file_manager.create_file(request.path, request.content or "")
+            revision_store.record(db, current_user.id, history_path, "create", request.content or "")
         elif request.operation == "read":
             result = file_manager.read_file(request.path)
         elif request.operation == "update":
+            snapshot_before_change(db, current_user.id, request.path)
             result = file_manager.update_file(request.path, request.content or "")
+            revision_store.record(db, current_user.id, history_path, "update", request.content or "")
         elif request.operation == "delete":
+            snapshot_before_change(db, current_user.id, request.path)
             result = file_manager.delete_file(request.path)
+            if revision_store.has_history(db, current_user.id, history_path):
+                revision_store.record(db, current_user.id, history_path, "delete", None)
         else:
             raise HTTPException(status_code=400, detail="Invalid operation")
         
@@ -305,6 +662,40 @@ async def file_operation(request: FileOperation, current_user: User = Depends(ge
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.get("/files/history")
+async def file_history(path: str, limit: int = 50, before: Optional[int] = None,
+                       current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Revisions of a file, newest first; page with before=<id of the last revision seen>"""
+    return {"revisions": revision_store.list_revisions(
+        db, current_user.id, file_manager.index.normalize(path), limit=limit, before_id=before
+    )}
+
+@app.get("/files/history/{revision_id}")
+async def file_revision(revision_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    revision = revision_store.get_revision(db, current_user.id, revision_id)
+    return {"revision": revision_store.to_dict(revision), "content": revision_store.revision_content(db, revision)}
+
+@app.get("/files/history/{revision_id}/diff")
+async def file_revision_diff(revision_id: int, against: Optional[int] = None,
+                             current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Unified diff to this revision from against, or from the revision before it"""
+    return revision_store.diff(db, current_user.id, revision_id, against)
+
+@app.post("/files/history/{revision_id}/restore")
+async def restore_file_revision(revision_id: int, current_user: User = Depends(get_current_user),
+                                db: Session = Depends(get_db)):
+    revision = revision_store.get_revision(db, current_user.id, revision_id)
+    content = revision_store.revision_content(db, revision)
+    if content is None:
+        raise HTTPException(status_code=400, detail="Cannot restore a deletion; restore an earlier revision")
+    
+    if (file_manager.base_path / revision.file_path).is_file():
+        result = file_manager.update_file(revision.file_path, content)
+    else:
+        result = file_manager.create_file(revision.file_path, content)
+    restored = revision_store.record(db, current_user.id, revision.file_path, "restore", content)
+    return {"result": result, "revision": revision_store.to_dict(restored)}
+
 @app.get("/projects")
 async def get_projects(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     projects = db.query(Project).filter(Project.user_id == current_user.id).all()
@@ -331,30 +722,211 @@ async def create_project(request: ProjectCreate, current_user: User = Depends(ge
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/system/info")
-async def get_system_info():
-    return {
-        "platform": platform.system(),
-        "architecture": platform.architecture()[0],
-        "machine": platform.machine(),
-        "python_version": platform.python_version()
-    }
+async def get_system_info(current_user: User = Depends(get_current_user)):
+    """Cached CPU, memory, disk and load information; includes hostnames and paths, so login is required"""
+    info = await terminal_manager.get_system_info()
+    # "platform" is what this endpoint used to return for the OS name
+    return {"platform": info["system"], **info}
+
+async def forward_session_output(websocket: WebSocket, session, queue: asyncio.Queue):
+    """Forward PTY output to the websocket until the client detaches or the shell exits"""
+    while True:
+        chunk = await session.read(queue)
+        if chunk is None:
+            break
+        await manager.send_personal_message(
+            json.dumps({"type": "session.output", "session_id": session.session_id, "data": chunk}),
+            websocket
+        )
+    
+    if not session.alive:
+        await manager.send_personal_message(
+            json.dumps({"type": "session.exit", "session_id": session.session_id, "exit_code": session.process.returncode}),
+            websocket
+        )
+
+async def handle_session_message(websocket: WebSocket, current_user: User, message: Dict[str, Any], attached: Dict[str, Any]):
+    """Handle a session.* message; attached maps session ids to this socket's (queue, task)"""
+    message_type = message["type"]
+    
+    if message_type == "session.list":
+        await manager.send_personal_message(
+            json.dumps({"type": "session.list", "sessions": terminal_sessions.list_sessions(current_user.id)}),
+            websocket
+        )
+        return
+    
+    if message_type == "session.open":
+        session = await terminal_sessions.create_session(
+            current_user.id,
+            message.get("project"),
+            message.get("working_directory"),
+            message.get("rows", 24),
+            message.get("cols", 80)
+        )
+    else:
+        session = terminal_sessions.get_session(message.get("session_id"), current_user.id)
+    
+    if message_type in ("session.open", "session.attach"):
+        scrollback = session.attach()
+        queue = session.output_queue
+        task = asyncio.create_task(forward_session_output(websocket, session, queue))
+        attached[session.session_id] = (queue, task)
+        await manager.send_personal_message(
+            json.dumps({"type": "session.attached", "session": session.to_dict(), "scrollback": scrollback}),
+            websocket
+        )
+    elif message_type == "session.input":
+        await session.write(message.get("data", ""))
+    elif message_type == "session.resize":
+        session.resize(int(message["rows"]), int(message["cols"]))
+    elif message_type == "session.detach":
+        attached.pop(session.session_id, None)
+        session.detach()
+    elif message_type == "session.close":
+        attached.pop(session.session_id, None)
+        await terminal_sessions.close_session(session.session_id, current_user.id)
+    else:
+        raise HTTPException(status_code=400, detail=f"Unknown message type: {message_type}")
+
+async def run_websocket_command(websocket: WebSocket, current_user: User, command_data: Dict[str, Any], job_id: str):
+    """Run one command for the websocket, tagging everything sent back with its job id"""
+    try:
+        if command_data.get("stream"):
+            # Push stdout/stderr deltas as they arrive; awaiting each send
+            # applies backpressure all the way down to the process pipes
+            async for frame in terminal_manager.stream_command(
+                command_data["command"],
+                command_data.get("working_directory"),
+                user_id=current_user.id,
+                job_id=job_id
+            ):
+                if frame["type"] == "exit":
+                    # The output has already gone to the client; log the outcome only
+                    execution_log.enqueue(current_user.id, None, command_data["command"], frame)
+                await manager.send_personal_message(json.dumps({**frame, "job_id": job_id}), websocket)
+        else:
+            result = await terminal_manager.execute_command(
+                command_data["command"],
+                command_data.get("working_directory"),
+                user_id=current_user.id,
+                job_id=job_id
+            )
+            execution_log.enqueue(current_user.id, None, command_data["command"], result)
+            await manager.send_personal_message(json.dumps(result), websocket)
+    except HTTPException as e:
+        await manager.send_personal_message(
+            json.dumps({"type": "error", "detail": e.detail, "job_id": job_id}),
+            websocket
+        )
+
+async def run_websocket_batch(websocket: WebSocket, current_user: User, command_data: Dict[str, Any]):
+    """Run a command batch for the websocket, sending batch.step frames as steps finish"""
+    steps = command_data.get("steps") or []
+    try:
+        async for frame in terminal_manager.batches.run(
+            steps,
+            current_user.id,
+            command_data.get("working_directory")
+        ):
+            log_batch_step(current_user.id, steps, frame)
+            await manager.send_personal_message(json.dumps({**frame, "type": f"batch.{frame['type']}"}), websocket)
+    except HTTPException as e:
+        await manager.send_personal_message(json.dumps({"type": "error", "detail": e.detail}), websocket)
+
+async def forward_file_events(websocket: WebSocket):
+    """Send files.changed frames for workspace changes until unwatched"""
+    queue = file_manager.index.subscribe()
+    try:
+        while True:
+            event = await queue.get()
+            await manager.send_personal_message(json.dumps({**event, "type": "files.changed", "change": event["type"]}), websocket)
+    finally:
+        file_manager.index.unsubscribe(queue)
 
 @app.websocket("/ws/terminal")
 async def websocket_terminal(websocket: WebSocket, current_user: User = Depends(get_current_user)):
-    await manager.connect(websocket)
+    await manager.connect(websocket, current_user.id)
+    attached_sessions: Dict[str, Any] = {}
+    # Commands run as tasks so job.cancel messages are read while they run
+    running_commands: Dict[str, asyncio.Task] = {}
     try:
         while True:
             data = await websocket.receive_text()
             command_data = json.loads(data)
             
-            result = await terminal_manager.execute_command(
-                command_data["command"],
-                command_data.get("working_directory")
-            )
+            if command_data.get("type", "").startswith("session."):
+                # Persistent PTY shells: open/attach/input/resize/detach/close
+                try:
+                    await handle_session_message(websocket, current_user, command_data, attached_sessions)
+                except HTTPException as e:
+                    await manager.send_personal_message(
+                        json.dumps({"type": "error", "detail": e.detail}),
+                        websocket
+                    )
+                continue
             
-            await manager.send_personal_message(json.dumps(result), websocket)
+            if command_data.get("type") == "job.cancel":
+                try:
+                    job = terminal_manager.jobs.cancel(command_data.get("job_id"), current_user.id)
+                    await manager.send_personal_message(json.dumps({"type": "job.cancelling", "job": job}), websocket)
+                except HTTPException as e:
+                    await manager.send_personal_message(
+                        json.dumps({"type": "error", "detail": e.detail, "job_id": command_data.get("job_id")}),
+                        websocket
+                    )
+                continue
+            
+            if command_data.get("type") == "job.list":
+                await manager.send_personal_message(
+                    json.dumps({"type": "job.list", "jobs": terminal_manager.jobs.list_jobs(current_user.id)}),
+                    websocket
+                )
+                continue
+            
+            if command_data.get("type") == "files.watch":
+                if "files.watch" not in running_commands:
+                    task = asyncio.create_task(forward_file_events(websocket))
+                    running_commands["files.watch"] = task
+                    task.add_done_callback(lambda _: running_commands.pop("files.watch", None))
+                continue
+            
+            if command_data.get("type") == "files.unwatch":
+                task = running_commands.get("files.watch")
+                if task:
+                    task.cancel()
+                continue
+            
+            if command_data.get("type") == "batch":
+                task_id = uuid.uuid4().hex
+                coroutine = run_websocket_batch(websocket, current_user, command_data)
+            else:
+                task_id = command_data.get("job_id") or uuid.uuid4().hex
+                await manager.send_personal_message(json.dumps({"type": "job.started", "job_id": task_id}), websocket)
+                coroutine = run_websocket_command(websocket, current_user, command_data, task_id)
+            
+            task = asyncio.create_task(coroutine)
+            running_commands[task_id] = task
+            task.add_done_callback(lambda _, task_id=task_id: running_commands.pop(task_id, None))
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        pass
+    finally:
+        # Nobody is left to read the results
+        for task in list(running_commands.values()):
+            task.cancel()
+        
+        # Leave the shells running so the client can reattach; the idle reaper
+        # closes them if nobody comes back
+        for session_id, (queue, task) in attached_sessions.items():
+            task.cancel()
+            session = terminal_sessions.sessions.get(session_id)
+            if session and session.output_queue is queue:
+                session.detach()
+        
+        # However the handler ended, the connection no longer counts against the user
+        if not manager.disconnect(websocket, current_user.id):
+            # Last connection gone: nobody is left to use the user's dev servers
+            await terminal_manager.background_processes.stop_user_processes(current_user.id)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,159 @@
+from bisect import bisect_left
+from typing import Dict, Any, List, Tuple, Optional
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300]
+BYTES_BUCKETS = [256 * 4 ** i for i in range(11)]  # 256B .. 256MB
+
+class Histogram:
+    """Fixed-bucket histogram; quantiles are interpolated within a bucket"""
+
+    def __init__(self, buckets: List[float]):
+        self.buckets = buckets
+        # One extra slot for values above the last bound (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                if index == len(self.buckets):
+                    return lower
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+class Metric:
+    def __init__(self, name: str, kind: str, help_text: str, label_names: Tuple[str, ...], buckets: List[float] = None):
+        self.name = name
+        self.kind = kind  # counter or histogram
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series: Dict[Tuple[str, ...], Any] = {}
+
+class MetricsRegistry:
+    """In-process counters and histograms, exported as Prometheus text or a JSON summary"""
+
+    def __init__(self, max_series: int = 1000):
+        # Per metric; further label combinations are folded into "other"
+        self.max_series = max_series
+        self.metrics: Dict[str, Metric] = {}
+
+    def counter(self, name: str, help_text: str, label_names: Tuple[str, ...]):
+        self.metrics[name] = Metric(name, "counter", help_text, label_names)
+
+    def histogram(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets: List[float]):
+        self.metrics[name] = Metric(name, "histogram", help_text, label_names, buckets)
+
+    def _series_key(self, metric: Metric, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        key = tuple(str(labels.get(name, "")) for name in metric.label_names)
+        if key not in metric.series and len(metric.series) >= self.max_series:
+            key = ("other",) * len(metric.label_names)
+        return key
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        metric = self.metrics[name]
+        key = self._series_key(metric, labels)
+        metric.series[key] = metric.series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels):
+        metric = self.metrics[name]
+        key = self._series_key(metric, labels)
+        histogram = metric.series.get(key)
+        if histogram is None:
+            histogram = metric.series[key] = Histogram(metric.buckets)
+        histogram.observe(value)
+
+    def _escape(self, value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    def _format_labels(self, metric: Metric, key: Tuple[str, ...], le: str = None) -> str:
+        pairs = [f'{name}="{self._escape(value)}"' for name, value in zip(metric.label_names, key)]
+        if le is not None:
+            pairs.append(f'le="{le}"')
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def _aggregate(self, metric: Metric, drop_labels: Tuple[str, ...]) -> Tuple[Tuple[str, ...], Dict[Tuple[str, ...], Any]]:
+        """Label names and series with the dropped labels summed away"""
+        keep = [index for index, name in enumerate(metric.label_names) if name not in drop_labels]
+        label_names = tuple(metric.label_names[index] for index in keep)
+        if len(keep) == len(metric.label_names):
+            return label_names, metric.series
+
+        series: Dict[Tuple[str, ...], Any] = {}
+        for key, value in metric.series.items():
+            reduced = tuple(key[index] for index in keep)
+            if metric.kind == "counter":
+                series[reduced] = series.get(reduced, 0) + value
+                continue
+            merged = series.get(reduced)
+            if merged is None:
+                merged = series[reduced] = Histogram(metric.buckets)
+            merged.counts = [a + b for a, b in zip(merged.counts, value.counts)]
+            merged.count += value.count
+            merged.sum += value.sum
+        return label_names, series
+
+    def render_prometheus(self, drop_labels: Tuple[str, ...] = ()) -> str:
+        """Prometheus text exposition format; drop_labels are summed away"""
+        lines = []
+        for metric in self.metrics.values():
+            label_names, series = self._aggregate(metric, drop_labels)
+            exported = Metric(metric.name, metric.kind, metric.help_text, label_names, metric.buckets)
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for key, value in series.items():
+                if metric.kind == "counter":
+                    lines.append(f"{metric.name}{self._format_labels(exported, key)} {value}")
+                    continue
+
+                cumulative = 0
+                for index, count in enumerate(value.counts):
+                    cumulative += count
+                    le = repr(metric.buckets[index]) if index < len(metric.buckets) else "+Inf"
+                    lines.append(f"{metric.name}_bucket{self._format_labels(exported, key, le)} {cumulative}")
+                lines.append(f"{metric.name}_sum{self._format_labels(exported, key)} {value.sum}")
+                lines.append(f"{metric.name}_count{self._format_labels(exported, key)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self, **label_filter) -> Dict[str, Any]:
+        """Counts, means and p50/p95/p99 per label combination.
+
+        With a filter such as user="3" only metrics carrying that label are
+        included, and only their matching series.
+        """
+        result = {}
+        for metric in self.metrics.values():
+            if any(name not in metric.label_names for name in label_filter):
+                continue
+            entries = []
+            for key, value in metric.series.items():
+                entry = dict(zip(metric.label_names, key))
+                if any(entry[name] != str(wanted) for name, wanted in label_filter.items()):
+                    continue
+                if metric.kind == "counter":
+                    entry["value"] = value
+                else:
+                    entry.update({
+                        "count": value.count,
+                        "mean": value.sum / value.count if value.count else None,
+                        "p50": value.quantile(0.5),
+                        "p95": value.quantile(0.95),
+                        "p99": value.quantile(0.99)
+                    })
+                entries.append(entry)
+            result[metric.name] = entries
+        return result
@@ -0,0 +1,117 @@
+"""In-place upgrades for databases created by older versions.
+
+create_all() only creates missing tables, so columns and indexes added to
+existing tables are applied here, and data moved to a new layout is
+backfilled. Every step checks the live schema first, so running it again,
+or on a fresh database, does nothing. It runs from create_tables() at
+startup; run `python migrations.py` to apply it on its own first.
+
+- execution_logs: output_truncated and output_blob (execution log writer),
+  cpu_time, max_rss and the io byte counters (resource accounting), and
+  the user/created_at indexes.
+- file_history: blob_id and version replace content_before/content_after.
+  Each legacy revision's content_after becomes a blob of its user, stored
+  as a delta against the file's previous revision like new saves are. The
+  legacy columns are left in place, no longer read; drop them once the
+  backfill has been checked.
+"""
+from typing import Dict, Any, Optional, Tuple
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+import models
+from revision_store import RevisionStore
+from text_patch import content_version
+
+BACKFILL_BATCH = 500
+
+def _add_missing_columns(engine: Engine) -> int:
+    """ALTER TABLE ... ADD COLUMN for model columns the existing tables lack"""
+    inspector = inspect(engine)
+    added = 0
+    with engine.begin() as connection:
+        for table in models.Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                # New columns are all nullable, so existing rows need no default
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                print(f"Added column {table.name}.{column.name}")
+                added += 1
+    return added
+
+def _add_missing_indexes(engine: Engine) -> int:
+    inspector = inspect(engine)
+    added = 0
+    with engine.begin() as connection:
+        for table in models.Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(bind=connection)
+                    print(f"Created index {index.name}")
+                    added += 1
+    return added
+
+def _backfill_execution_logs(engine: Engine):
+    with engine.begin() as connection:
+        connection.execute(
+            text("UPDATE execution_logs SET output_truncated = :false WHERE output_truncated IS NULL"),
+            {"false": False}
+        )
+
+def _backfill_file_history(engine: Engine, revision_store: RevisionStore) -> int:
+    """Move legacy content_after texts into per-user blobs"""
+    if "content_after" not in {column["name"] for column in inspect(engine).get_columns("file_history")}:
+        return 0
+
+    # Blob of each file's latest revision, the base for the next delta
+    latest: Dict[Tuple[Any, Any, str], int] = {}
+    migrated = 0
+    last_id = 0
+    while True:
+        with Session(engine) as db:
+            rows = db.execute(text(
+                "SELECT id, user_id, project_id, file_path, content_after FROM file_history "
+                "WHERE id > :last_id AND blob_id IS NULL AND content_after IS NOT NULL "
+                "ORDER BY id LIMIT :limit"
+            ), {"last_id": last_id, "limit": BACKFILL_BATCH}).fetchall()
+            if not rows:
+                return migrated
+
+            for row_id, user_id, project_id, file_path, content in rows:
+                key = (user_id, project_id, file_path)
+                base: Optional[models.FileBlob] = db.get(models.FileBlob, latest[key]) if key in latest else None
+                blob = revision_store._store_blob(db, user_id, content, base)
+                db.execute(
+                    text("UPDATE file_history SET blob_id = :blob_id, version = :version WHERE id = :id"),
+                    {"blob_id": blob.id, "version": content_version(content), "id": row_id}
+                )
+                latest[key] = blob.id
+                last_id = row_id
+            # One transaction per batch, so an interrupted run resumes where it stopped
+            db.commit()
+            migrated += len(rows)
+            print(f"Migrated {migrated} file history revisions")
+
+def migrate(engine: Engine):
+    """Bring an existing database up to the current models; run after create_all()"""
+    _add_missing_columns(engine)
+    _add_missing_indexes(engine)
+    if inspect(engine).has_table("execution_logs"):
+        _backfill_execution_logs(engine)
+    if inspect(engine).has_table("file_history"):
+        _backfill_file_history(engine, RevisionStore())
+
+if __name__ == "__main__":
+    from database import engine
+    models.Base.metadata.create_all(bind=engine)
+    migrate(engine)
+    print("Database migrated")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Text, Boolean, ForeignKey, LargeBinary, Float, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -63,33 +63,87 @@ class Session(Base):
 
 class ExecutionLog(Base):
     __tablename__ = "execution_logs"
+    __table_args__ = (
+        # Per-user history, newest first
+        Index("ix_execution_logs_user_created", "user_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=True)
     command = Column(Text, nullable=False)
-    output = Column(Text, nullable=True)
+    output = Column(Text, nullable=True)  # truncated to EXECUTION_LOG_OUTPUT_LIMIT
     error = Column(Text, nullable=True)
+    output_truncated = Column(Boolean, default=False)
+    output_blob = Column(LargeBinary, nullable=True)  # zlib-compressed JSON of the full stdout/stderr, optional
     exit_code = Column(Integer, nullable=True)
     execution_time = Column(Integer, nullable=True)  # in milliseconds
-    created_at = Column(DateTime, default=datetime.utcnow)
+    cpu_time = Column(Integer, nullable=True)  # user + system, in milliseconds
+    max_rss = Column(Integer, nullable=True)  # peak resident set, in KB
+    io_read_bytes = Column(BigInteger, nullable=True)
+    io_write_bytes = Column(BigInteger, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     
     # Relationships
     user = relationship("User")
     project = relationship("Project")
 
+class ExecutionLogRollup(Base):
+    __tablename__ = "execution_log_rollups"
+    __table_args__ = (
+        Index("ix_execution_log_rollups_user_period", "user_id", "period", "period_start"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    period = Column(String(10), nullable=False)  # hour, day
+    period_start = Column(DateTime, nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=True)
+    count = Column(Integer, nullable=False)
+    error_count = Column(Integer, nullable=False)  # non-zero exit codes
+    avg_execution_time = Column(Float, nullable=True)  # in milliseconds
+    p50_execution_time = Column(Integer, nullable=True)
+    p95_execution_time = Column(Integer, nullable=True)
+    total_cpu_time = Column(BigInteger, nullable=True)  # in milliseconds
+    
+    # Relationships
+    user = relationship("User")
+    project = relationship("Project")
+
+class FileBlob(Base):
+    """File content stored once per user and distinct hash, either whole or as a delta against another
+    blob of the same user"""
+    __tablename__ = "file_blobs"
+    __table_args__ = (
+        UniqueConstraint("user_id", "content_hash", name="uq_file_blobs_user_hash"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    # Blobs are never shared between users, so one user's history can be deleted on its own
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    content_hash = Column(String(64), nullable=False)  # sha256 of the UTF-8 text
+    base_id = Column(Integer, ForeignKey("file_blobs.id"), nullable=True)  # set for deltas
+    chain_length = Column(Integer, nullable=False, default=0)  # deltas to apply after the nearest snapshot
+    size = Column(Integer, nullable=False)  # uncompressed characters
+    data = Column(LargeBinary, nullable=False)  # zlib-compressed text or delta
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class FileHistory(Base):
     __tablename__ = "file_history"
+    __table_args__ = (
+        Index("ix_file_history_path", "user_id", "file_path", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=True)
     file_path = Column(String(500), nullable=False)
-    operation = Column(String(50), nullable=False)  # create, update, delete
-    content_before = Column(Text, nullable=True)
-    content_after = Column(Text, nullable=True)
+    operation = Column(String(50), nullable=False)  # snapshot, create, update, patch, delete, restore
+    blob_id = Column(Integer, ForeignKey("file_blobs.id"), nullable=True)  # content after the operation; none for delete
+    version = Column(String(64), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
     user = relationship("User")
     project = relationship("Project")
+    blob = relationship("FileBlob")
@@ -0,0 +1,141 @@
+import os
+import time
+import tempfile
+from collections import deque
+from typing import Dict, Any, Optional
+
+# Last prune of each spill dir, so a burst of truncated commands scans it once
+_last_prune: Dict[str, float] = {}
+PRUNE_INTERVAL = 60
+
+def prune_spill_dir(spill_dir: str, max_age: int, now: Optional[float] = None) -> int:
+    """Delete spill files older than max_age seconds; returns how many"""
+    now = time.time() if now is None else now
+    removed = 0
+    try:
+        entries = list(os.scandir(spill_dir))
+    except OSError:
+        return 0
+    for entry in entries:
+        if not (entry.name.startswith('output-') and entry.name.endswith('.log')):
+            continue
+        try:
+            if entry.stat().st_mtime < now - max_age:
+                os.unlink(entry.path)
+                removed += 1
+        except OSError:
+            # Removed concurrently
+            pass
+    return removed
+
+class OutputCollector:
+    """Collect a byte stream keeping only its head and tail within a fixed size"""
+
+    def __init__(self, max_size: int, spill_dir: Optional[str] = None, spill_max_age: int = 3600):
+        self.max_size = max_size
+        self.head_limit = max_size // 2
+        self.tail_limit = max_size - self.head_limit
+        self.spill_dir = spill_dir
+        # Spill files are reported in get_info(), so they outlive the collector
+        # for this long and are pruned when later commands spill
+        self.spill_max_age = spill_max_age
+
+        self.head = bytearray()
+        self.tail = deque()
+        self.tail_size = 0
+        self.total_size = 0
+        self.truncated = False
+        self.spill_path: Optional[str] = None
+        self._spill_file = None
+
+    def feed(self, chunk: bytes):
+        """Add a chunk of output"""
+        if not chunk:
+            return
+
+        self.total_size += len(chunk)
+
+        if self.total_size > self.max_size and not self.truncated:
+            self.truncated = True
+            if self.spill_dir:
+                self._start_spill()
+
+        if self._spill_file:
+            self._spill_file.write(chunk)
+
+        # Fill the head first, everything after that goes through the tail ring
+        if len(self.head) < self.head_limit:
+            room = self.head_limit - len(self.head)
+            self.head += chunk[:room]
+            chunk = chunk[room:]
+            if not chunk:
+                return
+
+        self.tail.append(chunk)
+        self.tail_size += len(chunk)
+        while self.tail and self.tail_size - len(self.tail[0]) >= self.tail_limit:
+            self.tail_size -= len(self.tail.popleft())
+
+    def _start_spill(self):
+        """Copy what has been kept so far to a temp file and keep writing there"""
+        now = time.time()
+        if now - _last_prune.get(self.spill_dir, 0) >= PRUNE_INTERVAL:
+            _last_prune[self.spill_dir] = now
+            prune_spill_dir(self.spill_dir, self.spill_max_age, now)
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            self._spill_file = tempfile.NamedTemporaryFile(
+                mode='wb',
+                prefix='output-',
+                suffix='.log',
+                dir=self.spill_dir,
+                delete=False
+            )
+            self.spill_path = self._spill_file.name
+            # Nothing has been dropped yet at the moment of overflow
+            self._spill_file.write(self.head)
+            for chunk in self.tail:
+                self._spill_file.write(chunk)
+        except OSError:
+            self._spill_file = None
+            self.spill_path = None
+
+    def close(self, keep_spill: bool = True):
+        """Flush and close the spill file, if any; delete it unless keep_spill"""
+        if self._spill_file:
+            self._spill_file.close()
+            self._spill_file = None
+        if not keep_spill and self.spill_path:
+            try:
+                os.unlink(self.spill_path)
+            except OSError:
+                pass
+            self.spill_path = None
+
+    def get_bytes(self) -> bytes:
+        """Get the kept output; the middle is dropped when truncated"""
+        tail = b"".join(self.tail)
+        if not self.truncated:
+            return bytes(self.head) + tail
+        return bytes(self.head) + tail[-self.tail_limit:]
+
+    def get_text(self) -> str:
+        """Get the kept output decoded, with a marker where output was dropped"""
+        if not self.truncated:
+            return self.get_bytes().decode('utf-8', errors='replace')
+
+        tail = b"".join(self.tail)[-self.tail_limit:]
+        omitted = self.total_size - len(self.head) - len(tail)
+        return (
+            self.head.decode('utf-8', errors='replace')
+            + f"\n... [{omitted} bytes truncated] ...\n"
+            + tail.decode('utf-8', errors='replace')
+        )
+
+    def get_info(self) -> Dict[str, Any]:
+        """Get truncation metadata"""
+        return {
+            "total_bytes": self.total_size,
+            "truncated": self.truncated,
+            "spill_file": self.spill_path
+        }
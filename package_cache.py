@@ -0,0 +1,240 @@
+import os
+import stat
+import time
+import shutil
+import asyncio
+from typing import Dict, Any, List, Tuple, Hashable, Callable, Awaitable, Optional, Set
+
+# Decides whether a directory or file (name, depth below the cache root) is one
+# cache entry, evicted whole; None makes every file an entry
+EntryTest = Optional[Callable[[str, int], bool]]
+
+def _at_depth(depth: int) -> Callable[[str, int], bool]:
+    return lambda name, entry_depth: entry_depth == depth
+
+def _go_module(name: str, depth: int) -> bool:
+    # module@version (extracted sources) and .../@v (its downloads)
+    return name == "@v" or "@" in name
+
+class PackageCache:
+    """Download cache shared by pip, npm, yarn, cargo and go across users and projects"""
+
+    def __init__(self, cache_dir: str, max_size: int):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_size = max_size
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self._env = {
+            "PIP_CACHE_DIR": os.path.join(self.cache_dir, "pip"),
+            "npm_config_cache": os.path.join(self.cache_dir, "npm"),
+            "YARN_CACHE_FOLDER": os.path.join(self.cache_dir, "yarn"),
+            "CARGO_HOME": os.path.join(self.cache_dir, "cargo"),
+            "GOMODCACHE": os.path.join(self.cache_dir, "go")
+        }
+        # What may be evicted and in which units. pip and npm verify each cached
+        # file on read, so single files can go; yarn, cargo and go treat a package
+        # directory as valid if it exists, so only whole ones are removed.
+        # CARGO_HOME also holds installed binaries, which are never evicted.
+        cargo = self._env["CARGO_HOME"]
+        self._evictable: List[Tuple[str, EntryTest]] = [
+            (self._env["PIP_CACHE_DIR"], None),
+            (self._env["npm_config_cache"], None),
+            (self._env["YARN_CACHE_FOLDER"], _at_depth(2)),  # v6/<package>
+            (os.path.join(cargo, "registry", "cache"), _at_depth(2)),  # <index>/<crate>.crate
+            (os.path.join(cargo, "registry", "src"), _at_depth(2)),  # <index>/<crate>-<version>
+            (os.path.join(cargo, "git", "db"), _at_depth(1)),
+            (os.path.join(cargo, "git", "checkouts"), _at_depth(2)),
+            (self._env["GOMODCACHE"], _go_module)
+        ]
+
+        # Directory listings and entry sizes, reused while the directory's mtime
+        # is unchanged, so measuring after an install only stats directories
+        self._listings: Dict[str, Tuple[int, List[Tuple[str, int, float]], List[str]]] = {}
+        self._entry_sizes: Dict[str, Tuple[int, int, float]] = {}
+
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.size = 0
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.deduplicated = 0
+        self.evicted_bytes = 0
+        self.evicted_entries = 0
+
+    def env(self) -> Dict[str, str]:
+        """Environment pointing package managers at the shared cache"""
+        return dict(self._env)
+
+    def _listing(self, path: str, seen: Set[str]) -> Optional[Tuple[List[Tuple[str, int, float]], List[str]]]:
+        """Files (name, size, last use) and subdirectories of a directory"""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        seen.add(path)
+        cached = self._listings.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1], cached[2]
+
+        files, directories = [], []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            directories.append(entry.name)
+                        else:
+                            st = entry.stat(follow_symlinks=False)
+                            files.append((entry.name, st.st_size, max(st.st_atime, st.st_mtime)))
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+        self._listings[path] = (mtime, files, directories)
+        return files, directories
+
+    def _tree_size(self, path: str, seen: Set[str]) -> Tuple[int, float]:
+        """Total size and last use of an entry directory; entries do not change once written"""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return 0, 0.0
+        seen.add(path)
+        cached = self._entry_sizes.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1], cached[2]
+
+        size, last_use = 0, 0.0
+        for dirpath, _, filenames in os.walk(path):
+            for name in filenames:
+                try:
+                    st = os.lstat(os.path.join(dirpath, name))
+                except OSError:
+                    continue
+                size += st.st_size
+                last_use = max(last_use, st.st_atime, st.st_mtime)
+        if time.time() - last_use > 60:
+            # Not while something may still be extracting into it
+            self._entry_sizes[path] = (mtime, size, last_use)
+        return size, last_use
+
+    def _collect(self, path: str, is_entry: EntryTest, depth: int, seen: Set[str],
+                 entries: List[Tuple[float, int, str]]):
+        listing = self._listing(path, seen)
+        if listing is None:
+            return
+        files, directories = listing
+        for name, size, last_use in files:
+            if is_entry is None or is_entry(name, depth + 1):
+                entries.append((last_use, size, os.path.join(path, name)))
+        for name in directories:
+            child = os.path.join(path, name)
+            if is_entry is not None and is_entry(name, depth + 1):
+                size, last_use = self._tree_size(child, seen)
+                entries.append((last_use, size, child))
+            else:
+                self._collect(child, is_entry, depth + 1, seen, entries)
+
+    def _scan(self) -> List[Tuple[float, int, str]]:
+        """(last use, size, path) of every cache entry"""
+        entries: List[Tuple[float, int, str]] = []
+        seen: Set[str] = set()
+        for root, is_entry in self._evictable:
+            self._collect(root, is_entry, 0, seen, entries)
+        # Forget directories that are gone
+        for cache in (self._listings, self._entry_sizes):
+            for path in [p for p in cache if p not in seen]:
+                del cache[path]
+        return entries
+
+    def _remove(self, path: str):
+        if not os.path.isdir(path) or os.path.islink(path):
+            os.unlink(path)
+            return
+        # Go makes module directories read-only
+        for dirpath, _, _ in os.walk(path):
+            os.chmod(dirpath, stat.S_IRWXU)
+        shutil.rmtree(path)
+
+    def _measure_and_evict(self) -> int:
+        """Recompute the cache size, evicting least recently used entries over the cap"""
+        entries = self._scan()
+        size = sum(entry_size for _, entry_size, _ in entries)
+
+        if size > self.max_size:
+            # Listings may carry stale access times; look again before choosing
+            self._listings.clear()
+            self._entry_sizes.clear()
+            entries = self._scan()
+            size = sum(entry_size for _, entry_size, _ in entries)
+
+            # Evict down to 90% so the next install does not evict again
+            target = int(self.max_size * 0.9)
+            for _, entry_size, path in sorted(entries):
+                if size <= target:
+                    break
+                try:
+                    self._remove(path)
+                except OSError:
+                    continue
+                size -= entry_size
+                self.evicted_bytes += entry_size
+                self.evicted_entries += 1
+
+        return size
+
+    async def _refresh(self) -> int:
+        """Measure the cache off the event loop; returns how many bytes were added"""
+        before = self.size
+        self.size = await asyncio.get_event_loop().run_in_executor(None, self._measure_and_evict)
+        return self.size - before
+
+    async def _install(self, install: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        if not self.size:
+            await self._refresh()
+        result = await install()
+        added = await self._refresh()
+        if added > 0:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return {**result, "package_cache": {"hit": added <= 0, "bytes_added": max(added, 0)}}
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        self._in_flight.pop(key, None)
+        if not task.cancelled():
+            # Everyone waiting may have gone away; do not warn about an unretrieved error
+            task.exception()
+
+    async def run(self, key: Hashable, install: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Run an install, or wait for the identical one already running.
+
+        The install runs in its own task so one waiter going away does not
+        abort it for the others. It counts as a cache hit when the cache did
+        not grow, i.e. everything it needed was already downloaded.
+        """
+        task = self._in_flight.get(key)
+        deduplicated = task is not None
+        if deduplicated:
+            self.deduplicated += 1
+        else:
+            task = asyncio.ensure_future(self._install(install))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+
+        result = await asyncio.shield(task)
+        return {**result, "package_cache": {**result["package_cache"], "deduplicated": deduplicated}}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "cache_dir": self.cache_dir,
+            "size": self.size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "deduplicated": self.deduplicated,
+            "evicted_bytes": self.evicted_bytes,
+            "evicted_entries": self.evicted_entries,
+            "in_flight": len(self._in_flight)
+        }
@@ -0,0 +1,241 @@
+import os
+import uuid
+import signal
+import asyncio
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Only used where pidfd_open is unavailable; one blocked thread per running child
+_reaper_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="reaper")
+
+class ResourceLimits:
+    """Per-execution rlimits applied in the child before exec"""
+
+    def __init__(self, cpu_time: int = 0, memory: int = 0, file_size: int = 0, processes: int = 0):
+        # 0 means "leave unlimited"
+        self.cpu_time = cpu_time  # seconds of CPU
+        self.memory = memory  # bytes of data segment / private writable memory
+        self.file_size = file_size  # bytes per written file
+        # Tasks in the execution's cgroup (pids.max). Not an rlimit: RLIMIT_NPROC
+        # counts every process of the shared user id, so executions starve each other
+        self.processes = processes
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "cpu_time": self.cpu_time,
+            "memory": self.memory,
+            "file_size": self.file_size,
+            "processes": self.processes
+        }
+
+    def apply(self):
+        """Set the limits on the current process"""
+        if resource is None:
+            return
+
+        # RLIMIT_DATA rather than RLIMIT_AS: JVMs and V8 reserve huge address
+        # ranges up front and fail to start under an address-space limit
+        limits = [
+            (resource.RLIMIT_CPU, self.cpu_time),
+            (resource.RLIMIT_DATA, self.memory),
+            (resource.RLIMIT_FSIZE, self.file_size),
+            (resource.RLIMIT_CORE, 0)
+        ]
+        for limit, value in limits:
+            if value or limit == resource.RLIMIT_CORE:
+                try:
+                    resource.setrlimit(limit, (value, value))
+                except (ValueError, OSError):
+                    # Cannot raise a hard limit we were started under
+                    pass
+
+def rusage_to_dict(rusage) -> Dict[str, int]:
+    """Convert a struct_rusage to the resource_usage dict returned with results"""
+    return {
+        "cpu_time_ms": int((rusage.ru_utime + rusage.ru_stime) * 1000),
+        "user_time_ms": int(rusage.ru_utime * 1000),
+        "system_time_ms": int(rusage.ru_stime * 1000),
+        "max_rss_kb": rusage.ru_maxrss,
+        # Block counts are in 512-byte units
+        "io_read_bytes": rusage.ru_inblock * 512,
+        "io_write_bytes": rusage.ru_oublock * 512
+    }
+
+class CgroupSandbox:
+    """A throwaway cgroup v2 group under a delegated root, for one execution"""
+
+    def __init__(self, root: str, limits: ResourceLimits):
+        self.path = os.path.join(root, f"exec-{uuid.uuid4().hex[:12]}")
+        os.mkdir(self.path)
+        self._write("memory.max", str(limits.memory) if limits.memory else "max")
+        self._write("pids.max", str(limits.processes) if limits.processes else "max")
+
+    def _write(self, name: str, value: str):
+        try:
+            with open(os.path.join(self.path, name), 'w') as f:
+                f.write(value)
+        except OSError:
+            # Controller not enabled for this subtree
+            pass
+
+    def _read(self, name: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self.path, name)) as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def enter(self):
+        """Move the calling process into the group (used from preexec_fn)"""
+        with open(os.path.join(self.path, "cgroup.procs"), 'w') as f:
+            f.write("0")
+
+    def get_usage(self) -> Dict[str, int]:
+        """Read accounting for everything that ran in the group"""
+        usage = {}
+
+        cpu_stat = self._read("cpu.stat")
+        if cpu_stat:
+            fields = dict(line.split() for line in cpu_stat.splitlines() if line)
+            if "usage_usec" in fields:
+                usage["cpu_time_ms"] = int(fields["usage_usec"]) // 1000
+
+        peak = self._read("memory.peak")
+        if peak and peak.strip().isdigit():
+            usage["max_rss_kb"] = int(peak) // 1024
+
+        io_stat = self._read("io.stat")
+        if io_stat:
+            read_bytes = write_bytes = 0
+            for line in io_stat.splitlines():
+                for field in line.split()[1:]:
+                    key, _, value = field.partition("=")
+                    if key == "rbytes":
+                        read_bytes += int(value)
+                    elif key == "wbytes":
+                        write_bytes += int(value)
+            usage["io_read_bytes"] = read_bytes
+            usage["io_write_bytes"] = write_bytes
+
+        return usage
+
+    def remove(self):
+        try:
+            os.rmdir(self.path)
+        except OSError:
+            pass
+
+class ManagedProcess:
+    """asyncio-style process handle that reaps with wait4() to keep the child's rusage"""
+
+    def __init__(self, popen: subprocess.Popen, stdout: asyncio.StreamReader, stderr: asyncio.StreamReader,
+                 cgroup: Optional[CgroupSandbox] = None, new_session: bool = False):
+        self.popen = popen
+        self.pid = popen.pid
+        # A session leader's signals go to its whole process group
+        self.new_session = new_session
+        self.stdout = stdout
+        self.stderr = stderr
+        self.cgroup = cgroup
+        self.returncode: Optional[int] = None
+        self.resource_usage: Dict[str, int] = {}
+
+        self._loop = asyncio.get_event_loop()
+        self._exited = self._loop.create_future()
+        self._pidfd = None
+        self._start_reaper()
+
+    def _start_reaper(self):
+        try:
+            self._pidfd = os.pidfd_open(self.pid)
+            self._loop.add_reader(self._pidfd, self._on_pidfd_readable)
+        except (AttributeError, OSError):
+            self._pidfd = None
+            future = self._loop.run_in_executor(_reaper_executor, os.wait4, self.pid, 0)
+            future.add_done_callback(lambda f: self._set_exited(*f.result()[1:]))
+
+    def _on_pidfd_readable(self):
+        pid, status, rusage = os.wait4(self.pid, os.WNOHANG)
+        if pid == 0:
+            return
+        self._loop.remove_reader(self._pidfd)
+        os.close(self._pidfd)
+        self._pidfd = None
+        self._set_exited(status, rusage)
+
+    def _set_exited(self, status: int, rusage):
+        self.returncode = os.waitstatus_to_exitcode(status)
+        # Keep Popen from trying to reap the pid again
+        self.popen.returncode = self.returncode
+        self.resource_usage = rusage_to_dict(rusage)
+        if self.cgroup:
+            self.resource_usage.update(self.cgroup.get_usage())
+            self.cgroup.remove()
+        if not self._exited.done():
+            self._exited.set_result(self.returncode)
+
+    async def wait(self) -> int:
+        return await asyncio.shield(self._exited)
+
+    def send_signal(self, sig: int):
+        # Never use Popen.send_signal: its poll() would reap the child behind our back
+        if self.returncode is None:
+            try:
+                if self.new_session:
+                    os.killpg(self.pid, sig)
+                else:
+                    os.kill(self.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+async def spawn_process(args: List[str], cwd: str, env: Dict[str, str], limits: ResourceLimits = None,
+                        cgroup_root: str = None, new_session: bool = False, pass_fds: tuple = ()) -> ManagedProcess:
+    """Start a child with piped output under the given limits"""
+    loop = asyncio.get_event_loop()
+
+    cgroup = None
+    if cgroup_root and limits:
+        try:
+            cgroup = CgroupSandbox(cgroup_root, limits)
+        except OSError:
+            cgroup = None
+
+    def preexec():
+        if cgroup:
+            try:
+                cgroup.enter()
+            except OSError:
+                pass
+        if limits:
+            limits.apply()
+
+    popen = subprocess.Popen(
+        args,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=cwd,
+        env=env,
+        preexec_fn=preexec if os.name == "posix" else None,
+        start_new_session=new_session,
+        pass_fds=pass_fds
+    )
+
+    stdout = asyncio.StreamReader()
+    stderr = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(stdout), popen.stdout)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(stderr), popen.stderr)
+
+    return ManagedProcess(popen, stdout, stderr, cgroup, new_session)
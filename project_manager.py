@@ -6,11 +6,17 @@ from typing import Dict, List, Any, Optional
 from fastapi import HTTPException
 import subprocess
 import asyncio
+from file_index import FileIndex, is_ignored_dir
+from atomic_write import AtomicWriteBatch
 
 class ProjectManager:
-    def __init__(self, workspace_path: str = "./workspace"):
+    def __init__(self, workspace_path: str = "./workspace", terminal_manager=None, file_index: FileIndex = None):
         self.workspace_path = Path(workspace_path)
         self.workspace_path.mkdir(exist_ok=True)
+        # Shared with the FileManager when both serve the same workspace
+        self.file_index = file_index or FileIndex(str(self.workspace_path))
+        # Runs setup commands under the execution limits and shared package cache
+        self.terminal_manager = terminal_manager
         
         # Project templates
         self.templates = {
@@ -524,16 +530,16 @@ document.addEventListener('DOMContentLoaded', function() {
             # Get template data
             template_data = self.templates[template]
             
-            # Create files from template
-            for file_path, content in template_data["files"].items():
-                full_file_path = project_path / file_path
-                full_file_path.parent.mkdir(parents=True, exist_ok=True)
-                
-                # Replace placeholders
-                processed_content = content.replace("{project_name}", name)
-                
-                with open(full_file_path, 'w', encoding='utf-8') as f:
-                    f.write(processed_content)
+            # Create files from template, synced to disk together
+            with AtomicWriteBatch() as batch:
+                for file_path, content in template_data["files"].items():
+                    full_file_path = project_path / file_path
+                    full_file_path.parent.mkdir(parents=True, exist_ok=True)
+                    
+                    # Replace placeholders
+                    processed_content = content.replace("{project_name}", name)
+                    
+                    batch.write(full_file_path, processed_content)
             
             return str(project_path.relative_to(self.workspace_path))
             
@@ -542,7 +548,7 @@ document.addEventListener('DOMContentLoaded', function() {
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Project creation failed: {str(e)}")
     
-    async def setup_project(self, project_path: str, template: str) -> Dict[str, Any]:
+    async def setup_project(self, project_path: str, template: str, user_id: int = None) -> Dict[str, Any]:
         """Setup project by running initialization commands"""
         try:
             if template not in self.templates:
@@ -555,32 +561,29 @@ document.addEventListener('DOMContentLoaded', function() {
             template_data = self.templates[template]
             commands = template_data.get("commands", [])
             
+            if self.terminal_manager is None:
+                raise HTTPException(status_code=500, detail="Project setup is not configured")
+            
             results = []
             
             for command in commands:
                 try:
                     # Execute command in project directory
-                    process = await asyncio.create_subprocess_shell(
-                        command,
-                        stdout=asyncio.subprocess.PIPE,
-                        stderr=asyncio.subprocess.PIPE,
-                        cwd=str(full_path)
-                    )
-                    
-                    stdout, stderr = await process.communicate()
+                    result = await self.terminal_manager.run_install(command, str(full_path.resolve()), user_id=user_id)
                     
                     results.append({
                         "command": command,
-                        "stdout": stdout.decode('utf-8'),
-                        "stderr": stderr.decode('utf-8'),
-                        "exit_code": process.returncode,
-                        "success": process.returncode == 0
+                        "stdout": result["stdout"],
+                        "stderr": result["stderr"],
+                        "exit_code": result["exit_code"],
+                        "success": result["exit_code"] == 0,
+                        "package_cache": result["package_cache"]
                     })
                     
-                except Exception as e:
+                except HTTPException as e:
                     results.append({
                         "command": command,
-                        "error": str(e),
+                        "error": e.detail,
                         "success": False
                     })
             
@@ -606,24 +609,28 @@ document.addEventListener('DOMContentLoaded', function() {
             # Detect project type
             project_type = self._detect_project_type(full_path)
             
-            # Get project files
-            files = []
-            for root, dirs, file_list in os.walk(full_path):
-                # Skip hidden and build directories
-                dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ['node_modules', '__pycache__', 'build', 'dist']]
-                
-                for file in file_list:
-                    if not file.startswith('.'):
-                        file_path = Path(root) / file
-                        relative_path = file_path.relative_to(full_path)
-                        files.append(str(relative_path))
+            node = self.file_index.get(project_path)
+            if node is None:
+                # Created since the last change event
+                self.file_index.refresh(project_path)
+                node = self.file_index.get(project_path)
+            
+            # Get project files, skipping hidden and build directories
+            files = [
+                rel_path for rel_path, file_node in self.file_index.walk(
+                    project_path,
+                    skip_dir=is_ignored_dir,
+                    relative=True
+                )
+                if not file_node.name.startswith('.')
+            ]
             
             return {
                 "name": full_path.name,
                 "path": project_path,
                 "type": project_type,
                 "files": sorted(files),
-                "size": sum(f.stat().st_size for f in full_path.rglob('*') if f.is_file()),
+                "size": node.size if node is not None else 0,
                 "created": os.path.getctime(full_path)
             }
             
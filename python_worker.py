@@ -0,0 +1,263 @@
+# Warm Python worker process managed by PythonWorkerPool. Requests and
+# responses are length-prefixed JSON on stdin/stdout; every snippet runs in a
+# forked child so runs are isolated while startup and imports are paid once.
+# While a snippet runs the pool may send {"signal": n} frames on stdin to
+# signal it; frames are ordered after their request, so a late one that
+# arrives once the run is over is simply skipped.
+import os
+import signal
+
+# Installed before anything else so a SIGINT or SIGTERM sent to the worker
+# (Ctrl+C on the server's terminal) during the warm-up imports does not kill it.
+# Outside a run there is nothing to forward them to.
+FORWARDED_SIGNALS = (signal.SIGINT, signal.SIGTERM)
+current_child = None
+
+def signal_child(pid, signum):
+    try:
+        os.killpg(pid, signum)
+    except ProcessLookupError:
+        # The child may not have called setsid() yet
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+def forward_signal(signum, frame):
+    if current_child is not None:
+        signal_child(current_child, signum)
+
+for _signum in FORWARDED_SIGNALS:
+    signal.signal(_signum, forward_signal)
+
+import sys
+import json
+import time
+import select
+import struct
+import resource
+import selectors
+import traceback
+
+from output_collector import OutputCollector
+from process_limits import ResourceLimits, rusage_to_dict
+
+# Warm up modules snippets commonly import
+import re
+import math
+import random
+import datetime
+import itertools
+import functools
+import collections
+import typing
+
+# The worker is started as a script, so its own directory is sys.path[0]
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def isolate_imports(cwd):
+    """Make imports in the snippet resolve as for a script in cwd, not in the app directory"""
+    sys.path[:] = [cwd] + [p for p in sys.path[1:] if os.path.abspath(p or '.') != APP_DIR]
+    # The worker's own helper modules must not shadow the snippet's modules of the same name
+    for name, module in list(sys.modules.items()):
+        module_file = getattr(module, '__file__', None)
+        if name != '__main__' and module_file and os.path.dirname(os.path.abspath(module_file)) == APP_DIR:
+            del sys.modules[name]
+
+def read_exactly(fd, size):
+    data = b''
+    while len(data) < size:
+        chunk = os.read(fd, size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+def read_message(fd):
+    # Unbuffered, so select() on the fd sees every frame the pool has sent
+    header = read_exactly(fd, 4)
+    if header is None:
+        return None
+    (length,) = struct.unpack('>I', header)
+    payload = read_exactly(fd, length)
+    return None if payload is None else json.loads(payload.decode('utf-8'))
+
+def write_message(stream, message):
+    payload = json.dumps(message).encode('utf-8')
+    stream.write(struct.pack('>I', len(payload)) + payload)
+    stream.flush()
+
+def run_child(code, cwd, stdout_fd, stderr_fd, protocol_fds, limits):
+    """Run the snippet in the forked child; never returns"""
+    os.setsid()
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # Signals sent since the fork were held back until the handlers above were in place
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, FORWARDED_SIGNALS)
+    if limits:
+        ResourceLimits(**limits).apply()
+    for fd in protocol_fds:
+        os.close(fd)
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.dup2(stdout_fd, 1)
+    os.dup2(stderr_fd, 2)
+
+    exit_code = 0
+    try:
+        os.chdir(cwd)
+        isolate_imports(os.getcwd())
+        sys.argv = ['<snippet>']
+        compiled = compile(code, '<snippet>', 'exec')
+        exec(compiled, {'__name__': '__main__', '__builtins__': __builtins__})
+    except SystemExit as e:
+        if e.code is None:
+            exit_code = 0
+        elif isinstance(e.code, int):
+            exit_code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            exit_code = 1
+    except BaseException:
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except Exception:
+            pass
+        os._exit(exit_code & 0xFF)
+
+def pending_cancel(requests_fd):
+    """Signal the pool has already asked for, without waiting; SIGKILL if the pool has gone"""
+    while select.select([requests_fd], [], [], 0)[0]:
+        message = read_message(requests_fd)
+        if message is None:
+            return signal.SIGKILL
+        if 'signal' in message:
+            return message['signal']
+    return None
+
+def children_rss_kb():
+    """Peak RSS of the largest snippet child so far"""
+    # Snippets run in the children; the worker itself barely grows
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+def cancelled_result(signum, max_output):
+    empty = OutputCollector(max_output)
+    return {
+        'stdout': '',
+        'stderr': '',
+        'exit_code': -signum,
+        'execution_time': 0,
+        'timed_out': False,
+        'resource_usage': None,
+        'truncated': False,
+        'output_info': {'stdout': empty.get_info(), 'stderr': empty.get_info()},
+        'worker_rss_kb': children_rss_kb()
+    }
+
+def run_snippet(request, requests_fd, protocol_fds):
+    """Fork a child for one snippet and collect its output within the limits"""
+    global current_child
+    max_output = request['max_output']
+    deadline = time.monotonic() + request['timeout']
+
+    # Cancelled before it started: skip the fork altogether
+    signum = pending_cancel(requests_fd)
+    if signum is not None:
+        return cancelled_result(signum, max_output)
+
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    start = time.monotonic()
+    # Until current_child is set the handlers would drop a forwarded signal, and the
+    # child needs its own handlers first; hold signals back on both sides of the fork
+    signal.pthread_sigmask(signal.SIG_BLOCK, FORWARDED_SIGNALS)
+    pid = os.fork()
+    if pid == 0:
+        os.close(out_r)
+        os.close(err_r)
+        run_child(request['code'], request['cwd'], out_w, err_w, protocol_fds, request.get('limits'))
+    current_child = pid
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, FORWARDED_SIGNALS)
+    os.close(out_w)
+    os.close(err_w)
+
+    collectors = {out_r: OutputCollector(max_output), err_r: OutputCollector(max_output)}
+    selector = selectors.DefaultSelector()
+    for fd in collectors:
+        selector.register(fd, selectors.EVENT_READ)
+    selector.register(requests_fd, selectors.EVENT_READ)
+
+    timed_out = False
+    open_fds = len(collectors)
+    while open_fds:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            break
+        for key, _ in selector.select(timeout=remaining):
+            if key.fd == requests_fd:
+                message = read_message(requests_fd)
+                if message is None:
+                    # The pool is gone; nobody will collect the result
+                    selector.unregister(requests_fd)
+                    signal_child(pid, signal.SIGKILL)
+                elif 'signal' in message:
+                    signal_child(pid, message['signal'])
+                continue
+            chunk = os.read(key.fd, 65536)
+            if chunk:
+                collectors[key.fd].feed(chunk)
+            else:
+                selector.unregister(key.fd)
+                open_fds -= 1
+
+    if timed_out:
+        signal_child(pid, signal.SIGKILL)
+    _, status, rusage = os.wait4(pid, 0)
+    current_child = None
+    elapsed = time.monotonic() - start
+
+    selector.close()
+    os.close(out_r)
+    os.close(err_r)
+
+    stdout, stderr = collectors[out_r], collectors[err_r]
+    return {
+        'stdout': stdout.get_text(),
+        'stderr': stderr.get_text(),
+        'exit_code': os.waitstatus_to_exitcode(status),
+        'execution_time': int(elapsed * 1000),
+        'timed_out': timed_out,
+        'resource_usage': rusage_to_dict(rusage),
+        'truncated': stdout.truncated or stderr.truncated,
+        'output_info': {'stdout': stdout.get_info(), 'stderr': stderr.get_info()},
+        'worker_rss_kb': children_rss_kb()
+    }
+
+def main():
+    # Keep the protocol channel away from anything the snippets might print
+    requests_fd = os.dup(0)
+    responses = os.fdopen(os.dup(1), 'wb')
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+
+    protocol_fds = (requests_fd, responses.fileno())
+    while True:
+        request = read_message(requests_fd)
+        if request is None:
+            break
+        if 'signal' in request:
+            continue  # Sent for a run that finished before it was read
+        try:
+            response = run_snippet(request, requests_fd, protocol_fds)
+        except Exception as e:
+            response = {'error': str(e)}
+        write_message(responses, response)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+import os
+import json
+import shutil
+import struct
+import asyncio
+from typing import Dict, Any, List, Optional, Callable
+from fastapi import HTTPException
+
+from process_limits import ResourceLimits
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "python_worker.py")
+
+class PythonWorker:
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.runs = 0
+        self.rss_kb = 0
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    def send(self, message: Dict[str, Any]):
+        """Queue a frame for the worker; frames reach it in the order they were sent"""
+        payload = json.dumps(message).encode('utf-8')
+        self.process.stdin.write(struct.pack('>I', len(payload)) + payload)
+
+    async def receive(self) -> Dict[str, Any]:
+        """Wait for the response to the request in flight"""
+        await self.process.stdin.drain()
+        header = await self.process.stdout.readexactly(4)
+        (length,) = struct.unpack('>I', header)
+        return json.loads(await self.process.stdout.readexactly(length))
+
+    def forward_signal(self, sig: int):
+        """Signal the snippet the worker is running.
+
+        Sent as a frame on the request pipe rather than to the worker process,
+        so it cannot kill a worker that is still starting, and it is never
+        read before the request it belongs to; the worker skips the fork if
+        the snippet has not started yet.
+        """
+        if self.alive and not self.process.stdin.is_closing():
+            self.send({"signal": int(sig)})
+    
+    async def stop(self):
+        if self.alive:
+            self.process.kill()
+            await self.process.wait()
+
+class PythonWorkerPool:
+    """Pool of warm Python interpreters that run snippets in forked children"""
+
+    def __init__(self, size: int, max_runs: int, max_rss: int, python_executable: str = None):
+        self.size = size
+        self.max_runs = max_runs
+        self.max_rss_kb = max_rss // 1024
+        self.python_executable = python_executable or shutil.which("python3") or "python3"
+
+        self.workers: List[PythonWorker] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self.recycled = 0
+
+    async def _spawn_worker(self) -> PythonWorker:
+        process = await asyncio.create_subprocess_exec(
+            self.python_executable, "-u", WORKER_SCRIPT,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            cwd=os.path.dirname(WORKER_SCRIPT)
+        )
+        worker = PythonWorker(process)
+        self.workers.append(worker)
+        return worker
+
+    async def start(self):
+        """Spawn the workers if the pool has not been started"""
+        if self._idle is not None:
+            return
+
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            self._idle.put_nowait(await self._spawn_worker())
+
+    async def _retire(self, worker: PythonWorker):
+        """Stop a worker and put a fresh one in its place"""
+        if worker in self.workers:
+            self.workers.remove(worker)
+        await worker.stop()
+        self.recycled += 1
+        self._idle.put_nowait(await self._spawn_worker())
+
+    async def run(self, code: str, cwd: str, timeout: float, max_output: int, limits: ResourceLimits = None,
+                  on_start: Callable[[Callable[[int], None]], None] = None) -> Dict[str, Any]:
+        """Run a snippet on an idle worker; on_start receives a function that signals the snippet"""
+        await self.start()
+        worker = await self._idle.get()
+
+        try:
+            worker.send({
+                "code": code,
+                "cwd": cwd,
+                "timeout": timeout,
+                "max_output": max_output,
+                "limits": limits.to_dict() if limits else None
+            })
+            # Only once the request is queued, so any signal frame follows it
+            if on_start:
+                on_start(worker.forward_signal)
+            # The worker enforces the run timeout itself; this only catches a hung worker
+            response = await asyncio.wait_for(worker.receive(), timeout=timeout + 10)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError) as e:
+            await self._retire(worker)
+            raise HTTPException(status_code=500, detail=f"Python worker failed: {type(e).__name__}")
+        except BaseException:
+            await self._retire(worker)
+            raise
+
+        worker.runs += 1
+        worker.rss_kb = response.get("worker_rss_kb", 0)
+
+        if worker.runs >= self.max_runs or worker.rss_kb > self.max_rss_kb or not worker.alive:
+            await self._retire(worker)
+        else:
+            self._idle.put_nowait(worker)
+
+        if "error" in response:
+            raise HTTPException(status_code=500, detail=f"Python worker failed: {response['error']}")
+        return response
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize() if self._idle else 0,
+            "recycled": self.recycled,
+            "workers": [{"pid": w.process.pid, "runs": w.runs, "rss_kb": w.rss_kb} for w in self.workers]
+        }
+
+    async def shutdown(self):
+        """Stop all workers"""
+        for worker in list(self.workers):
+            await worker.stop()
+        self.workers.clear()
+        self._idle = None
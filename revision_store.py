@@ -0,0 +1,208 @@
+import json
+import zlib
+import difflib
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import models
+from text_patch import content_version, split_lines
+
+class RevisionStore:
+    """File revisions kept as zlib-compressed snapshots plus forward line deltas, deduplicated per user by content hash.
+
+    Each new content is stored as a delta against the file's previous
+    revision until the chain reaches max_chain_length, then as a full
+    snapshot, so rebuilding any revision applies at most that many deltas.
+    """
+
+    def __init__(self, max_chain_length: int = 50, compression_level: int = 6, cache_size: int = 16):
+        self.max_chain_length = max_chain_length
+        self.compression_level = compression_level
+        self.cache_size = cache_size
+        # Rebuilt contents by blob id; consecutive revisions share most of their chain
+        self._cache: "OrderedDict[int, str]" = OrderedDict()
+
+    def _remember(self, blob_id: int, content: str):
+        self._cache[blob_id] = content
+        self._cache.move_to_end(blob_id)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _encode_delta(self, base: str, content: str) -> bytes:
+        """Copy ranges of base lines ([start, end]) and inserted text (strings)"""
+        base_lines = split_lines(base)
+        lines = split_lines(content)
+        ops: List[Any] = []
+        for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, base_lines, lines).get_opcodes():
+            if tag == "equal":
+                ops.append([i1, i2])
+            elif j2 > j1:
+                ops.append("".join(lines[j1:j2]))
+        return zlib.compress(json.dumps(ops).encode('utf-8'), self.compression_level)
+
+    def _apply_delta(self, base: str, data: bytes) -> str:
+        base_lines = split_lines(base)
+        pieces = []
+        for op in json.loads(zlib.decompress(data)):
+            if isinstance(op, list):
+                pieces.extend(base_lines[op[0]:op[1]])
+            else:
+                pieces.append(op)
+        return "".join(pieces)
+
+    def get_content(self, db: Session, blob: models.FileBlob) -> str:
+        if blob.id in self._cache:
+            self._cache.move_to_end(blob.id)
+            return self._cache[blob.id]
+
+        # Walk back to the nearest snapshot (or cached content), then replay forwards
+        chain = []
+        current = blob
+        while current.base_id is not None and current.id not in self._cache:
+            chain.append(current)
+            current = db.query(models.FileBlob).filter(models.FileBlob.id == current.base_id).first()
+
+        if current.id in self._cache:
+            content = self._cache[current.id]
+        else:
+            content = zlib.decompress(current.data).decode('utf-8')
+        for delta in reversed(chain):
+            content = self._apply_delta(content, delta.data)
+
+        self._remember(blob.id, content)
+        return content
+
+    def _find_blob(self, db: Session, user_id: int, content_hash: str) -> Optional[models.FileBlob]:
+        return db.query(models.FileBlob).filter(
+            models.FileBlob.user_id == user_id,
+            models.FileBlob.content_hash == content_hash
+        ).first()
+
+    def _store_blob(self, db: Session, user_id: int, content: str,
+                    base: Optional[models.FileBlob]) -> models.FileBlob:
+        content_hash = content_version(content)
+        existing = self._find_blob(db, user_id, content_hash)
+        if existing is not None:
+            return existing
+
+        blob = models.FileBlob(
+            user_id=user_id,
+            content_hash=content_hash,
+            chain_length=0,
+            size=len(content),
+            data=zlib.compress(content.encode('utf-8'), self.compression_level)
+        )
+        if base is not None and base.chain_length < self.max_chain_length:
+            delta = self._encode_delta(self.get_content(db, base), content)
+            if len(delta) < len(blob.data):
+                blob.base_id = base.id
+                blob.chain_length = base.chain_length + 1
+                blob.data = delta
+
+        try:
+            with db.begin_nested():
+                db.add(blob)
+        except IntegrityError:
+            # A concurrent save of the same content inserted it first
+            return self._find_blob(db, user_id, content_hash)
+        self._remember(blob.id, content)
+        return blob
+
+    def _latest(self, db: Session, user_id: int, file_path: str,
+                project_id: Optional[int]) -> Optional[models.FileHistory]:
+        return db.query(models.FileHistory).filter(
+            models.FileHistory.user_id == user_id,
+            models.FileHistory.project_id == project_id,
+            models.FileHistory.file_path == file_path
+        ).order_by(models.FileHistory.id.desc()).first()
+
+    def has_history(self, db: Session, user_id: int, file_path: str, project_id: Optional[int] = None) -> bool:
+        return self._latest(db, user_id, file_path, project_id) is not None
+
+    def record(self, db: Session, user_id: int, file_path: str, operation: str, content: Optional[str],
+               project_id: Optional[int] = None) -> models.FileHistory:
+        """Add a revision; content is the file after the operation, None for a delete"""
+        previous = self._latest(db, user_id, file_path, project_id)
+        blob = None
+        if content is not None:
+            if previous is not None and previous.version == content_version(content) and operation != "restore":
+                return previous  # Saved without changes
+            base = previous.blob if previous is not None and previous.blob_id is not None else None
+            blob = self._store_blob(db, user_id, content, base)
+
+        revision = models.FileHistory(
+            user_id=user_id,
+            project_id=project_id,
+            file_path=file_path,
+            operation=operation,
+            blob_id=blob.id if blob else None,
+            version=blob.content_hash if blob else None
+        )
+        db.add(revision)
+        db.commit()
+        return revision
+
+    def to_dict(self, revision: models.FileHistory) -> Dict[str, Any]:
+        return {
+            "id": revision.id,
+            "file_path": revision.file_path,
+            "project_id": revision.project_id,
+            "operation": revision.operation,
+            "version": revision.version,
+            "size": revision.blob.size if revision.blob is not None else None,
+            "created_at": revision.created_at.isoformat() if revision.created_at else None
+        }
+
+    def list_revisions(self, db: Session, user_id: int, file_path: str, project_id: Optional[int] = None,
+                       limit: int = 50, before_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Revisions of a file, newest first"""
+        query = db.query(models.FileHistory).filter(
+            models.FileHistory.user_id == user_id,
+            models.FileHistory.project_id == project_id,
+            models.FileHistory.file_path == file_path
+        )
+        if before_id is not None:
+            query = query.filter(models.FileHistory.id < before_id)
+        revisions = query.order_by(models.FileHistory.id.desc()).limit(max(1, min(limit, 500))).all()
+        return [self.to_dict(revision) for revision in revisions]
+
+    def get_revision(self, db: Session, user_id: int, revision_id: int) -> models.FileHistory:
+        revision = db.query(models.FileHistory).filter(
+            models.FileHistory.id == revision_id,
+            models.FileHistory.user_id == user_id
+        ).first()
+        if revision is None:
+            raise HTTPException(status_code=404, detail="Revision not found")
+        return revision
+
+    def revision_content(self, db: Session, revision: models.FileHistory) -> Optional[str]:
+        return self.get_content(db, revision.blob) if revision.blob is not None else None
+
+    def diff(self, db: Session, user_id: int, revision_id: int, against_id: Optional[int] = None) -> Dict[str, Any]:
+        """Unified diff from another revision (by default the one before) to this one"""
+        revision = self.get_revision(db, user_id, revision_id)
+        if against_id is not None:
+            against = self.get_revision(db, user_id, against_id)
+        else:
+            against = db.query(models.FileHistory).filter(
+                models.FileHistory.user_id == user_id,
+                models.FileHistory.project_id == revision.project_id,
+                models.FileHistory.file_path == revision.file_path,
+                models.FileHistory.id < revision.id
+            ).order_by(models.FileHistory.id.desc()).first()
+
+        old = self.revision_content(db, against) if against is not None else None
+        new = self.revision_content(db, revision)
+        diff = difflib.unified_diff(
+            split_lines(old or ""),
+            split_lines(new or ""),
+            fromfile=f"{revision.file_path}@{against.id}" if against is not None else "/dev/null",
+            tofile=f"{revision.file_path}@{revision.id}" if new is not None else "/dev/null"
+        )
+        return {
+            "from": self.to_dict(against) if against is not None else None,
+            "to": self.to_dict(revision),
+            "diff": "".join(diff)
+        }
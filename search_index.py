@@ -0,0 +1,245 @@
+import os
+import re
+import threading
+from typing import Dict, Any, List, Optional, Set, Iterable
+from fastapi import HTTPException
+from file_index import FileIndex, is_ignored_dir
+from text_encoding import detect_encoding
+
+try:
+    import re._parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def _literal_runs(parsed) -> List[str]:
+    """Literal strings every match of a parsed regex must contain"""
+    runs, current = [], []
+    for op, arg in parsed:
+        if op == sre_parse.LITERAL:
+            current.append(chr(arg))
+            continue
+        runs.append("".join(current))
+        current = []
+        if op == sre_parse.SUBPATTERN:
+            # A plain group is required as well; optional ones come wrapped in a repeat
+            runs.extend(_literal_runs(arg[-1]))
+    runs.append("".join(current))
+    return [run for run in runs if len(run) >= 3]
+
+class TrigramIndex:
+    """Trigram postings for the text files of a FileIndex, kept current from its change events.
+
+    Trigrams are lowercased so one index serves case-sensitive and insensitive
+    searches; candidate files are verified against the pattern. Only postings
+    are kept: a changed or deleted file's id is retired rather than removed
+    from every posting, and retired ids are swept out once they pile up.
+    Change events are only noted; the index is updated under a lock by the
+    next search, which callers run off the event loop.
+    """
+
+    def __init__(self, file_index: FileIndex, extensions: Iterable[str], max_file_size: int = 1024 * 1024,
+                 max_matches_per_file: int = 20):
+        self.file_index = file_index
+        self.extensions = set(extensions)
+        # Larger files are not indexed, only scanned when searched
+        self.max_file_size = max_file_size
+        self.max_matches_per_file = max_matches_per_file
+
+        self._postings: Dict[str, Set[int]] = {}
+        self._ids: Dict[str, int] = {}
+        self._paths: Dict[int, str] = {}
+        self._next_id = 0
+        self._retired = 0  # ids still in postings that no longer belong to a file
+        self._unindexed: Set[str] = set()
+        self._dirty: Set[str] = set()
+        self._deleted_dirs: Set[str] = set()
+        self._built = False
+        # _lock serializes index updates; _notes_lock guards the changes noted by events
+        self._lock = threading.Lock()
+        self._notes_lock = threading.Lock()
+
+        file_index.add_listener(self._on_change)
+
+    def _on_change(self, event: Dict[str, Any]):
+        # Only note what changed; files are re-read by the next search
+        if not self._built:
+            return
+        rel_path = event["path"]
+        directories = rel_path.split("/") if event["is_dir"] else rel_path.split("/")[:-1]
+        if event["type"] != "resync" and any(is_ignored_dir(name) for name in directories):
+            return
+        if event["is_dir"] and event["type"] == "created":
+            created = [path for path, _ in self.file_index.walk(rel_path, skip_dir=is_ignored_dir)]
+        with self._notes_lock:
+            if event["type"] == "resync":
+                self._built = False
+            elif not event["is_dir"]:
+                self._dirty.add(rel_path)
+            elif event["type"] == "deleted":
+                self._deleted_dirs.add(rel_path)
+            elif event["type"] == "created":
+                self._dirty.update(created)
+
+    def _read(self, rel_path: str) -> Optional[str]:
+        """A file's text, decoded as the editor would; None for binary or unreadable files"""
+        try:
+            with open(os.path.join(self.file_index.root, rel_path), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        encoding = detect_encoding(data, complete=True)
+        if encoding is None:
+            return None
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            return data.decode('latin-1')
+
+    def _remove(self, rel_path: str):
+        self._unindexed.discard(rel_path)
+        doc_id = self._ids.pop(rel_path, None)
+        if doc_id is not None:
+            del self._paths[doc_id]
+            self._retired += 1
+
+    def _compact(self):
+        """Drop retired ids from the postings once they outnumber the live ones"""
+        if self._retired <= max(len(self._paths), 1000):
+            return
+        live = self._paths.keys()
+        for trigram, postings in list(self._postings.items()):
+            postings.intersection_update(live)
+            if not postings:
+                del self._postings[trigram]
+        self._retired = 0
+
+    def _add(self, rel_path: str):
+        self._remove(rel_path)
+        node = self.file_index.get(rel_path)
+        if node is None or node.is_dir or os.path.splitext(node.name)[1].lower() not in self.extensions:
+            return
+        if node.size > self.max_file_size:
+            self._unindexed.add(rel_path)
+            return
+
+        content = self._read(rel_path)
+        if content is None:
+            return
+        doc_id = self._next_id
+        self._next_id += 1
+        self._ids[rel_path] = doc_id
+        self._paths[doc_id] = rel_path
+        for trigram in _trigrams(content.lower()):
+            self._postings.setdefault(trigram, set()).add(doc_id)
+
+    def _catch_up(self):
+        """Apply the changes noted since the last search; call with the lock held"""
+        with self._notes_lock:
+            built, self._built = self._built, True
+            dirty, self._dirty = self._dirty, set()
+            deleted_dirs, self._deleted_dirs = self._deleted_dirs, set()
+
+        if not built:
+            self._postings.clear()
+            self._ids.clear()
+            self._paths.clear()
+            self._retired = 0
+            self._unindexed.clear()
+            # Changes made during the walk are noted and picked up by the next search
+            for rel_path, _ in self.file_index.walk("", skip_dir=is_ignored_dir):
+                self._add(rel_path)
+            return
+
+        prefixes = tuple(rel_path + "/" for rel_path in deleted_dirs)
+        if prefixes:
+            for rel_path in [p for p in list(self._ids) + list(self._unindexed) if p.startswith(prefixes)]:
+                self._remove(rel_path)
+
+        for rel_path in dirty:
+            self._add(rel_path)
+        self._compact()
+
+    def catch_up(self):
+        """Build or update the index; slow the first time, so run it off the event loop"""
+        with self._lock:
+            self._catch_up()
+
+    def compile(self, query: str, regex: bool = False, case_sensitive: bool = False) -> "re.Pattern":
+        flags = 0 if case_sensitive else re.IGNORECASE
+        try:
+            return re.compile(query if regex else re.escape(query), flags)
+        except re.error as e:
+            raise HTTPException(status_code=400, detail=f"Invalid regular expression: {e}")
+
+    def _candidates(self, query: str, regex: bool) -> Optional[Set[str]]:
+        """Files that may match, or None when the query has no trigram to filter on"""
+        runs = _literal_runs(sre_parse.parse(query)) if regex else ([query] if len(query) >= 3 else [])
+        trigrams = set()
+        for run in runs:
+            trigrams |= _trigrams(run.lower())
+        if not trigrams:
+            return None
+
+        # Intersect the rarest postings first
+        postings = sorted((self._postings.get(trigram, set()) for trigram in trigrams), key=len)
+        doc_ids = set(postings[0])
+        for posting in postings[1:]:
+            if not doc_ids:
+                break
+            doc_ids &= posting
+        # Retired ids have no path
+        return {self._paths[doc_id] for doc_id in doc_ids if doc_id in self._paths} | self._unindexed
+
+    def _matches(self, content: str, pattern: "re.Pattern") -> List[Dict[str, Any]]:
+        matches = []
+        line, line_start = 1, 0
+        for match in pattern.finditer(content):
+            start = match.start()
+            line += content.count("\n", line_start, start)
+            line_start = content.rfind("\n", 0, start) + 1
+            line_end = content.find("\n", start)
+            matches.append({
+                "line": line,
+                "column": start - line_start + 1,
+                "text": content[line_start:line_end if line_end != -1 else len(content)][:200]
+            })
+            if len(matches) >= self.max_matches_per_file:
+                break
+        return matches
+
+    def search(self, query: str, path: str = "", regex: bool = False,
+               case_sensitive: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+        """Line/column hits per file below path, keyed by path relative to the index root"""
+        pattern = self.compile(query, regex, case_sensitive)
+
+        prefix = self.file_index.normalize(path)
+        with self._lock:
+            self._catch_up()
+            candidates = self._candidates(query, regex)
+            if candidates is None:
+                candidates = set(self._ids) | self._unindexed
+
+        results = {}
+        for rel_path in sorted(candidates):
+            if prefix and not rel_path.startswith(prefix + "/"):
+                continue
+            content = self._read(rel_path)
+            if content is None:
+                continue
+            matches = self._matches(content, pattern)
+            if matches:
+                results[rel_path] = matches
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "built": self._built,
+            "files": len(self._ids),
+            "unindexed": len(self._unindexed),
+            "trigrams": len(self._postings),
+            "retired": self._retired,
+            "pending": len(self._dirty)
+        }
@@ -0,0 +1,141 @@
+import os
+import time
+import socket
+import platform
+from typing import Dict, Any, Optional, Tuple
+
+class SystemInfoProvider:
+    """System information read from /proc and statvfs instead of spawning uname/df/free/lscpu"""
+
+    def __init__(self, disk_path: str, ttl: float = 2.0):
+        self.disk_path = disk_path
+        self.ttl = ttl
+
+        self._static: Optional[Dict[str, Any]] = None
+        self._dynamic: Optional[Dict[str, Any]] = None
+        self._dynamic_at = 0.0
+        # Previous (busy, total) jiffies from /proc/stat for CPU utilisation
+        self._cpu_sample: Optional[Tuple[int, int]] = None
+
+    def _read(self, path: str) -> Optional[str]:
+        try:
+            with open(path) as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _cpu_model(self) -> str:
+        cpuinfo = self._read("/proc/cpuinfo")
+        if cpuinfo:
+            for line in cpuinfo.splitlines():
+                key, _, value = line.partition(":")
+                # "model name" on x86, "Model"/"Hardware" on ARM boards
+                if key.strip() in ("model name", "Model", "Hardware") and value.strip():
+                    return value.strip()
+        return platform.processor() or platform.machine()
+
+    def get_static(self) -> Dict[str, Any]:
+        """Fields that cannot change while the server runs, computed once"""
+        if self._static is None:
+            uname = platform.uname()
+            self._static = {
+                "system": uname.system,
+                "release": uname.release,
+                "os_version": uname.version,
+                "hostname": socket.gethostname(),
+                "machine": uname.machine,
+                "architecture": platform.architecture()[0],
+                "processor": uname.processor,
+                "python_version": platform.python_version(),
+                "cpu": {
+                    "model": self._cpu_model(),
+                    "count": os.cpu_count()
+                }
+            }
+        return self._static
+
+    def _memory(self) -> Optional[Dict[str, int]]:
+        meminfo = self._read("/proc/meminfo")
+        if not meminfo:
+            return None
+
+        fields = {}
+        for line in meminfo.splitlines():
+            key, _, value = line.partition(":")
+            parts = value.split()
+            if parts and parts[0].isdigit():
+                fields[key] = int(parts[0]) * 1024  # reported in kB
+
+        total = fields.get("MemTotal", 0)
+        available = fields.get("MemAvailable", fields.get("MemFree", 0))
+        return {
+            "total": total,
+            "available": available,
+            "used": total - available,
+            "percent": round((total - available) / total * 100, 1) if total else 0.0,
+            "swap_total": fields.get("SwapTotal", 0),
+            "swap_free": fields.get("SwapFree", 0)
+        }
+
+    def _disk(self) -> Optional[Dict[str, Any]]:
+        try:
+            stat = os.statvfs(self.disk_path)
+        except (OSError, AttributeError):  # statvfs is POSIX only
+            return None
+
+        total = stat.f_blocks * stat.f_frsize
+        free = stat.f_bavail * stat.f_frsize
+        used = (stat.f_blocks - stat.f_bfree) * stat.f_frsize
+        return {
+            "path": self.disk_path,
+            "total": total,
+            "free": free,
+            "used": used,
+            "percent": round(used / (used + free) * 100, 1) if used + free else 0.0
+        }
+
+    def _cpu_percent(self) -> Optional[float]:
+        """Utilisation across all CPUs since the previous refresh"""
+        stat = self._read("/proc/stat")
+        if not stat:
+            return None
+
+        # cpu user nice system idle iowait irq softirq steal ...
+        values = [int(v) for v in stat.splitlines()[0].split()[1:9]]
+        idle = values[3] + values[4]
+        total = sum(values)
+        busy = total - idle
+
+        previous, self._cpu_sample = self._cpu_sample, (busy, total)
+        if previous is None or total == previous[1]:
+            return None
+        return round((busy - previous[0]) / (total - previous[1]) * 100, 1)
+
+    def _uptime(self) -> Optional[float]:
+        uptime = self._read("/proc/uptime")
+        return float(uptime.split()[0]) if uptime else None
+
+    def get_dynamic(self) -> Dict[str, Any]:
+        """Load, memory and disk usage, refreshed at most once per TTL"""
+        now = time.monotonic()
+        if self._dynamic is None or now - self._dynamic_at >= self.ttl:
+            try:
+                load_average = list(os.getloadavg())
+            except (OSError, AttributeError):
+                load_average = None
+
+            self._dynamic = {
+                "load_average": load_average,
+                "cpu_percent": self._cpu_percent(),
+                "memory": self._memory(),
+                "disk": self._disk(),
+                "uptime": self._uptime(),
+                "updated_at": time.time()
+            }
+            self._dynamic_at = now
+        return self._dynamic
+
+    def get_info(self) -> Dict[str, Any]:
+        info = {**self.get_static(), **self.get_dynamic()}
+        info["cpu"] = {**info["cpu"], "percent": info.pop("cpu_percent")}
+        return info
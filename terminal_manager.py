@@ -2,12 +2,29 @@ import os
 import subprocess
 import asyncio
 import platform
-import shlex
+import re
+import codecs
 import tempfile
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, AsyncIterator
 from fastapi import HTTPException
 import json
+from contextlib import asynccontextmanager
+
+from config import settings
+from output_collector import OutputCollector
+from compile_cache import CompileCache
+from python_worker_pool import PythonWorkerPool
+from execution_scheduler import ExecutionScheduler
+from process_limits import ResourceLimits, spawn_process
+from background_processes import BackgroundProcessManager
+from jobs import Job, JobRegistry
+from command_batch import CommandBatchRunner
+from system_info import SystemInfoProvider
+from package_cache import PackageCache
+from toolchains import Toolchain, ToolchainRegistry
+from command_policy import CommandPolicy
+from metrics import MetricsRegistry, LATENCY_BUCKETS, BYTES_BUCKETS
 
 class TerminalManager:
     def __init__(self, workspace_path: str = "./workspace"):
@@ -28,7 +45,14 @@ class TerminalManager:
             'docker', 'kubectl', 'helm', 'terraform', 'ansible', 'ssh', 'scp', 'rsync',
             'tar', 'zip', 'unzip', 'gzip', 'gunzip', 'ps', 'top', 'htop', 'kill', 'killall',
             'systemctl', 'service', 'netstat', 'ss', 'ping', 'traceroute', 'nslookup', 'dig',
-            'code', 'vim', 'nano', 'emacs', 'less', 'more', 'tree', 'clear', 'history'
+            'code', 'vim', 'nano', 'emacs', 'less', 'more', 'tree', 'clear', 'history',
+            # Shells (their -c scripts are checked too), interpreters and tools used by
+            # templates, installs and dev servers
+            'bash', 'sh', 'ruby', 'php', 'yarn', 'apt', 'brew', 'ng', 'django-admin', 'flutter',
+            # Text utilities common in pipelines; sed and awk are left out since
+            # both can run shell commands the policy cannot see
+            'sort', 'uniq', 'wc', 'cut', 'tr', 'diff', 'printf', 'sleep', 'date',
+            'whoami', 'true', 'false', 'test', '['
         }
         
         # Dangerous commands to block
@@ -37,6 +61,120 @@ class TerminalManager:
             'mount', 'umount', 'fdisk', 'mkfs', 'fsck', 'dd', 'reboot', 'shutdown', 'halt',
             'iptables', 'ufw', 'firewall-cmd', 'crontab', 'at', 'batch', 'systemctl'
         }
+        
+        # Checked against every command in a pipeline; decisions are cached
+        self.command_policy = CommandPolicy(
+            allowed=self.allowed_commands,
+            blocked=self.blocked_commands,
+            dangerous_patterns=['rm -rf /', 'rm -rf *', '>(', '<(', '|&', '&>', '&&', '||'],
+            windows=self.system == "Windows"
+        )
+        
+        # Execution limits
+        self.execution_timeout = settings.MAX_EXECUTION_TIME
+        self.resource_limits = ResourceLimits(
+            cpu_time=settings.MAX_EXECUTION_CPU_TIME,
+            memory=settings.MAX_EXECUTION_MEMORY,
+            file_size=settings.MAX_EXECUTION_FILE_SIZE,
+            processes=settings.MAX_EXECUTION_PROCESSES
+        )
+        self.cgroup_root = settings.EXECUTION_CGROUP_ROOT or None
+        
+        # Long-running processes such as dev servers
+        self.background_processes = BackgroundProcessManager(self)
+        self.max_output_size = settings.MAX_OUTPUT_SIZE
+        self.output_spill_dir = settings.OUTPUT_SPILL_DIR or None
+        self.output_spill_max_age = settings.OUTPUT_SPILL_MAX_AGE
+        
+        # Admission control for everything that spawns a process
+        self.scheduler = ExecutionScheduler(
+            max_concurrent=settings.MAX_CONCURRENT_EXECUTIONS,
+            max_per_user=settings.MAX_CONCURRENT_EXECUTIONS_PER_USER,
+            max_queue_depth=settings.MAX_EXECUTION_QUEUE_DEPTH
+        )
+        
+        # Every execution is a job that can be listed and cancelled; cancelling
+        # sends SIGINT, then SIGTERM, then SIGKILL after each grace period
+        self.jobs = JobRegistry(grace_periods=[2.0, 3.0])
+        
+        # Execution telemetry, labelled by language, command head and user
+        self.metrics = MetricsRegistry()
+        self.metrics.histogram("execution_queue_wait_seconds", "Time spent waiting for an execution slot", ("user",), LATENCY_BUCKETS)
+        self.metrics.histogram("execution_spawn_seconds", "Time to start the process", ("language", "command"), LATENCY_BUCKETS)
+        self.metrics.histogram("execution_run_seconds", "Time from start to exit", ("language", "command", "user"), LATENCY_BUCKETS)
+        self.metrics.histogram("execution_output_bytes", "stdout plus stderr bytes produced", ("language", "command"), BYTES_BUCKETS)
+        self.metrics.counter("executions_total", "Finished executions by exit code", ("language", "command", "user", "exit_code"))
+        
+        # Dependency-ordered command batches built on top of jobs
+        self.batches = CommandBatchRunner(self)
+        
+        # Host information for dashboards, read from /proc rather than shelling out
+        self.system_info = SystemInfoProvider(self.default_cwd)
+        
+        # Streaming settings: pipe read size and how many frames may be
+        # queued for a slow client before the pipe readers stop reading
+        self.stream_chunk_size = 4096
+        self.stream_queue_size = 64
+        
+        # Compiled languages: compile once into the artifact cache, then run
+        # the cached program. Flags are part of the cache key.
+        self.compiled_languages = {
+            'c': {
+                'flags': [],
+                'compile': '"{executable}" {flags} -o "{output}" "{source}"',
+                'run': '"{output}"'
+            },
+            'cpp': {
+                'flags': [],
+                'compile': '"{executable}" {flags} -o "{output}" "{source}"',
+                'run': '"{output}"'
+            },
+            'rust': {
+                'flags': [],
+                'compile': '"{executable}" {flags} "{source}" -o "{output}"',
+                'run': '"{output}"'
+            },
+            'java': {
+                'flags': [],
+                'compile': '"{executable}" {flags} -d "{build_dir}" "{source}"',
+                'run': '"{java}" -cp "{build_dir}" {main_class}'
+            }
+        }
+        self.compile_cache = CompileCache(settings.COMPILE_CACHE_DIR, settings.COMPILE_CACHE_MAX_SIZE)
+        
+        # Package downloads shared by every command; identical installs run once
+        self.package_cache = PackageCache(settings.PACKAGE_CACHE_DIR, settings.PACKAGE_CACHE_MAX_SIZE)
+        
+        # Interpreted languages: how to run a script file
+        self.script_languages = {
+            'python': '"{executable}" "{path}"',
+            # node resolves the main script's symlink, which leads nowhere for a memfd
+            'javascript': '"{executable}" --preserve-symlinks-main "{path}"',
+            'typescript': '"{executable}" "{path}"',
+            'go': '"{executable}" run "{path}"',
+            'php': '"{executable}" "{path}"',
+            'ruby': '"{executable}" "{path}"',
+            'shell': '"{executable}" "{path}"',
+            'bash': '"{executable}" "{path}"',
+            'powershell': '"{executable}" -File "{path}"'
+        }
+        
+        # Interpreters that can run a snippet straight from an anonymous
+        # in-memory file (memfd), so nothing is written to the workspace
+        self.memfd_languages = {'python', 'javascript', 'ruby', 'php', 'shell', 'bash'}
+        
+        # Installed interpreters and compilers; {executable} in the templates
+        # above is the path found here
+        self.toolchains = ToolchainRegistry()
+        
+        # Warm interpreters for Python snippets (fork-based, so not on Windows)
+        self.python_workers = None
+        if self.system != "Windows" and settings.PYTHON_WORKER_POOL_SIZE > 0:
+            self.python_workers = PythonWorkerPool(
+                size=settings.PYTHON_WORKER_POOL_SIZE,
+                max_runs=settings.PYTHON_WORKER_MAX_RUNS,
+                max_rss=settings.PYTHON_WORKER_MAX_RSS
+            )
     
     def _get_default_shell(self) -> str:
         """Get default shell based on OS"""
@@ -45,45 +183,15 @@ class TerminalManager:
         else:
             return os.environ.get("SHELL", "/bin/bash")
     
-    def _is_safe_command(self, command: str) -> bool:
+    def _is_safe_command(self, command: str, trusted: bool = False) -> bool:
         """Check if command is safe to execute"""
-        if not command.strip():
-            return False
-        
-        # Parse the command
-        try:
-            if self.system == "Windows":
-                cmd_parts = command.split()
-            else:
-                cmd_parts = shlex.split(command)
-        except ValueError:
-            return False
-        
-        if not cmd_parts:
-            return False
-        
-        base_command = cmd_parts[0].lower()
-        
-        # Remove path if present
-        if '/' in base_command or '\\' in base_command:
-            base_command = os.path.basename(base_command)
-        
-        # Remove extension
-        if '.' in base_command:
-            base_command = base_command.split('.')[0]
-        
-        # Check blocked commands
-        if base_command in self.blocked_commands:
-            return False
-        
-        # Check for dangerous patterns
-        dangerous_patterns = ['rm -rf /', 'rm -rf *', '>(', '<(', '|&', '&>', '&&', '||']
-        command_lower = command.lower()
-        for pattern in dangerous_patterns:
-            if pattern in command_lower:
-                return False
-        
-        return True
+        return self.command_policy.check(command, trusted) is None
+    
+    def _check_command(self, command: str, trusted: bool = False):
+        """Raise if the command may not run, saying why"""
+        reason = self.command_policy.check(command, trusted)
+        if reason:
+            raise HTTPException(status_code=400, detail=f"Command not allowed for security reasons: {reason}")
     
     def _sanitize_path(self, path: str) -> str:
         """Sanitize and validate path"""
@@ -107,12 +215,100 @@ class TerminalManager:
         except Exception:
             return self.default_cwd
     
-    async def execute_command(self, command: str, working_directory: str = None) -> Dict[str, Any]:
-        """Execute a terminal command"""
+    @asynccontextmanager
+    async def _job(self, user_id: Optional[int], command: str, job_id: str = None, language: str = None):
+        """Register a job and hold a scheduler slot for it; cancelling while queued gives up the place"""
+        job = self.jobs.create(user_id, command, job_id)
+        job.language = language
+        queued_at = asyncio.get_event_loop().time()
+        job.waiter = asyncio.ensure_future(self.scheduler.acquire(user_id))
+        try:
+            # asyncio.wait so that cancelling the job's waiter does not cancel us
+            await asyncio.wait([job.waiter])
+        except asyncio.CancelledError:
+            if not job.waiter.done():
+                job.waiter.cancel()
+            elif not job.waiter.cancelled() and job.waiter.exception() is None:
+                # The slot was granted just before we were cancelled; cancel() above would be a no-op
+                self.scheduler.release(user_id)
+            job.finish("cancelled")
+            raise
+        
+        if not job.waiter.cancelled() and job.waiter.exception():
+            # Queue full
+            job.finish("failed")
+            raise job.waiter.exception()
+        holding_slot = not job.waiter.cancelled()
+        if holding_slot:
+            self.metrics.observe(
+                "execution_queue_wait_seconds",
+                asyncio.get_event_loop().time() - queued_at,
+                user=user_id if user_id is not None else "anonymous"
+            )
+
+        try:
+            yield job
+        except HTTPException as e:
+            job.finish("timeout" if e.status_code == 408 else "failed")
+            raise
+        except BaseException:
+            # Task cancelled or stream consumer went away
+            job.finish("cancelled")
+            raise
+        else:
+            job.finish("cancelled" if job.cancel_requested else "finished")
+        finally:
+            if holding_slot:
+                self.scheduler.release(user_id)
+    
+    def _cancelled_result(self, command: str, job: Job) -> Dict[str, Any]:
+        """Result for a job cancelled before its process started"""
+        return {
+            "command": command,
+            "stdout": "",
+            "stderr": "",
+            "exit_code": None,
+            "execution_time": 0,
+            "job_id": job.job_id,
+            "cancelled": True
+        }
+    
+    def _record_execution(self, job: Optional[Job], command: str, spawn_time: Optional[float], run_time: float,
+                          output_bytes: int, exit_code: Any):
+        """Record one finished run in the metrics registry"""
+        labels = {
+            "language": job.language if job and job.language else "shell",
+            "command": self.command_policy.normalize_name(command.split(None, 1)[0].strip('"\'')) if command.strip() else ""
+        }
+        user = job.user_id if job and job.user_id is not None else "anonymous"
+        
+        if spawn_time is not None:
+            self.metrics.observe("execution_spawn_seconds", spawn_time, **labels)
+        self.metrics.observe("execution_run_seconds", run_time, user=user, **labels)
+        self.metrics.observe("execution_output_bytes", output_bytes, **labels)
+        self.metrics.inc("executions_total", user=user, exit_code=exit_code, **labels)
+    
+    def _signaller(self, process):
+        """Get a function that delivers a signal to everything the process started"""
+        if self.system == "Windows":
+            return lambda sig: process.terminate() if process.returncode is None else None
+        return process.send_signal
+    
+    async def execute_command(self, command: str, working_directory: str = None, user_id: int = None,
+                              job_id: str = None, env: Dict[str, str] = None) -> Dict[str, Any]:
+        """Execute a terminal command as a cancellable job"""
+        async with self._job(user_id, command, job_id) as job:
+            return await self._execute_command(command, working_directory, job, env)
+    
+    async def _execute_command(self, command: str, working_directory: str = None, job: Job = None,
+                               env: Dict[str, str] = None, pass_fds: tuple = (), trusted: bool = False) -> Dict[str, Any]:
+        """Execute a terminal command without going through the scheduler.
+        
+        trusted marks commands the server built itself, which skip the allow-list.
+        """
         try:
             # Validate command
-            if not self._is_safe_command(command):
-                raise HTTPException(status_code=400, detail="Command not allowed for security reasons")
+            self._check_command(command, trusted)
             
             # Set working directory
             cwd = self._sanitize_path(working_directory)
@@ -127,43 +323,73 @@ class TerminalManager:
                     "execution_time": 0
                 }
             
-            # Prepare command for execution
-            if self.system == "Windows":
-                cmd_args = ["cmd", "/c", command]
-            else:
-                cmd_args = [self.shell, "-c", command]
+            if job and job.cancel_requested:
+                return self._cancelled_result(command, job)
             
             # Execute command
             start_time = asyncio.get_event_loop().time()
             
-            process = await asyncio.create_subprocess_exec(
-                *cmd_args,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                cwd=cwd,
-                env=dict(os.environ, PWD=cwd)
-            )
+            process = await self._spawn(command, cwd, env, pass_fds)
+            spawned_time = asyncio.get_event_loop().time()
+            
+            # Collect output within MAX_OUTPUT_SIZE per stream
+            stdout = OutputCollector(self.max_output_size, self.output_spill_dir, self.output_spill_max_age)
+            stderr = OutputCollector(self.max_output_size, self.output_spill_dir, self.output_spill_max_age)
+            if job:
+                job.start(self._signaller(process), stdout, stderr)
             
+            completed = False
             try:
-                stdout, stderr = await asyncio.wait_for(
-                    process.communicate(),
-                    timeout=300  # 5 minutes timeout
+                await asyncio.wait_for(
+                    asyncio.gather(
+                        self._collect_output(process.stdout, stdout),
+                        self._collect_output(process.stderr, stderr),
+                        process.wait()
+                    ),
+                    timeout=self.execution_timeout
                 )
+                completed = True
             except asyncio.TimeoutError:
                 process.kill()
                 await process.wait()
+                self._record_execution(
+                    job, command, spawned_time - start_time, asyncio.get_event_loop().time() - spawned_time,
+                    stdout.total_size + stderr.total_size, "timeout"
+                )
                 raise HTTPException(status_code=408, detail="Command execution timeout")
+            except asyncio.CancelledError:
+                # Nobody is waiting for the result any more
+                process.kill()
+                raise
+            finally:
+                # Only a result reports the spill files; otherwise nobody could find them
+                stdout.close(keep_spill=completed)
+                stderr.close(keep_spill=completed)
             
             end_time = asyncio.get_event_loop().time()
             execution_time = int((end_time - start_time) * 1000)  # milliseconds
+            if job:
+                job.exit_code = process.returncode
+            self._record_execution(
+                job, command, spawned_time - start_time, end_time - spawned_time,
+                stdout.total_size + stderr.total_size, process.returncode
+            )
             
             return {
                 "command": command,
-                "stdout": stdout.decode('utf-8', errors='replace'),
-                "stderr": stderr.decode('utf-8', errors='replace'),
+                "stdout": stdout.get_text(),
+                "stderr": stderr.get_text(),
                 "exit_code": process.returncode,
                 "execution_time": execution_time,
-                "working_directory": cwd
+                "working_directory": cwd,
+                "resource_usage": getattr(process, "resource_usage", {}),
+                "truncated": stdout.truncated or stderr.truncated,
+                "output_info": {
+                    "stdout": stdout.get_info(),
+                    "stderr": stderr.get_info()
+                },
+                "job_id": job.job_id if job else None,
+                "cancelled": job.cancel_requested if job else False
             }
             
         except HTTPException:
@@ -171,9 +397,180 @@ class TerminalManager:
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Command execution failed: {str(e)}")
     
-    async def execute_code(self, code: str, language: str, filename: str = None) -> Dict[str, Any]:
-        """Execute code in specified language"""
+    async def stream_command(self, command: str, working_directory: str = None, user_id: int = None,
+                             job_id: str = None) -> AsyncIterator[Dict[str, Any]]:
+        """Execute a terminal command as a cancellable job, yielding stdout/stderr frames as they arrive"""
+        async with self._job(user_id, command, job_id) as job:
+            frames = self._stream_command(command, working_directory, job)
+            try:
+                async for frame in frames:
+                    yield frame
+            finally:
+                # Kill the process now rather than whenever the generator is collected
+                await frames.aclose()
+    
+    async def _stream_command(self, command: str, working_directory: str = None, job: Job = None) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a command's output without going through the scheduler"""
+        self._check_command(command)
+        
+        cwd = self._sanitize_path(working_directory)
+        
+        if command.strip().lower() == 'pwd':
+            yield {"type": "stdout", "data": cwd}
+            yield {"type": "exit", "exit_code": 0, "execution_time": 0, "working_directory": cwd}
+            return
+        
+        if job and job.cancel_requested:
+            yield {"type": "exit", "exit_code": None, "execution_time": 0, "working_directory": cwd, "cancelled": True}
+            return
+        
+        start_time = asyncio.get_event_loop().time()
+        deadline = start_time + self.execution_timeout
+        
+        process = await self._spawn(command, cwd)
+        spawned_time = asyncio.get_event_loop().time()
+        
+        # Keep a bounded copy of the output so the job can be inspected mid-run
+        collectors = {
+            "stdout": OutputCollector(self.max_output_size),
+            "stderr": OutputCollector(self.max_output_size)
+        }
+        if job:
+            job.start(self._signaller(process), collectors["stdout"], collectors["stderr"])
+        
+        # Bounded queue: when the consumer is slow the readers block on put(),
+        # the pipes fill up and the child blocks instead of the server buffering
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.stream_queue_size)
+        
+        async def pump(stream: asyncio.StreamReader, stream_name: str):
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            try:
+                while True:
+                    chunk = await stream.read(self.stream_chunk_size)
+                    if not chunk:
+                        break
+                    collectors[stream_name].feed(chunk)
+                    text = decoder.decode(chunk)
+                    if text:
+                        await queue.put({"type": stream_name, "data": text})
+                text = decoder.decode(b'', final=True)
+                if text:
+                    await queue.put({"type": stream_name, "data": text})
+            finally:
+                await queue.put(None)
+        
+        readers = [
+            asyncio.create_task(pump(process.stdout, "stdout")),
+            asyncio.create_task(pump(process.stderr, "stderr"))
+        ]
+        
+        try:
+            open_streams = len(readers)
+            while open_streams:
+                remaining = deadline - asyncio.get_event_loop().time()
+                try:
+                    frame = await asyncio.wait_for(queue.get(), timeout=max(remaining, 0))
+                except asyncio.TimeoutError:
+                    process.kill()
+                    yield {"type": "error", "detail": "Command execution timeout"}
+                    break
+                
+                if frame is None:
+                    open_streams -= 1
+                    continue
+                yield frame
+            
+            await process.wait()
+            end_time = asyncio.get_event_loop().time()
+            if job:
+                job.exit_code = process.returncode
+            self._record_execution(
+                job, command, spawned_time - start_time, end_time - spawned_time,
+                collectors["stdout"].total_size + collectors["stderr"].total_size, process.returncode
+            )
+            
+            yield {
+                "type": "exit",
+                "exit_code": process.returncode,
+                "execution_time": int((end_time - start_time) * 1000),
+                "working_directory": cwd,
+                "resource_usage": getattr(process, "resource_usage", {}),
+                "cancelled": job.cancel_requested if job else False
+            }
+        finally:
+            # Runs on completion, timeout and when the consumer goes away
+            for collector in collectors.values():
+                collector.close()
+            for reader in readers:
+                reader.cancel()
+            if process.returncode is None:
+                try:
+                    process.kill()
+                except ProcessLookupError:
+                    pass
+                await process.wait()
+    
+    async def _collect_output(self, stream: asyncio.StreamReader, collector: OutputCollector):
+        """Read a pipe to EOF into a bounded collector"""
+        while True:
+            chunk = await stream.read(self.stream_chunk_size)
+            if not chunk:
+                break
+            collector.feed(chunk)
+    
+    def process_env(self, cwd: str, extra_env: Dict[str, str] = None) -> Dict[str, str]:
+        """Environment for anything spawned for a user: commands, dev servers and terminal sessions"""
+        env = dict(os.environ)
+        env.update(self.package_cache.env())
+        env.update(extra_env or {})
+        env["PWD"] = cwd
+        return env
+    
+    async def _spawn(self, command: str, cwd: str, extra_env: Dict[str, str] = None, pass_fds: tuple = ()):
+        """Start a shell running the command with piped output and resource limits"""
+        env = self.process_env(cwd, extra_env)
+        
+        if self.system == "Windows":
+            return await asyncio.create_subprocess_exec(
+                "cmd", "/c", command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=cwd,
+                env=env
+            )
+        
+        return await spawn_process(
+            [self.shell, "-c", command],
+            cwd=cwd,
+            env=env,
+            limits=self.resource_limits,
+            cgroup_root=self.cgroup_root,
+            # Own process group, so cancellation and timeouts reach every child
+            new_session=True,
+            pass_fds=pass_fds
+        )
+    
+    async def execute_code(self, code: str, language: str, filename: str = None, user_id: int = None,
+                           job_id: str = None) -> Dict[str, Any]:
+        """Execute code in specified language as a cancellable job"""
+        # Unknown languages and missing toolchains never get as far as the queue
+        toolchain = await self.toolchains.require(language)
+        async with self._job(user_id, f"<{language} snippet>", job_id, language.lower()) as job:
+            return await self._execute_code(code, language, toolchain, user_id, job)
+    
+    async def _execute_code(self, code: str, language: str, toolchain: Toolchain, user_id: int = None,
+                            job: Job = None) -> Dict[str, Any]:
+        """Execute code without going through the scheduler"""
         try:
+            if language.lower() in self.compiled_languages:
+                return await self._execute_compiled(code, language.lower(), toolchain, user_id, job)
+            
+            if language.lower() == 'python' and self.python_workers:
+                return await self._execute_python_snippet(code, job)
+            
+            if language.lower() in self.memfd_languages and hasattr(os, "memfd_create"):
+                return await self._execute_from_memory(code, language.lower(), toolchain, job)
+            
             # Create temporary file
             with tempfile.NamedTemporaryFile(
                 mode='w',
@@ -186,13 +583,10 @@ class TerminalManager:
             
             try:
                 # Get execution command
-                command = self._get_execution_command(language, temp_file_path)
-                
-                if not command:
-                    raise HTTPException(status_code=400, detail=f"Language '{language}' not supported")
+                command = self._get_execution_command(language, temp_file_path, toolchain)
                 
                 # Execute the code
-                result = await self.execute_command(command, self.default_cwd)
+                result = await self._execute_command(command, self.default_cwd, job, trusted=True)
                 
                 # Add language info to result
                 result["language"] = language
@@ -213,6 +607,143 @@ class TerminalManager:
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Code execution failed: {str(e)}")
     
+    async def _execute_python_snippet(self, code: str, job: Job = None) -> Dict[str, Any]:
+        """Run Python code on a warm worker instead of spawning an interpreter"""
+        if job and job.cancel_requested:
+            return self._cancelled_result("python3 <snippet>", job)
+        
+        response = await self.python_workers.run(
+            code,
+            self.default_cwd,
+            self.execution_timeout,
+            self.max_output_size,
+            self.resource_limits,
+            on_start=job.start if job else None
+        )
+        
+        self._record_execution(
+            job, "python3", None, response["execution_time"] / 1000,
+            response["output_info"]["stdout"]["total_bytes"] + response["output_info"]["stderr"]["total_bytes"],
+            "timeout" if response["timed_out"] else response["exit_code"]
+        )
+        if response["timed_out"]:
+            raise HTTPException(status_code=408, detail="Command execution timeout")
+        if job:
+            job.exit_code = response["exit_code"]
+        
+        return {
+            "command": "python3 <snippet>",
+            "stdout": response["stdout"],
+            "stderr": response["stderr"],
+            "exit_code": response["exit_code"],
+            "execution_time": response["execution_time"],
+            "working_directory": self.default_cwd,
+            "resource_usage": response["resource_usage"],
+            "truncated": response["truncated"],
+            "output_info": response["output_info"],
+            "language": "python",
+            "code": code,
+            "job_id": job.job_id if job else None,
+            "cancelled": job.cancel_requested if job else False
+        }
+    
+    async def _execute_from_memory(self, code: str, language: str, toolchain: Toolchain, job: Job = None) -> Dict[str, Any]:
+        """Run an interpreted snippet from a memfd instead of a temp file in the workspace"""
+        fd = os.memfd_create(f"snippet{self._get_file_extension(language)}")
+        try:
+            data = code.encode('utf-8')
+            while data:
+                data = data[os.write(fd, data):]
+            
+            command = self._get_execution_command(language, f"/dev/fd/{fd}", toolchain)
+            env = None
+            if language == 'python':
+                # A script file in the workspace would have put it on sys.path
+                env = {"PYTHONPATH": os.pathsep.join(filter(None, [self.default_cwd, os.environ.get("PYTHONPATH")]))}
+            
+            result = await self._execute_command(command, self.default_cwd, job, env, pass_fds=(fd,), trusted=True)
+        finally:
+            os.close(fd)
+        
+        result["language"] = language
+        result["code"] = code
+        return result
+    
+    async def shutdown(self):
+        """Stop background workers and processes"""
+        await self.background_processes.shutdown()
+        if self.python_workers:
+            await self.python_workers.shutdown()
+    
+    async def _execute_compiled(self, code: str, language: str, toolchain: Toolchain, user_id: Optional[int],
+                                job: Job = None) -> Dict[str, Any]:
+        """Compile through the artifact cache and run the resulting program"""
+        spec = self.compiled_languages[language]
+        cache_key = self.compile_cache.make_key(language, code, toolchain.version, spec['flags'])
+        
+        # javac names class files after the public class, so the source must match it
+        main_class = self._get_java_main_class(code) if language == 'java' else None
+        source_name = f"{main_class}.java" if main_class else f"main{self._get_file_extension(language)}"
+        output_name = "program.exe" if self.system == "Windows" else "program"
+        
+        artifact_dir = self.compile_cache.get(user_id, cache_key)
+        compile_cached = artifact_dir is not None
+        compile_time = 0
+        
+        if not compile_cached:
+            build_dir = self.compile_cache.create_build_dir(user_id)
+            source_path = os.path.join(build_dir, source_name)
+            with open(source_path, 'w', encoding='utf-8') as f:
+                f.write(code)
+            
+            compile_command = spec['compile'].format(
+                executable=toolchain.path,
+                flags=" ".join(spec['flags']),
+                source=source_path,
+                output=os.path.join(build_dir, output_name),
+                build_dir=build_dir
+            )
+            
+            try:
+                compile_result = await self._execute_command(compile_command, self.default_cwd, job, trusted=True)
+            except Exception:
+                self.compile_cache.discard(build_dir)
+                raise
+            
+            compile_time = compile_result["execution_time"]
+            if compile_result["exit_code"] != 0:
+                self.compile_cache.discard(build_dir)
+                compile_result.update({
+                    "language": language,
+                    "code": code,
+                    "stage": "compile",
+                    "compile_cached": False
+                })
+                return compile_result
+            
+            artifact_dir = self.compile_cache.store(user_id, cache_key, build_dir)
+        
+        run_command = spec['run'].format(
+            output=os.path.join(artifact_dir, output_name),
+            build_dir=artifact_dir,
+            main_class=main_class,
+            **toolchain.paths
+        )
+        result = await self._execute_command(run_command, self.default_cwd, job, trusted=True)
+        result.update({
+            "language": language,
+            "code": code,
+            "stage": "run",
+            "compile_cached": compile_cached,
+            "compile_time": compile_time
+        })
+        return result
+    
+    def _get_java_main_class(self, code: str) -> str:
+        """Get the public class name from Java source"""
+        match = re.search(r'public\s+(?:final\s+|abstract\s+)*class\s+(\w+)', code)
+        return match.group(1) if match else "Main"
+    
     def _get_file_extension(self, language: str) -> str:
         """Get file extension for language"""
         extensions = {
@@ -236,73 +767,42 @@ class TerminalManager:
         }
         return extensions.get(language.lower(), '.txt')
     
-    def _get_execution_command(self, language: str, file_path: str) -> Optional[str]:
+    def _get_execution_command(self, language: str, file_path: str, toolchain: Toolchain) -> str:
         """Get command to execute code file"""
-        lang = language.lower()
-        
-        commands = {
-            'python': f'python3 "{file_path}"',
-            'javascript': f'node "{file_path}"',
-            'typescript': f'npx ts-node "{file_path}"',
-            'java': f'javac "{file_path}" && java {os.path.splitext(os.path.basename(file_path))[0]}',
-            'c': f'gcc -o /tmp/c_output "{file_path}" && /tmp/c_output',
-            'cpp': f'g++ -o /tmp/cpp_output "{file_path}" && /tmp/cpp_output',
-            'go': f'go run "{file_path}"',
-            'rust': f'rustc "{file_path}" -o /tmp/rust_output && /tmp/rust_output',
-            'php': f'php "{file_path}"',
-            'ruby': f'ruby "{file_path}"',
-            'shell': f'bash "{file_path}"',
-            'bash': f'bash "{file_path}"',
-            'powershell': f'powershell -File "{file_path}"' if self.system == "Windows" else None
-        }
-        
-        # Adjust for Windows
-        if self.system == "Windows":
-            commands.update({
-                'python': f'python "{file_path}"',
-                'c': f'gcc -o temp_c_output.exe "{file_path}" && temp_c_output.exe',
-                'cpp': f'g++ -o temp_cpp_output.exe "{file_path}" && temp_cpp_output.exe',
-            })
-        
-        return commands.get(lang)
+        return self.script_languages[language.lower()].format(executable=toolchain.path, path=file_path)
+    
+    def get_languages(self) -> List[Dict[str, Any]]:
+        """Get every known language's toolchain and how snippets in it are run"""
+        return [
+            {
+                **toolchain,
+                "compiled": toolchain["language"] in self.compiled_languages,
+                "in_memory": toolchain["language"] in self.memfd_languages and hasattr(os, "memfd_create"),
+                "warm_pool": toolchain["language"] == "python" and self.python_workers is not None
+            }
+            for toolchain in self.toolchains.list_toolchains()
+        ]
     
     async def get_system_info(self) -> Dict[str, Any]:
         """Get system information"""
         try:
-            # Get basic system info
-            info = {
-                "system": platform.system(),
-                "machine": platform.machine(),
-                "architecture": platform.architecture()[0],
-                "processor": platform.processor(),
-                "python_version": platform.python_version(),
-                "shell": self.shell,
-                "workspace": self.default_cwd
-            }
-            
-            # Get additional info via commands
-            commands = {
-                "os_version": "uname -a" if self.system != "Windows" else "ver",
-                "disk_space": "df -h ." if self.system != "Windows" else "dir",
-                "memory": "free -h" if self.system == "Linux" else None,
-                "cpu_info": "lscpu" if self.system == "Linux" else None
-            }
-            
-            for key, cmd in commands.items():
-                if cmd:
-                    try:
-                        result = await self.execute_command(cmd)
-                        if result["exit_code"] == 0:
-                            info[key] = result["stdout"].strip()
-                    except:
-                        info[key] = "Not available"
-            
+            info = self.system_info.get_info()
+            info["shell"] = self.shell
+            info["workspace"] = self.default_cwd
             return info
             
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to get system info: {str(e)}")
     
-    async def install_package(self, package_manager: str, package_name: str) -> Dict[str, Any]:
+    async def run_install(self, command: str, working_directory: str = None, user_id: int = None) -> Dict[str, Any]:
+        """Run a package install through the shared cache; concurrent identical installs share one run"""
+        cwd = self._sanitize_path(working_directory)
+        return await self.package_cache.run(
+            (command, cwd),
+            lambda: self.execute_command(command, cwd, user_id=user_id)
+        )
+    
+    async def install_package(self, package_manager: str, package_name: str, user_id: int = None) -> Dict[str, Any]:
         """Install package using specified package manager"""
         try:
             # Validate package manager
@@ -330,7 +830,7 @@ class TerminalManager:
             
             command = f"{install_cmd} {package_name}"
             
-            result = await self.execute_command(command)
+            result = await self.run_install(command, user_id=user_id)
             result["package_manager"] = package_manager
             result["package_name"] = package_name
             
@@ -341,8 +841,9 @@ class TerminalManager:
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Package installation failed: {str(e)}")
     
-    async def run_server(self, command: str, port: int = None) -> Dict[str, Any]:
-        """Run a development server"""
+    async def run_server(self, command: str, port: int = None, user_id: int = None,
+                         working_directory: str = None) -> Dict[str, Any]:
+        """Run a development server in the background"""
         try:
             # Common server commands
             server_commands = {
@@ -361,14 +862,22 @@ class TerminalManager:
             else:
                 full_command = command
             
-            # Note: This would typically start a long-running process
-            # For now, we'll just validate and return the command
+            process = await self.background_processes.start(
+                user_id,
+                full_command,
+                port=port,
+                working_directory=working_directory,
+                name=command
+            )
+            
             return {
-                "message": f"Server command prepared: {full_command}",
+                "message": f"Server started: {full_command}",
                 "command": full_command,
                 "port": port,
-                "note": "Use WebSocket connection for long-running processes"
+                "process": process
             }
             
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Server startup failed: {str(e)}")
@@ -0,0 +1,371 @@
+import os
+import time
+import uuid
+import signal
+import struct
+import asyncio
+import codecs
+import platform
+from collections import deque
+from typing import Dict, Any, List, Optional
+from fastapi import HTTPException
+
+from config import settings
+from process_limits import CgroupSandbox
+
+if platform.system() != "Windows":
+    import fcntl
+    import termios
+
+def _acquire_controlling_tty():
+    """Make the PTY slave (already on stdin) the controlling terminal of the new session"""
+    fcntl.ioctl(0, termios.TIOCSCTTY, 0)
+
+class TerminalSession:
+    def __init__(self, session_id: str, user_id: int, project: Optional[str], cwd: str,
+                 process: asyncio.subprocess.Process, master_fd: int, rows: int, cols: int,
+                 scrollback_size: int, cgroup: Optional[CgroupSandbox] = None):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.project = project
+        self.cwd = cwd
+        self.process = process
+        self.master_fd = master_fd
+        self.cgroup = cgroup
+        self.rows = rows
+        self.cols = cols
+        self.created_at = time.time()
+        self.last_activity = self.created_at
+        self.closed = False
+
+        # Output goes to the attached client's queue; recent output is also kept
+        # in a bounded scrollback so a reattaching client can be brought up to date
+        self.output_queue: Optional[asyncio.Queue] = None
+        self.scrollback_size = scrollback_size
+        self._scrollback = deque()
+        self._scrollback_bytes = 0
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._reading = False
+        self._loop = asyncio.get_event_loop()
+
+    @property
+    def attached(self) -> bool:
+        return self.output_queue is not None
+
+    @property
+    def alive(self) -> bool:
+        return not self.closed and self.process.returncode is None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "project": self.project,
+            "working_directory": self.cwd,
+            "pid": self.process.pid,
+            "rows": self.rows,
+            "cols": self.cols,
+            "attached": self.attached,
+            "alive": self.alive,
+            "created_at": self.created_at,
+            "last_activity": self.last_activity
+        }
+
+    def start_reading(self):
+        if not self._reading and not self.closed:
+            self._loop.add_reader(self.master_fd, self._on_readable)
+            self._reading = True
+
+    def _stop_reading(self):
+        if self._reading:
+            self._loop.remove_reader(self.master_fd)
+            self._reading = False
+
+    def _on_readable(self):
+        try:
+            data = os.read(self.master_fd, 4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            # EIO once the shell has exited and the slave side is closed
+            data = b''
+
+        if not data:
+            self._stop_reading()
+            self.closed = True
+            self._push(None)
+            return
+
+        text = self._decoder.decode(data)
+        if text:
+            self.last_activity = time.time()
+            self._append_scrollback(text)
+            self._push(text)
+
+    def _append_scrollback(self, text: str):
+        self._scrollback.append(text)
+        self._scrollback_bytes += len(text)
+        while self._scrollback_bytes > self.scrollback_size and len(self._scrollback) > 1:
+            self._scrollback_bytes -= len(self._scrollback.popleft())
+
+    def _push(self, item: Optional[str]):
+        queue = self.output_queue
+        if queue is None:
+            return
+        queue.put_nowait(item)
+        # Backpressure: stop draining the PTY until the client catches up
+        if queue.full():
+            self._stop_reading()
+
+    def attach(self) -> str:
+        """Attach a client, replacing any previous one, and return the scrollback"""
+        if not self.alive:
+            raise HTTPException(status_code=410, detail="Terminal session has exited")
+
+        self.detach()
+        self.output_queue = asyncio.Queue(maxsize=256)
+        self.last_activity = time.time()
+        self.start_reading()
+        return "".join(self._scrollback)
+
+    def detach(self):
+        """Detach the current client; the shell keeps running"""
+        queue = self.output_queue
+        self.output_queue = None
+        if queue is not None:
+            # Wake up the old consumer so it stops forwarding
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(None)
+        self.last_activity = time.time()
+        if not self.closed:
+            self.start_reading()
+
+    async def read(self, queue: asyncio.Queue) -> Optional[str]:
+        """Wait for the next output chunk for an attached client, None when detached or exited"""
+        item = await queue.get()
+        if queue is self.output_queue and not self.closed:
+            self.start_reading()
+        return item
+
+    async def write(self, data: str):
+        """Send keyboard input to the shell"""
+        if not self.alive:
+            raise HTTPException(status_code=410, detail="Terminal session has exited")
+
+        payload = data.encode('utf-8')
+        while payload:
+            try:
+                written = os.write(self.master_fd, payload)
+                payload = payload[written:]
+            except BlockingIOError:
+                await asyncio.sleep(0.01)
+        self.last_activity = time.time()
+
+    def resize(self, rows: int, cols: int):
+        """Resize the PTY; the kernel delivers SIGWINCH to the foreground job"""
+        if rows <= 0 or cols <= 0:
+            raise HTTPException(status_code=400, detail="Invalid terminal size")
+
+        fcntl.ioctl(self.master_fd, termios.TIOCSWINSZ, struct.pack('HHHH', rows, cols, 0, 0))
+        self.rows = rows
+        self.cols = cols
+        self.last_activity = time.time()
+
+    async def close(self, grace_period: float = 2.0):
+        """Hang up the shell's process group and release the PTY"""
+        self.detach()
+        self._stop_reading()
+
+        if self.process.returncode is None:
+            try:
+                os.killpg(self.process.pid, signal.SIGHUP)
+            except ProcessLookupError:
+                pass
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout=grace_period)
+            except asyncio.TimeoutError:
+                try:
+                    os.killpg(self.process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                await self.process.wait()
+
+        if self.master_fd >= 0:
+            try:
+                os.close(self.master_fd)
+            except OSError:
+                pass
+            self.master_fd = -1
+        if self.cgroup:
+            self.cgroup.remove()
+            self.cgroup = None
+        self.closed = True
+
+class TerminalSessionManager:
+    def __init__(self, terminal_manager):
+        self.terminal_manager = terminal_manager
+
+        # Pool limits
+        self.max_sessions_per_user = settings.MAX_TERMINAL_SESSIONS_PER_USER
+        self.max_sessions = settings.MAX_TERMINAL_SESSIONS
+        self.idle_timeout = settings.TERMINAL_SESSION_IDLE_TIMEOUT
+        self.reap_interval = 60
+        self.scrollback_size = 64 * 1024
+
+        self.sessions: Dict[str, TerminalSession] = {}
+        # Sessions being started, counted against the caps until they are added
+        self._starting: Dict[int, int] = {}
+        self._reaper_task: Optional[asyncio.Task] = None
+
+    def _user_sessions(self, user_id: int) -> List[TerminalSession]:
+        return [s for s in self.sessions.values() if s.user_id == user_id]
+
+    async def create_session(self, user_id: int, project: str = None, working_directory: str = None,
+                             rows: int = 24, cols: int = 80) -> TerminalSession:
+        """Create a PTY-backed shell, reusing a live one for the same user and project.
+
+        The shell runs under the same rlimits and cgroup as executed commands.
+        Sessions have their own budget (per user and across the server) rather
+        than holding execution slots, since they mostly sit idle. What is typed
+        into a shell is not checked against the command policy: an interactive
+        shell is trusted the same way the user's own login shell would be.
+        """
+        if self.terminal_manager.system == "Windows":
+            raise HTTPException(status_code=501, detail="Terminal sessions are not supported on Windows")
+
+        for session in self._user_sessions(user_id):
+            if session.project == project and session.alive:
+                return session
+            if not session.alive:
+                # A shell that has exited no longer counts against the caps
+                await self._close(session)
+
+        if len(self._user_sessions(user_id)) + self._starting.get(user_id, 0) >= self.max_sessions_per_user:
+            raise HTTPException(status_code=429, detail="Too many terminal sessions")
+        if len(self.sessions) + sum(self._starting.values()) >= self.max_sessions:
+            raise HTTPException(status_code=429, detail="Too many terminal sessions on the server, try again later")
+
+        cwd = self.terminal_manager._sanitize_path(working_directory)
+
+        self._starting[user_id] = self._starting.get(user_id, 0) + 1
+        try:
+            session = await self._spawn(user_id, project, cwd, rows, cols)
+        finally:
+            self._starting[user_id] -= 1
+            if not self._starting[user_id]:
+                del self._starting[user_id]
+        self.sessions[session.session_id] = session
+        return session
+
+    async def _spawn(self, user_id: int, project: Optional[str], cwd: str, rows: int, cols: int) -> TerminalSession:
+        """Start a shell on a new PTY under the execution limits"""
+        self.start()
+
+        limits = self.terminal_manager.resource_limits
+        cgroup = None
+        if self.terminal_manager.cgroup_root:
+            try:
+                cgroup = CgroupSandbox(self.terminal_manager.cgroup_root, limits)
+            except OSError:
+                cgroup = None
+
+        def preexec():
+            _acquire_controlling_tty()
+            if cgroup:
+                try:
+                    cgroup.enter()
+                except OSError:
+                    pass
+            limits.apply()
+
+        master_fd, slave_fd = os.openpty()
+        try:
+            fcntl.ioctl(slave_fd, termios.TIOCSWINSZ, struct.pack('HHHH', rows, cols, 0, 0))
+            process = await asyncio.create_subprocess_exec(
+                self.terminal_manager.shell,
+                stdin=slave_fd,
+                stdout=slave_fd,
+                stderr=slave_fd,
+                cwd=cwd,
+                env=self.terminal_manager.process_env(cwd, {"TERM": "xterm-256color"}),
+                start_new_session=True,
+                preexec_fn=preexec
+            )
+        except Exception as e:
+            os.close(master_fd)
+            if cgroup:
+                cgroup.remove()
+            raise HTTPException(status_code=500, detail=f"Failed to start terminal session: {str(e)}")
+        finally:
+            os.close(slave_fd)
+
+        os.set_blocking(master_fd, False)
+
+        session = TerminalSession(
+            session_id=uuid.uuid4().hex,
+            user_id=user_id,
+            project=project,
+            cwd=cwd,
+            process=process,
+            master_fd=master_fd,
+            rows=rows,
+            cols=cols,
+            scrollback_size=self.scrollback_size,
+            cgroup=cgroup
+        )
+        session.start_reading()
+        return session
+
+    async def _close(self, session: TerminalSession):
+        """Remove a session from the pool and close it"""
+        if self.sessions.pop(session.session_id, None) is None:
+            return
+        await session.close()
+
+    def get_session(self, session_id: str, user_id: int) -> TerminalSession:
+        """Get a session owned by the user"""
+        session = self.sessions.get(session_id)
+        if not session or session.user_id != user_id:
+            raise HTTPException(status_code=404, detail="Terminal session not found")
+        return session
+
+    def list_sessions(self, user_id: int) -> List[Dict[str, Any]]:
+        """List a user's sessions"""
+        return [s.to_dict() for s in self._user_sessions(user_id)]
+
+    async def close_session(self, session_id: str, user_id: int):
+        """Terminate a session and remove it from the pool"""
+        session = self.get_session(session_id, user_id)
+        await self._close(session)
+
+    async def reap_idle_sessions(self) -> int:
+        """Close exited sessions and detached ones idle past the timeout"""
+        now = time.time()
+        reaped = 0
+        for session in list(self.sessions.values()):
+            idle = not session.attached and now - session.last_activity > self.idle_timeout
+            if idle or not session.alive:
+                await self._close(session)
+                reaped += 1
+        return reaped
+
+    async def _reaper(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                await self.reap_idle_sessions()
+            except Exception as e:
+                print(f"Warning: terminal session reaper failed: {e}")
+
+    def start(self):
+        """Start the idle reaper if it is not running"""
+        if self._reaper_task is None or self._reaper_task.done():
+            self._reaper_task = asyncio.get_event_loop().create_task(self._reaper())
+
+    async def shutdown(self):
+        """Stop the reaper and close every session"""
+        if self._reaper_task:
+            self._reaper_task.cancel()
+            self._reaper_task = None
+        for session in list(self.sessions.values()):
+            await self._close(session)
@@ -0,0 +1,99 @@
+import os
+import stat
+import pytest
+import atomic_write as aw
+from atomic_write import atomic_write, AtomicWriteBatch
+
+def leftovers(directory):
+    return [name for name in os.listdir(directory) if name.endswith(".tmp")]
+
+def test_replaces_the_file_and_keeps_its_mode(tmp_path):
+    target = tmp_path / "script.sh"
+    target.write_text("old")
+    os.chmod(target, 0o750)
+    atomic_write(target, "new")
+    assert target.read_text() == "new"
+    assert stat.S_IMODE(os.stat(target).st_mode) == 0o750
+    assert leftovers(tmp_path) == []
+
+def test_writes_through_symlinks(tmp_path):
+    real = tmp_path / "real.txt"
+    real.write_text("old")
+    link = tmp_path / "link.txt"
+    link.symlink_to(real)
+    atomic_write(link, "new")
+    assert link.is_symlink()
+    assert real.read_text() == "new"
+
+def test_failed_rename_leaves_the_target_and_no_temp_file(tmp_path, monkeypatch):
+    target = tmp_path / "a.txt"
+    target.write_text("old")
+
+    def failing_replace(src, dst):
+        raise OSError("disk full")
+    monkeypatch.setattr(aw.os, "replace", failing_replace)
+
+    with pytest.raises(OSError):
+        atomic_write(target, "new")
+    assert target.read_text() == "old"
+    assert leftovers(tmp_path) == []
+
+def test_failed_encoding_leaves_no_temp_file(tmp_path):
+    with pytest.raises(UnicodeEncodeError):
+        atomic_write(tmp_path / "a.txt", "café", encoding="ascii")
+    assert os.listdir(tmp_path) == []
+
+def test_batch_is_not_visible_until_commit(tmp_path):
+    with AtomicWriteBatch() as batch:
+        batch.write(tmp_path / "a.txt", "a")
+        batch.write(tmp_path / "b.txt", "b")
+        assert not (tmp_path / "a.txt").exists()
+    assert (tmp_path / "a.txt").read_text() == "a"
+    assert (tmp_path / "b.txt").read_text() == "b"
+    assert leftovers(tmp_path) == []
+
+def test_batch_rolls_back_on_error(tmp_path):
+    (tmp_path / "a.txt").write_text("old")
+    with pytest.raises(RuntimeError):
+        with AtomicWriteBatch() as batch:
+            batch.write(tmp_path / "a.txt", "new")
+            batch.write(tmp_path / "b.txt", "b")
+            raise RuntimeError("template failed")
+    assert (tmp_path / "a.txt").read_text() == "old"
+    assert not (tmp_path / "b.txt").exists()
+    assert leftovers(tmp_path) == []
+
+def test_failed_commit_cleans_up_the_files_not_yet_renamed(tmp_path, monkeypatch):
+    real_replace = os.replace
+    calls = []
+
+    def replace_once(src, dst):
+        calls.append(dst)
+        if len(calls) > 1:
+            raise OSError("disk full")
+        real_replace(src, dst)
+    monkeypatch.setattr(aw.os, "replace", replace_once)
+
+    batch = AtomicWriteBatch(durable=False)
+    batch.write(tmp_path / "a.txt", "a")
+    batch.write(tmp_path / "b.txt", "b")
+    with pytest.raises(OSError):
+        batch.commit()
+    assert (tmp_path / "a.txt").read_text() == "a"
+    assert not (tmp_path / "b.txt").exists()
+    assert leftovers(tmp_path) == []
+
+def test_durable_batch_starts_all_writeback_before_waiting(tmp_path, monkeypatch):
+    events = []
+    monkeypatch.setattr(aw, "_sync_file_range", lambda fd, offset, length, flags: events.append("start") or 0)
+    monkeypatch.setattr(aw.os, "fdatasync", lambda fd: events.append("wait"))
+    monkeypatch.setattr(aw, "_fsync_directory", lambda path: events.append(("directory", os.path.basename(path))))
+
+    (tmp_path / "src").mkdir()
+    with AtomicWriteBatch(durable=True) as batch:
+        for name in ("a.txt", "b.txt", "src/c.txt", "src/d.txt"):
+            batch.write(tmp_path / name, name)
+
+    assert events[:8] == ["start"] * 4 + ["wait"] * 4
+    # Each directory once, not once per file
+    assert sorted(events[8:]) == [("directory", "src"), ("directory", tmp_path.name)]
@@ -0,0 +1,66 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from command_batch import CommandBatchRunner
+
+class FakeJobs:
+    def cancel(self, job_id, user_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+class FakeTerminalManager:
+    def __init__(self):
+        self.jobs = FakeJobs()
+
+    def _is_safe_command(self, command, trusted=False):
+        return not command.startswith("sudo")
+
+    async def execute_command(self, command, working_directory=None, user_id=None, job_id=None, env=None):
+        if command == "fail":
+            return {"command": command, "exit_code": 1}
+        if command == "slow":
+            await asyncio.sleep(10)
+        return {"command": command, "exit_code": 0}
+
+@pytest.fixture
+def runner():
+    return CommandBatchRunner(FakeTerminalManager())
+
+def detail(runner, steps):
+    with pytest.raises(HTTPException) as excinfo:
+        runner.validate(steps)
+    return excinfo.value.detail
+
+def test_validate_returns_steps_by_id(runner):
+    steps = [{"id": "a", "command": "ls"}, {"id": "b", "command": "ls", "depends_on": ["a"], "env": {"DEBUG": "1"}}]
+    assert list(runner.validate(steps)) == ["a", "b"]
+
+def test_validate_rejects_bad_batches(runner):
+    assert detail(runner, []) == "Batch has no steps"
+    assert detail(runner, [{"command": "ls"}]) == "Every step needs an id"
+    assert detail(runner, [{"id": "a", "command": "ls"}, {"id": "a", "command": "ls"}]) == "Duplicate step id 'a'"
+    assert "not allowed" in detail(runner, [{"id": "a", "command": "sudo ls"}])
+    assert detail(runner, [{"id": "a", "command": "ls", "depends_on": ["x"]}]) == "Step 'a' depends on unknown step 'x'"
+
+def test_validate_rejects_cycles(runner):
+    steps = [
+        {"id": "a", "command": "ls", "depends_on": ["c"]},
+        {"id": "b", "command": "ls", "depends_on": ["a"]},
+        {"id": "c", "command": "ls", "depends_on": ["b"]},
+        {"id": "d", "command": "ls"},
+    ]
+    assert detail(runner, steps) == "Dependency cycle between steps: a, b, c"
+
+@pytest.mark.parametrize("name", ["BASH_ENV", "ENV", "PATH", "LD_PRELOAD", "ld_audit", "PYTHONSTARTUP",
+                                  "NODE_OPTIONS", "BASH_FUNC_ls%%", "1BAD"])
+def test_validate_rejects_dangerous_environment(runner, name):
+    assert name in detail(runner, [{"id": "a", "command": "ls", "env": {name: "x"}}])
+
+def test_failure_cancels_siblings_whose_jobs_are_gone(runner):
+    async def collect():
+        steps = [{"id": "slow", "command": "slow"}, {"id": "fail", "command": "fail"},
+                 {"id": "after", "command": "ls", "depends_on": ["fail"]}]
+        return [frame async for frame in runner.run(steps)]
+
+    frames = asyncio.run(asyncio.wait_for(collect(), 5))
+    assert frames[-1]["type"] == "done"
+    assert frames[-1]["steps"] == {"fail": "failed", "after": "skipped", "slow": "cancelled"}
@@ -0,0 +1,60 @@
+import pytest
+from command_policy import CommandPolicy
+
+@pytest.fixture
+def policy():
+    return CommandPolicy(
+        allowed={'ls', 'echo', 'cat', 'grep', 'bash', 'sh', 'true', 'test', '['},
+        blocked={'sudo', 'reboot'},
+        dangerous_patterns=['rm -rf /', '&&', '||']
+    )
+
+@pytest.mark.parametrize("command", [
+    "ls -la",
+    "cat file | grep x",
+    "FOO=bar ls > out.txt",
+    "for i in 1 2 3; do echo $i; done",
+    "if [ -f x ]; then echo yes; else echo no; fi",
+    "while true; do ls; done",
+    "{ ls; echo done; }",
+    "case $x in a) echo a;; b|c) ls;; esac",
+    "[[ -f x ]]; echo ok",
+    "! grep x file",
+    "./build.sh --release",
+    "../tools/run",
+    "bash -c 'ls | grep x'",
+    "echo `ls`",
+    "echo \"$(ls)\"",
+    "echo '$(reboot)'",
+])
+def test_allows(policy, command):
+    assert policy.check(command) is None
+
+@pytest.mark.parametrize("command, reason", [
+    ("sudo ls", "'sudo' is blocked"),
+    ("ls; reboot", "'reboot' is blocked"),
+    ("echo x\nreboot", "'reboot' is blocked"),
+    ("echo `reboot`", "'reboot' is blocked"),
+    ("echo \"`reboot`\"", "'reboot' is blocked"),
+    ("echo \"$(reboot)\"", "'reboot' is blocked"),
+    ("echo $(echo $(sudo ls))", "'sudo' is blocked"),
+    ("ls|(reboot)", "'reboot' is blocked"),
+    ("bash -c 'reboot'", "'reboot' is blocked"),
+    ("sh -lc \"echo $(sudo id)\"", "'sudo' is blocked"),
+    ("for i in 1; do reboot; done", "'reboot' is blocked"),
+    ("./reboot", "'reboot' is blocked"),
+    ("python script.py", "'python' is not an allowed command"),
+    ("ls && reboot", "command contains a blocked pattern"),
+    ("   ", "empty command"),
+])
+def test_refuses(policy, command, reason):
+    assert policy.check(command) == reason
+
+def test_trusted_skips_only_the_allow_list(policy):
+    assert policy.check('"/usr/bin/python3" "/tmp/x.py"', trusted=True) is None
+    assert policy.check('sudo python3', trusted=True) == "'sudo' is blocked"
+
+def test_decisions_are_cached(policy):
+    policy.check("ls")
+    policy.check("ls")
+    assert policy.get_stats() == {"cached": 1, "hits": 1, "misses": 1}
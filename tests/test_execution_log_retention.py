@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import models
+from execution_log_retention import ExecutionLogRetention
+
+NOW = datetime(2024, 3, 10, 12, 30)
+
+def make_retention(tmp_path, rows):
+    engine = create_engine(f"sqlite:///{tmp_path / 'logs.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+    db = session_factory()
+    for days_ago, exit_code in rows:
+        db.add(models.ExecutionLog(
+            user_id=1, command="make", output="out", error="", exit_code=exit_code,
+            execution_time=100, cpu_time=50, created_at=NOW - timedelta(days=days_ago)
+        ))
+    db.commit()
+    db.close()
+    retention = ExecutionLogRetention(session_factory, retention_days=30, output_retention_days=7, chunk_size=2)
+    return retention, session_factory
+
+def test_old_rows_are_rolled_up_before_they_are_compacted_and_purged(tmp_path):
+    retention, session_factory = make_retention(tmp_path, [(40, 0), (40, 1), (40, 0), (10, 0), (1, 0)])
+
+    assert retention.rollup(NOW) > 0
+    # Chunks of two rows, committed one at a time
+    assert retention.compact(NOW) == 4
+    assert retention.purge(NOW) == 3
+
+    db = session_factory()
+    try:
+        remaining = db.query(models.ExecutionLog).order_by(models.ExecutionLog.created_at).all()
+        assert [row.output for row in remaining] == [None, "out"]
+
+        daily = db.query(models.ExecutionLogRollup).filter(models.ExecutionLogRollup.period == "day").all()
+        oldest = min(daily, key=lambda rollup: rollup.period_start)
+        assert (oldest.count, oldest.error_count, oldest.total_cpu_time) == (3, 1, 150)
+    finally:
+        db.close()
+
+def test_purge_waits_for_rows_the_rollup_has_not_reached(tmp_path):
+    retention, session_factory = make_retention(tmp_path, [(40, 0), (35, 0)])
+    # Nothing rolled up yet, so nothing may be deleted
+    assert retention.purge(NOW) == 0
+    db = session_factory()
+    try:
+        assert db.query(models.ExecutionLog).count() == 2
+    finally:
+        db.close()
@@ -0,0 +1,65 @@
+import os
+import asyncio
+import threading
+import pytest
+import file_index
+from file_index import FileIndex
+
+async def started(root):
+    index = FileIndex(str(root), debounce=0.01)
+    await index.start()
+    if index.mode != "inotify":
+        index.stop()
+        pytest.skip("inotify is not available")
+    return index
+
+async def wait_for(condition, timeout=5.0):
+    deadline = asyncio.get_event_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_event_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+def test_file_created_while_a_new_directory_is_scanned_is_indexed(tmp_path, monkeypatch):
+    real_scandir = os.scandir
+
+    def racing_scandir(path):
+        entries = list(real_scandir(path))
+        if os.path.basename(path) == "new" and not os.path.exists(os.path.join(path, "late.txt")):
+            # Lands right after the listing, before the scan returns
+            with open(os.path.join(path, "late.txt"), "w") as f:
+                f.write("late")
+        return iter(entries)
+
+    async def scenario():
+        index = await started(tmp_path)
+        try:
+            monkeypatch.setattr(file_index.os, "scandir", racing_scandir)
+            os.mkdir(tmp_path / "new")
+            (tmp_path / "new" / "early.txt").write_text("early")
+            await wait_for(lambda: index.get("new/late.txt") is not None)
+            assert index.get("new/early.txt") is not None
+        finally:
+            index.stop()
+    asyncio.run(scenario())
+
+def test_new_directories_are_scanned_off_the_event_loop(tmp_path, monkeypatch):
+    scanned_on = []
+    real_scan = FileIndex._scan
+
+    def recording_scan(self, full_path, *args, **kwargs):
+        scanned_on.append((os.path.basename(full_path), threading.current_thread()))
+        return real_scan(self, full_path, *args, **kwargs)
+
+    async def scenario():
+        index = await started(tmp_path)
+        try:
+            monkeypatch.setattr(FileIndex, "_scan", recording_scan)
+            os.makedirs(tmp_path / "pkg" / "sub")
+            (tmp_path / "pkg" / "sub" / "mod.py").write_text("x = 1\n")
+            await wait_for(lambda: index.get("pkg/sub/mod.py") is not None)
+            assert index.get("pkg").size == 6
+        finally:
+            index.stop()
+        assert ("pkg", threading.main_thread()) not in scanned_on
+        assert any(name == "pkg" for name, _ in scanned_on)
+    asyncio.run(scenario())
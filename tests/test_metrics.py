@@ -0,0 +1,32 @@
+from metrics import MetricsRegistry, LATENCY_BUCKETS
+
+def make_registry():
+    registry = MetricsRegistry()
+    registry.histogram("run_seconds", "Run time", ("language", "user"), LATENCY_BUCKETS)
+    registry.counter("runs_total", "Runs", ("user", "exit_code"))
+    registry.observe("run_seconds", 0.1, language="python", user=1)
+    registry.observe("run_seconds", 0.3, language="python", user=2)
+    registry.inc("runs_total", user=1, exit_code=0)
+    registry.inc("runs_total", user=2, exit_code=0)
+    return registry
+
+def test_prometheus_output_can_sum_away_user_labels():
+    text = make_registry().render_prometheus(drop_labels=("user",))
+    assert "user=" not in text
+    assert 'run_seconds_count{language="python"} 2' in text
+    assert 'run_seconds_bucket{language="python",le="0.1"} 1' in text
+    assert 'runs_total{exit_code="0"} 2' in text
+
+def test_summary_filtered_to_one_user():
+    summary = make_registry().summary(user=1)
+    assert summary["runs_total"] == [{"user": "1", "exit_code": "0", "value": 1}]
+    assert [entry["count"] for entry in summary["run_seconds"]] == [1]
+
+def test_quantiles_interpolate_within_buckets():
+    registry = MetricsRegistry()
+    registry.histogram("h", "", (), [1, 2, 4])
+    for value in (0.5, 1.5, 1.5, 3):
+        registry.observe("h", value)
+    histogram = registry.metrics["h"].series[()]
+    assert histogram.quantile(0.5) == 1.5
+    assert histogram.quantile(1.0) == 4
@@ -0,0 +1,65 @@
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session
+
+import models
+from migrations import migrate
+from revision_store import RevisionStore
+from text_patch import content_version
+
+FIRST = "".join(f"line_{i} = {i}\n" for i in range(200))
+SECOND = FIRST + "extra = True\n"
+
+LEGACY_TABLES = [
+    """CREATE TABLE execution_logs (
+        id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, project_id INTEGER, command TEXT NOT NULL,
+        output TEXT, error TEXT, exit_code INTEGER, execution_time INTEGER, created_at DATETIME)""",
+    """CREATE TABLE file_history (
+        id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, project_id INTEGER, file_path VARCHAR(500) NOT NULL,
+        operation VARCHAR(50) NOT NULL, content_before TEXT, content_after TEXT, created_at DATETIME)"""
+]
+
+def legacy_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        for statement in LEGACY_TABLES:
+            connection.execute(text(statement))
+        connection.execute(text("INSERT INTO execution_logs (user_id, command, exit_code) VALUES (1, 'ls', 0)"))
+        revisions = [
+            (1, "a.py", "create", None, FIRST),
+            (1, "a.py", "update", FIRST, SECOND),
+            (2, "a.py", "create", None, FIRST),
+            (1, "a.py", "delete", SECOND, None)
+        ]
+        for user_id, path, operation, before, after in revisions:
+            connection.execute(text(
+                "INSERT INTO file_history (user_id, file_path, operation, content_before, content_after) "
+                "VALUES (:user_id, :path, :operation, :before, :after)"
+            ), {"user_id": user_id, "path": path, "operation": operation, "before": before, "after": after})
+    return engine
+
+def test_legacy_tables_are_upgraded_and_backfilled(tmp_path):
+    engine = legacy_database(tmp_path)
+    models.Base.metadata.create_all(bind=engine)
+    migrate(engine)
+
+    columns = {column["name"] for column in inspect(engine).get_columns("execution_logs")}
+    assert {"output_truncated", "output_blob", "cpu_time", "max_rss", "io_read_bytes", "io_write_bytes"} <= columns
+    indexes = {index["name"] for index in inspect(engine).get_indexes("execution_logs")}
+    assert "ix_execution_logs_user_created" in indexes
+
+    store = RevisionStore()
+    with Session(engine) as db:
+        log = db.query(models.ExecutionLog).one()
+        assert log.output_truncated is False
+
+        history = db.query(models.FileHistory).order_by(models.FileHistory.id).all()
+        assert [store.get_content(db, h.blob) if h.blob else None for h in history] == [FIRST, SECOND, FIRST, None]
+        assert history[1].version == content_version(SECOND)
+        # The second revision is a delta on the first; the other user gets their own blob
+        assert history[1].blob.base_id == history[0].blob_id
+        assert history[2].blob.user_id == 2 and history[2].blob_id != history[0].blob_id
+
+    # Running it again changes nothing
+    migrate(engine)
+    with Session(engine) as db:
+        assert db.query(models.FileBlob).count() == 3
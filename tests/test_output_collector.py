@@ -0,0 +1,64 @@
+import os
+import output_collector
+from output_collector import OutputCollector, prune_spill_dir
+
+def feed_all(collector, data, chunk_size=7):
+    for i in range(0, len(data), chunk_size):
+        collector.feed(data[i:i + chunk_size])
+
+def test_output_within_the_limit_is_kept_whole():
+    collector = OutputCollector(100)
+    feed_all(collector, b"x" * 100)
+    assert collector.get_bytes() == b"x" * 100
+    assert not collector.truncated
+
+def test_truncation_keeps_the_head_and_the_tail():
+    data = bytes(range(256)) * 4
+    collector = OutputCollector(100)
+    feed_all(collector, data)
+    assert collector.truncated
+    assert collector.get_bytes() == data[:50] + data[-50:]
+    assert collector.get_info()["total_bytes"] == len(data)
+    text = OutputCollector(10)
+    feed_all(text, b"a" * 5 + b"b" * 20 + b"c" * 5, chunk_size=3)
+    assert text.get_text() == "aaaaa\n... [20 bytes truncated] ...\nccccc"
+
+def test_spill_file_has_the_full_output(tmp_path):
+    data = b"".join(b"line %d\n" % i for i in range(1000))
+    collector = OutputCollector(100, str(tmp_path))
+    feed_all(collector, data, chunk_size=33)
+    collector.close()
+    info = collector.get_info()
+    with open(info["spill_file"], 'rb') as f:
+        assert f.read() == data
+
+def test_discarded_spill_file_is_deleted(tmp_path):
+    collector = OutputCollector(10, str(tmp_path))
+    feed_all(collector, b"x" * 100)
+    collector.close(keep_spill=False)
+    assert os.listdir(tmp_path) == []
+    assert collector.get_info()["spill_file"] is None
+    # Not spilling at all leaves nothing either
+    small = OutputCollector(100, str(tmp_path))
+    small.feed(b"x")
+    small.close()
+    assert os.listdir(tmp_path) == []
+
+def test_old_spill_files_are_pruned_when_a_new_one_starts(tmp_path, monkeypatch):
+    old = tmp_path / "output-old.log"
+    old.write_bytes(b"old")
+    os.utime(old, (0, 0))
+    unrelated = tmp_path / "notes.txt"
+    unrelated.write_text("keep")
+    os.utime(unrelated, (0, 0))
+    monkeypatch.setattr(output_collector, "_last_prune", {})
+
+    collector = OutputCollector(10, str(tmp_path), spill_max_age=60)
+    feed_all(collector, b"x" * 100)
+    collector.close()
+    assert not old.exists()
+    assert unrelated.exists()
+    assert os.path.exists(collector.spill_path)
+    # A fresh file survives until it is older than the limit
+    assert prune_spill_dir(str(tmp_path), 60) == 0
+    assert prune_spill_dir(str(tmp_path), 60, now=os.stat(collector.spill_path).st_mtime + 61) == 1
@@ -0,0 +1,55 @@
+import os
+import stat
+import asyncio
+from package_cache import PackageCache
+
+def write(path, size, age):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    past = 1_000_000_000 + age
+    os.utime(path, (past, past))
+
+def test_evicts_whole_packages_oldest_first(tmp_path):
+    cache = PackageCache(str(tmp_path), max_size=8_000)
+    cargo_src = os.path.join(cache.env()["CARGO_HOME"], "registry", "src", "index")
+    gomod = cache.env()["GOMODCACHE"]
+
+    write(os.path.join(cargo_src, "old-1.0.0", "src", "lib.rs"), 3000, age=0)
+    write(os.path.join(cargo_src, "old-1.0.0", "Cargo.toml"), 1000, age=0)
+    write(os.path.join(gomod, "example.com", "mod@v1.0.0", "mod.go"), 3000, age=10)
+    os.chmod(os.path.join(gomod, "example.com", "mod@v1.0.0"), stat.S_IRUSR | stat.S_IXUSR)
+    write(os.path.join(cargo_src, "new-2.0.0", "src", "lib.rs"), 4000, age=20)
+    write(os.path.join(cache.env()["PIP_CACHE_DIR"], "http-v2", "a", "entry"), 500, age=30)
+
+    size = cache._measure_and_evict()
+
+    # The oldest crate goes as a whole; the read-only go module goes too
+    assert not os.path.exists(os.path.join(cargo_src, "old-1.0.0"))
+    assert not os.path.exists(os.path.join(gomod, "example.com", "mod@v1.0.0"))
+    assert os.path.exists(os.path.join(cargo_src, "new-2.0.0", "src", "lib.rs"))
+    assert size == 4500
+    assert cache.get_stats()["evicted_entries"] == 2
+
+def test_installed_cargo_binaries_are_not_counted(tmp_path):
+    cache = PackageCache(str(tmp_path), max_size=100)
+    binary = os.path.join(cache.env()["CARGO_HOME"], "bin", "tool")
+    write(binary, 1000, age=0)
+    assert cache._measure_and_evict() == 0
+    assert os.path.exists(binary)
+
+def test_identical_installs_run_once(tmp_path):
+    cache = PackageCache(str(tmp_path), max_size=1 << 30)
+    calls = []
+
+    async def install():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"exit_code": 0}
+
+    async def scenario():
+        return await asyncio.gather(cache.run("pip:requests", install), cache.run("pip:requests", install))
+
+    first, second = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert [first["package_cache"]["deduplicated"], second["package_cache"]["deduplicated"]] == [False, True]
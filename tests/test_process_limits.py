@@ -0,0 +1,19 @@
+import platform
+import subprocess
+import pytest
+from process_limits import ResourceLimits
+
+pytestmark = pytest.mark.skipif(platform.system() != "Linux", reason="reads /proc/<pid>/limits")
+
+def child_limits(limits):
+    output = subprocess.run(["cat", "/proc/self/limits"], preexec_fn=limits.apply,
+                            capture_output=True, text=True, check=True).stdout
+    return {line[:26].strip(): line[26:].split()[:2] for line in output.splitlines()[1:]}
+
+def test_process_count_is_left_to_the_cgroup():
+    with open("/proc/self/limits") as f:
+        own = {line[:26].strip(): line[26:].split()[:2] for line in f.readlines()[1:]}
+    applied = child_limits(ResourceLimits(cpu_time=7, processes=1))
+    assert applied["Max cpu time"] == ["7", "7"]
+    # RLIMIT_NPROC counts every process of the shared user id
+    assert applied["Max processes"] == own["Max processes"]
@@ -0,0 +1,90 @@
+import os
+import signal
+import asyncio
+import pytest
+from python_worker_pool import PythonWorkerPool
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="the worker pool forks")
+
+SLEEPER = "import time\nprint('started', flush=True)\ntime.sleep(30)\n"
+
+async def run_and_cancel(pool, delay, sig=signal.SIGINT):
+    signallers = []
+    task = asyncio.create_task(pool.run(SLEEPER, os.getcwd(), 20, 4096, on_start=signallers.append))
+    while not signallers:
+        await asyncio.sleep(0)
+    await asyncio.sleep(delay)
+    signallers[0](sig)
+    return await asyncio.wait_for(task, 5)
+
+def test_cancel_right_after_submission_on_a_fresh_worker():
+    async def scenario():
+        pool = PythonWorkerPool(size=1, max_runs=100, max_rss=1 << 30)
+        try:
+            # The worker is still importing when the cancel arrives
+            response = await run_and_cancel(pool, 0)
+            assert response["exit_code"] != 0
+            assert pool.recycled == 0
+
+            # The same worker keeps serving
+            response = await pool.run("print(6 * 7)", os.getcwd(), 20, 4096)
+            assert response["stdout"] == "42\n"
+        finally:
+            await pool.shutdown()
+    asyncio.run(scenario())
+
+@pytest.mark.parametrize("sig", [signal.SIGINT, signal.SIGTERM, signal.SIGKILL])
+def test_cancel_a_running_snippet(sig):
+    async def scenario():
+        pool = PythonWorkerPool(size=1, max_runs=100, max_rss=1 << 30)
+        try:
+            response = await run_and_cancel(pool, 0.3, sig)
+            assert response["exit_code"] != 0
+            assert not response["timed_out"]
+            assert pool.recycled == 0
+        finally:
+            await pool.shutdown()
+    asyncio.run(scenario())
+
+def test_late_signal_does_not_cancel_the_next_run():
+    async def scenario():
+        pool = PythonWorkerPool(size=1, max_runs=100, max_rss=1 << 30)
+        try:
+            signallers = []
+            await pool.run("pass", os.getcwd(), 20, 4096, on_start=signallers.append)
+            signallers[0](signal.SIGKILL)  # arrives after the run finished
+            response = await pool.run("print('ok')", os.getcwd(), 20, 4096)
+            assert response["stdout"] == "ok\n"
+        finally:
+            await pool.shutdown()
+    asyncio.run(scenario())
+
+def test_snippets_import_from_their_working_directory_not_the_app(tmp_path):
+    (tmp_path / "mymod.py").write_text("VALUE = 'workspace'\n")
+    (tmp_path / "output_collector.py").write_text("VALUE = 'shadowed'\n")
+    code = (
+        "import mymod, output_collector\n"
+        "print(mymod.VALUE, output_collector.VALUE)\n"
+        "try:\n    import config\nexcept ImportError:\n    print('no config')\n"
+    )
+
+    async def scenario():
+        pool = PythonWorkerPool(size=1, max_runs=100, max_rss=1 << 30)
+        try:
+            response = await pool.run(code, str(tmp_path), 20, 4096)
+            assert response["stdout"] == "workspace shadowed\nno config\n", response["stderr"]
+        finally:
+            await pool.shutdown()
+    asyncio.run(scenario())
+
+def test_worker_is_recycled_after_a_snippet_uses_too_much_memory():
+    async def scenario():
+        pool = PythonWorkerPool(size=1, max_runs=100, max_rss=64 * 1024 * 1024)
+        try:
+            await pool.run("print(1)", os.getcwd(), 20, 4096)
+            assert pool.recycled == 0
+            await pool.run("data = bytearray(128 * 1024 * 1024)", os.getcwd(), 20, 4096)
+            assert pool.recycled == 1
+        finally:
+            await pool.shutdown()
+    asyncio.run(scenario())
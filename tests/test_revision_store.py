@@ -0,0 +1,102 @@
+import random
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import models
+from revision_store import RevisionStore
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = factory()
+    db.add_all([
+        models.User(id=1, email="a@example.com", name="a", google_id="a"),
+        models.User(id=2, email="b@example.com", name="b", google_id="b"),
+    ])
+    db.commit()
+    db.close()
+    return factory
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+def make_versions(count):
+    rng = random.Random(7)
+    lines = [f"line {i} {'x' * rng.randint(0, 40)}\n" for i in range(200)]
+    versions = []
+    for n in range(count):
+        lines[rng.randrange(len(lines))] = f"changed {n}\x0c\n"
+        if n == 3:
+            lines.append("no final newline")
+        versions.append("".join(lines))
+    return versions
+
+def test_every_revision_rebuilds_exactly(db):
+    store = RevisionStore(max_chain_length=3, cache_size=2)
+    versions = make_versions(10)
+    for n, content in enumerate(versions):
+        store.record(db, 1, "a.py", "update" if n else "create", content)
+
+    revisions = list(reversed(store.list_revisions(db, 1, "a.py")))
+    assert len(revisions) == len(versions)
+    store._cache.clear()
+    for revision, content in zip(revisions, versions):
+        assert store.revision_content(db, store.get_revision(db, 1, revision["id"])) == content
+
+    # Deltas are small; a snapshot starts every max_chain_length + 1 blobs
+    blobs = db.query(models.FileBlob).order_by(models.FileBlob.id).all()
+    assert [blob.chain_length for blob in blobs] == [0, 1, 2, 3, 0, 1, 2, 3, 0, 1]
+    assert all(len(blob.data) < 200 for blob in blobs if blob.base_id is not None)
+
+def test_unchanged_save_and_delete(db):
+    store = RevisionStore()
+    store.record(db, 1, "a.py", "create", "x\n")
+    store.record(db, 1, "a.py", "update", "x\n")
+    store.record(db, 1, "a.py", "delete", None)
+    assert [r["operation"] for r in store.list_revisions(db, 1, "a.py")] == ["delete", "create"]
+
+    latest = store.list_revisions(db, 1, "a.py")[0]
+    assert store.diff(db, 1, latest["id"])["diff"].startswith("--- a.py@")
+    assert "+++ /dev/null" in store.diff(db, 1, latest["id"])["diff"]
+
+def test_blobs_are_not_shared_between_users(db):
+    store = RevisionStore()
+    store.record(db, 1, "a.py", "create", "same\n")
+    store.record(db, 1, "a.py", "update", "same\nmore\n")
+    store.record(db, 2, "b.py", "create", "same\nmore\n")
+    assert {blob.user_id for blob in db.query(models.FileBlob)} == {1, 2}
+    assert db.query(models.FileBlob).count() == 3
+
+def test_revisions_are_private(db):
+    store = RevisionStore()
+    revision = store.record(db, 1, "a.py", "create", "x\n")
+    with pytest.raises(HTTPException) as excinfo:
+        store.get_revision(db, 2, revision.id)
+    assert excinfo.value.status_code == 404
+
+def test_concurrent_insert_of_the_same_content(session_factory, monkeypatch):
+    store = RevisionStore()
+    other = session_factory()
+    store.record(other, 1, "b.py", "create", "shared\n")
+
+    # The first lookup misses as if the other save had not committed yet
+    find_blob = RevisionStore._find_blob
+    lookups = []
+    def racing_find_blob(self, *args):
+        lookups.append(args)
+        return None if len(lookups) == 1 else find_blob(self, *args)
+    monkeypatch.setattr(RevisionStore, "_find_blob", racing_find_blob)
+
+    db = session_factory()
+    revision = store.record(db, 1, "a.py", "create", "shared\n")
+    assert len(lookups) == 2
+    assert revision.blob.content_hash == revision.version
+    assert db.query(models.FileBlob).count() == 1
@@ -0,0 +1,55 @@
+from file_index import FileIndex
+from search_index import TrigramIndex
+
+def make_index(tmp_path, files):
+    for rel_path, content in files.items():
+        path = tmp_path / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+    file_index = FileIndex(str(tmp_path))
+    file_index.ensure_built()
+    return file_index, TrigramIndex(file_index, [".py", ".txt"])
+
+def test_edits_retire_old_ids_and_compaction_sweeps_them(tmp_path):
+    file_index, index = make_index(tmp_path, {"a.py": b"needle = 1\n", "b.py": b"haystack = 2\n"})
+    assert list(index.search("needle")) == ["a.py"]
+
+    (tmp_path / "a.py").write_text("replaced = 1\n# longer now\n")
+    file_index.refresh("a.py")
+    assert index.search("needle") == {}
+    assert list(index.search("replaced")) == ["a.py"]
+    assert index.get_stats()["retired"] == 1
+
+    # Sweeping happens once retired ids outnumber live ones (and a floor)
+    index._retired = 5000
+    index.catch_up()
+    assert index.get_stats()["retired"] == 0
+    assert all(doc_id in index._paths for postings in index._postings.values() for doc_id in postings)
+    assert list(index.search("haystack")) == ["b.py"]
+
+def test_deleted_directories_leave_the_index(tmp_path):
+    file_index, index = make_index(tmp_path, {"pkg/mod.py": b"needle\n"})
+    assert list(index.search("needle")) == ["pkg/mod.py"]
+    (tmp_path / "pkg" / "mod.py").unlink()
+    (tmp_path / "pkg").rmdir()
+    file_index.refresh("pkg")
+    assert index.search("needle") == {}
+
+def test_dependency_and_hidden_directories_are_not_indexed(tmp_path):
+    _, index = make_index(tmp_path, {
+        "src/app.py": b"needle\n",
+        "node_modules/lib/index.txt": b"needle\n",
+        ".venv/site.py": b"needle\n"
+    })
+    assert list(index.search("needle")) == ["src/app.py"]
+    assert index.get_stats()["files"] == 1
+
+def test_files_are_decoded_like_the_editor_does(tmp_path):
+    _, index = make_index(tmp_path, {
+        "latin.txt": "café crème\n".encode("cp1252"),
+        "wide.txt": "naïve résumé\n".encode("utf-16"),
+        "blob.txt": b"\x00\x01\x02needle"
+    })
+    assert list(index.search("crème")) == ["latin.txt"]
+    assert list(index.search("résumé")) == ["wide.txt"]
+    assert index.search("needle") == {}
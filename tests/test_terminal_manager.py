@@ -0,0 +1,32 @@
+import asyncio
+import pytest
+from terminal_manager import TerminalManager
+
+def test_cancel_right_after_the_slot_is_granted_releases_it():
+    async def scenario():
+        manager = TerminalManager()
+        scheduler = manager.scheduler
+        scheduler.max_concurrent = 1
+        await scheduler.acquire(1)  # occupy the only slot so the job queues
+
+        entered = []
+
+        async def run_job():
+            async with manager._job(1, "true"):
+                entered.append(True)
+
+        task = asyncio.create_task(run_job())
+        while not manager.jobs.jobs or not any(job.waiter for job in manager.jobs.jobs.values()):
+            await asyncio.sleep(0)
+        job = next(iter(manager.jobs.jobs.values()))
+        # Cancel in the same loop iteration in which the waiter gets its slot
+        job.waiter.add_done_callback(lambda _: task.cancel())
+        scheduler.release(1)
+
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert not entered
+        assert job.waiter.done() and not job.waiter.cancelled()
+        assert scheduler.running == 0
+        assert scheduler.running_by_user == {}
+    asyncio.run(scenario())
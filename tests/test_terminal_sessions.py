@@ -0,0 +1,93 @@
+import os
+import asyncio
+import platform
+from types import SimpleNamespace
+import pytest
+from fastapi import HTTPException
+
+from execution_scheduler import ExecutionScheduler
+from process_limits import ResourceLimits
+from terminal_sessions import TerminalSessionManager
+
+pytestmark = pytest.mark.skipif(platform.system() == "Windows", reason="PTY sessions are POSIX only")
+
+def make_manager(tmp_path, per_user=2, total=3):
+    terminal_manager = SimpleNamespace(
+        system=platform.system(),
+        shell="/bin/sh",
+        resource_limits=ResourceLimits(cpu_time=123),
+        cgroup_root=None,
+        scheduler=ExecutionScheduler(max_concurrent=1, max_per_user=1, max_queue_depth=10),
+        process_env=lambda cwd, extra=None: {**os.environ, **(extra or {})},
+        _sanitize_path=lambda path: str(tmp_path)
+    )
+    sessions = TerminalSessionManager(terminal_manager)
+    sessions.max_sessions_per_user = per_user
+    sessions.max_sessions = total
+    return sessions
+
+def test_sessions_run_under_limits_without_taking_execution_slots(tmp_path):
+    async def scenario():
+        sessions = make_manager(tmp_path)
+        scheduler = sessions.terminal_manager.scheduler
+        try:
+            session = await sessions.create_session(user_id=1, project="a")
+            with open(f"/proc/{session.process.pid}/limits") as f:
+                cpu = next(line for line in f if line.startswith("Max cpu time"))
+            assert cpu.split()[3] == "123"
+
+            # A second shell fits the session budget, and commands still get their slot
+            await sessions.create_session(user_id=1, project="b")
+            assert scheduler.running == 0
+            async with scheduler.slot(1):
+                pass
+        finally:
+            await sessions.shutdown()
+    asyncio.run(scenario())
+
+def test_per_user_and_global_session_caps(tmp_path):
+    async def scenario():
+        sessions = make_manager(tmp_path)
+        try:
+            await sessions.create_session(user_id=1, project="a")
+            await sessions.create_session(user_id=1, project="b")
+            with pytest.raises(HTTPException) as error:
+                await sessions.create_session(user_id=1, project="c")
+            assert error.value.status_code == 429
+
+            await sessions.create_session(user_id=2, project="a")
+            with pytest.raises(HTTPException) as error:
+                await sessions.create_session(user_id=2, project="b")
+            assert "server" in error.value.detail
+        finally:
+            await sessions.shutdown()
+    asyncio.run(scenario())
+
+def test_concurrent_creates_cannot_overshoot_the_cap(tmp_path):
+    async def scenario():
+        sessions = make_manager(tmp_path, per_user=2, total=10)
+        try:
+            results = await asyncio.gather(
+                *(sessions.create_session(user_id=1, project=str(i)) for i in range(4)),
+                return_exceptions=True
+            )
+            assert sum(isinstance(r, HTTPException) for r in results) == 2
+            assert len(sessions.sessions) == 2
+        finally:
+            await sessions.shutdown()
+    asyncio.run(scenario())
+
+def test_exited_shell_frees_its_place(tmp_path):
+    async def scenario():
+        sessions = make_manager(tmp_path, per_user=1)
+        try:
+            session = await sessions.create_session(user_id=1, project="a")
+            await session.write("exit\n")
+            await asyncio.wait_for(session.process.wait(), 5)
+
+            replacement = await sessions.create_session(user_id=1, project="b")
+            assert replacement.alive
+            assert session.session_id not in sessions.sessions
+        finally:
+            await sessions.shutdown()
+    asyncio.run(scenario())
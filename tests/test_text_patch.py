@@ -0,0 +1,48 @@
+import difflib
+import pytest
+from text_patch import PatchError, apply_edits, apply_unified_diff, content_version, split_lines
+
+def unified_diff(old, new):
+    """What diff -u prints, including its marker for a missing final newline"""
+    lines = difflib.unified_diff(split_lines(old), split_lines(new), "a", "b")
+    return "".join(line if line.endswith("\n") else line + "\n\\ No newline at end of file\n" for line in lines)
+
+def test_content_version_is_sha256_of_utf8():
+    assert content_version("") == "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855"
+
+def test_apply_edits_in_any_order():
+    edits = [{"offset": 6, "length": 5, "text": "there"}, {"offset": 0, "length": 0, "text": ">> "}]
+    assert apply_edits("hello world", edits) == ">> hello there"
+
+@pytest.mark.parametrize("edits", [
+    [{"offset": 0, "length": 3}, {"offset": 2, "length": 1}],
+    [{"offset": 10, "length": 5}],
+    [{"offset": 0, "length": -1}],
+])
+def test_apply_edits_rejects_bad_ranges(edits):
+    with pytest.raises(PatchError):
+        apply_edits("hello world", edits)
+
+@pytest.mark.parametrize("old, new", [
+    ("a\nb\nc\n", "a\nB\nc\n"),
+    ("a\nb\nc\n", "x\na\nb\nc\ny\n"),
+    ("a\nb\nc\n", ""),
+    ("", "new\n"),
+    ("a\nb", "a\nb\n"),
+    ("a\nb\n", "a\nc"),
+    # Characters str.splitlines treats as line breaks but diff does not
+    ("page\x0cbreak\nsep\x1cx\nu v\nend\n", "page\x0cbreak\nsep\x1cx\nchanged\nend\n"),
+    ("crlf\r\nline\r\n", "crlf\r\nother\r\n"),
+])
+def test_unified_diff_round_trip(old, new):
+    assert apply_unified_diff(old, unified_diff(old, new)) == new
+
+def test_unified_diff_with_several_hunks():
+    old = "".join(f"line {i}\n" for i in range(40))
+    new = old.replace("line 3\n", "three\n").replace("line 30\n", "")
+    assert apply_unified_diff(old, unified_diff(old, new)) == new
+
+def test_unified_diff_rejects_mismatched_context():
+    diff = unified_diff("a\nb\nc\n", "a\nB\nc\n")
+    with pytest.raises(PatchError):
+        apply_unified_diff("a\nx\nc\n", diff)
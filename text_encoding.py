@@ -0,0 +1,49 @@
+import codecs
+from typing import Optional
+
+# How much of a file the heuristics look at
+SNIFF_SIZE = 64 * 1024
+
+# Longest first: the UTF-32 LE BOM starts with the UTF-16 LE one
+BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16")
+]
+# Bytes cp1252 leaves undefined; text containing them is not cp1252
+CP1252_UNDEFINED = {0x81, 0x8D, 0x8F, 0x90, 0x9D}
+
+def detect_encoding(prefix: bytes, complete: bool = False) -> Optional[str]:
+    """Guess a file's encoding from its first bytes; None means binary.
+
+    prefix is the start of the file (SNIFF_SIZE bytes is plenty) and complete
+    says whether it is the whole file. The decision never needs more than this
+    one look, so the caller decodes the file exactly once.
+    """
+    for bom, encoding in BOMS:
+        if prefix.startswith(bom):
+            return encoding
+
+    sample = prefix[:SNIFF_SIZE]
+    nuls = sample.count(0)
+    if nuls:
+        # BOM-less UTF-16: mostly ASCII, so every other byte is NUL
+        if len(sample) >= 4 and nuls >= len(sample) * 0.4:
+            if sample[1::2].count(0) >= nuls * 0.95:
+                return "utf-16-le"
+            if sample[0::2].count(0) >= nuls * 0.95:
+                return "utf-16-be"
+        return None
+
+    try:
+        # A multi-byte character may be cut off at the end of a partial sample
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=complete and len(sample) == len(prefix))
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+
+    if any(byte in CP1252_UNDEFINED for byte in sample):
+        return "latin-1"
+    return "cp1252"
@@ -0,0 +1,88 @@
+import re
+import hashlib
+from typing import Dict, Any, List
+
+HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+class PatchError(ValueError):
+    pass
+
+def content_version(content: str) -> str:
+    """Version hash of text as read_file returns it"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def apply_edits(content: str, edits: List[Dict[str, Any]]) -> str:
+    """Apply range replacements given as offset/length/text in characters of the base content"""
+    ordered = sorted(edits, key=lambda edit: edit["offset"])
+    pieces = []
+    position = 0
+    for edit in ordered:
+        start = edit["offset"]
+        end = start + edit.get("length", 0)
+        if start < position:
+            raise PatchError(f"Edit at offset {start} overlaps the previous edit")
+        if end > len(content) or edit.get("length", 0) < 0:
+            raise PatchError(f"Edit at offset {start} is outside the file")
+        pieces.append(content[position:start])
+        pieces.append(edit.get("text", ""))
+        position = end
+    pieces.append(content[position:])
+    return "".join(pieces)
+
+def split_lines(text: str) -> List[str]:
+    """Lines ending in "\\n" as diff counts them; str.splitlines also breaks at \\f, \\x1c, \\u2028, ..."""
+    lines = text.split("\n")
+    if lines[-1] == "":
+        lines.pop()
+        return [line + "\n" for line in lines]
+    return [line + "\n" for line in lines[:-1]] + [lines[-1]]
+
+def apply_unified_diff(content: str, diff: str) -> str:
+    """Apply a unified diff; every context and removed line must match the base content"""
+    lines = split_lines(content)
+    output = []
+    position = 0  # index into lines
+    diff_lines = split_lines(diff)
+    index = 0
+
+    while index < len(diff_lines):
+        match = HUNK_HEADER.match(diff_lines[index])
+        index += 1
+        if not match:
+            continue  # ---/+++ headers and anything before the first hunk
+
+        old_start = int(match.group(1))
+        # A zero-length old range names the line before the insertion point
+        start = old_start - 1 if match.group(2) != "0" else old_start
+        if start < position or start > len(lines):
+            raise PatchError(f"Hunk at line {old_start} is out of order or outside the file")
+        output.extend(lines[position:start])
+        position = start
+
+        last_tag = None
+        while index < len(diff_lines) and not diff_lines[index].startswith("@@"):
+            line = diff_lines[index]
+            index += 1
+            tag, text = line[:1], line[1:]
+            if tag == "\\":
+                # "\ No newline at end of file": only an added line needs its newline dropped;
+                # base lines are copied as they are
+                if last_tag == "+" and output[-1].endswith("\n"):
+                    output[-1] = output[-1][:-1]
+                continue
+            last_tag = tag
+            if tag == "+":
+                output.append(text)
+                continue
+            if tag not in (" ", "-") and line.strip():
+                raise PatchError(f"Unexpected diff line: {line.rstrip()}")
+
+            expected = lines[position] if position < len(lines) else None
+            if expected is None or expected.rstrip("\n") != text.rstrip("\n"):
+                raise PatchError(f"Patch does not apply at line {position + 1}")
+            if tag != "-":
+                output.append(expected)
+            position += 1
+
+    output.extend(lines[position:])
+    return "".join(output)
@@ -0,0 +1,126 @@
+import shutil
+import asyncio
+from typing import Dict, Any, List, Optional
+from fastapi import HTTPException
+
+# Executables to look for per language, in order of preference, plus any
+# other programs the language needs at run time
+TOOLCHAIN_SPECS = {
+    'python': {'executables': ['python3', 'python'], 'version_flag': '--version'},
+    'javascript': {'executables': ['node'], 'version_flag': '--version'},
+    # A locally installed ts-node only; npx would download it on first use
+    'typescript': {'executables': ['ts-node'], 'version_flag': '--version'},
+    'go': {'executables': ['go'], 'version_flag': 'version'},
+    'php': {'executables': ['php'], 'version_flag': '--version'},
+    'ruby': {'executables': ['ruby'], 'version_flag': '--version'},
+    'shell': {'executables': ['bash'], 'version_flag': '--version'},
+    'bash': {'executables': ['bash'], 'version_flag': '--version'},
+    'powershell': {'executables': ['pwsh', 'powershell'], 'version_flag': '-Version'},
+    'c': {'executables': ['gcc'], 'version_flag': '--version'},
+    'cpp': {'executables': ['g++'], 'version_flag': '--version'},
+    'rust': {'executables': ['rustc'], 'version_flag': '--version'},
+    'java': {'executables': ['javac'], 'version_flag': '-version', 'requires': ['java']}
+}
+
+class Toolchain:
+    def __init__(self, language: str, executable: Optional[str] = None, path: Optional[str] = None,
+                 version: Optional[str] = None, paths: Dict[str, str] = None, missing: List[str] = None):
+        self.language = language
+        self.executable = executable
+        self.path = path
+        self.version = version
+        # Every program the language needs, by name (e.g. javac and java)
+        self.paths = paths or {}
+        self.missing = missing or []
+
+    @property
+    def available(self) -> bool:
+        return self.path is not None and not self.missing
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "language": self.language,
+            "available": self.available,
+            "executable": self.executable,
+            "path": self.path,
+            "version": self.version,
+            "missing": self.missing
+        }
+
+class ToolchainRegistry:
+    """Installed interpreters and compilers, probed once and refreshed on demand"""
+
+    def __init__(self, probe_timeout: float = 10.0):
+        self.probe_timeout = probe_timeout
+        self.toolchains: Dict[str, Toolchain] = {}
+        self.probed = False
+        self._lock = asyncio.Lock()
+
+    async def _get_version(self, path: str, version_flag: str) -> str:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                path, version_flag,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                stdin=asyncio.subprocess.DEVNULL
+            )
+            output, _ = await asyncio.wait_for(process.communicate(), timeout=self.probe_timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            return "unknown"
+        except OSError:
+            return "unknown"
+
+        lines = output.decode('utf-8', errors='replace').strip().splitlines()
+        return lines[0] if lines else "unknown"
+
+    async def _probe(self, language: str, spec: Dict[str, Any]) -> Toolchain:
+        for executable in spec['executables']:
+            path = shutil.which(executable)
+            if path:
+                break
+        else:
+            return Toolchain(language, missing=spec['executables'][:1])
+
+        paths = {executable: path}
+        missing = []
+        for required in spec.get('requires', []):
+            required_path = shutil.which(required)
+            if required_path:
+                paths[required] = required_path
+            else:
+                missing.append(required)
+
+        version = await self._get_version(path, spec['version_flag'])
+        return Toolchain(language, executable, path, version, paths, missing)
+
+    async def _probe_all(self):
+        probed = await asyncio.gather(*(
+            self._probe(language, spec) for language, spec in TOOLCHAIN_SPECS.items()
+        ))
+        self.toolchains = {toolchain.language: toolchain for toolchain in probed}
+        self.probed = True
+
+    async def refresh(self) -> List[Dict[str, Any]]:
+        """Probe every toolchain again, e.g. after installing a compiler"""
+        async with self._lock:
+            await self._probe_all()
+        return self.list_toolchains()
+
+    async def require(self, language: str) -> Toolchain:
+        """Get a language's toolchain, rejecting unknown or missing ones before anything is spawned"""
+        if not self.probed:
+            async with self._lock:
+                if not self.probed:
+                    await self._probe_all()
+
+        toolchain = self.toolchains.get(language.lower())
+        if toolchain is None:
+            raise HTTPException(status_code=400, detail=f"Language '{language}' not supported")
+        if not toolchain.available:
+            missing = ", ".join(toolchain.missing)
+            raise HTTPException(status_code=400, detail=f"Toolchain for '{language}' is not installed (missing {missing})")
+        return toolchain
+
+    def list_toolchains(self) -> List[Dict[str, Any]]:
+        return [toolchain.to_dict() for toolchain in self.toolchains.values()]